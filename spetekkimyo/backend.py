@@ -0,0 +1,215 @@
+"""
+Build backends : the ways of turning the input folder into a font file.
+
+- "fontforge" runs generate.py in the bundled ffpython (Windows only), on the persistent
+  worker by default.
+- "python" writes the OpenType tables itself (see otf.py and cff.py), compiling the feature
+  file with fea.py and otl.py, in process and on any platform.
+
+Both write the WOFF of the font next to it (see sfnt.build_woff) and copies of both under
+content-hashed names, listed in the manifest of the output folder. (see publish.py)
+
+Both patch the previous font instead when only the feature file changed, the python
+backend also when only the padding did. (see patch.py) Both return the timings of the
+build. (see profiling.py)
+"""
+
+import os
+import sys
+import json
+import atexit
+import tempfile
+import threading
+import subprocess
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Optional, Type # type: ignore
+
+from . import config
+from .cache import BuildCache, collect_inputs, hash_json
+from .fea import parse_feature_file
+from .glyphs import load_glyphs
+from .otf import build_tables, outline_glyphs
+from .otl import build_layout_tables
+from .patch import patch_font
+from .profiling import BuildProfile
+from .publish import publish_font
+from .sfnt import build_sfnt, woff_path, write_woff
+from .worker import BuildWorker, check_cancelled, ffpython_exe
+
+root_dir = Path(__file__).parent.resolve()
+path_to_generate_script = root_dir / 'generate.py'
+
+
+class BuildFailed(RuntimeError):
+    """The backend could not produce the font."""
+
+
+class Backend(ABC):
+    """Turns the input folder into a font file."""
+
+    name = ""
+
+    @abstractmethod
+    def build(self, output_path: Path, use_cache: bool = True) -> BuildProfile:
+        """
+        Build the font to output_path.
+
+        Parameters:
+            output_path (Path): Absolute location of the generated font.
+            use_cache (bool): Reuse what previous builds left in the build cache.
+
+        Returns:
+            BuildProfile: Timings of every phase of the build.
+        """
+
+    def cancel(self) -> None:
+        """Abandon the build running in another thread, if the backend can."""
+
+
+_worker = None
+
+def get_worker() -> BuildWorker:
+    """Return the build worker shared by every build of this process. (started on first use)"""
+    global _worker
+    if _worker is None:
+        _worker = BuildWorker()
+        atexit.register(_worker.close)
+    return _worker
+
+
+class FontForgeBackend(Backend):
+    """
+    Build with generate.py in ffpython.
+
+    Parameters:
+        persistent (bool): Build on the long-lived worker (see worker.py) instead of starting a new ffpython.
+    """
+
+    name = "fontforge"
+
+    def __init__(self, persistent: bool = True):
+        self.persistent = persistent
+
+    def build(self, output_path: Path, use_cache: bool = True) -> BuildProfile:
+        profile = BuildProfile()  # generate.py patches the previous font itself when it can
+        if self.persistent:
+            result = get_worker().build(output_path, use_cache=use_cache)
+            print(result["stdout"], end="")
+            profile.merge(BuildProfile.from_dict(result.get("profile", {})))
+            if not result["ok"]: raise BuildFailed(f"Font generation failed:\n{result['error']}")
+            return profile
+
+        descriptor, profile_path = tempfile.mkstemp(suffix=".json")  # generate.py writes its timings there
+        os.close(descriptor)
+        arguments = [str(ffpython_exe), str(path_to_generate_script), str(output_path), "--profile", profile_path]
+        if not use_cache: arguments.append("--no-cache")
+        try:
+            completed = subprocess.run(
+                arguments,
+                cwd=str(root_dir),  # ensure the working directory is set to the root
+                check=True,         # will raise CalledProcessError if the command fails
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            print(completed.stdout, end="")
+            with open(profile_path, 'r') as f: profile.merge(BuildProfile.from_dict(json.load(f)))
+        finally:
+            os.unlink(profile_path)
+        return profile
+
+    def cancel(self) -> None:
+        if self.persistent and _worker is not None: _worker.cancel()
+
+
+class PythonBackend(Backend):
+    """
+    Build without FontForge, writing the OpenType tables directly.
+    Only the lookups whose block of features.fea changed are compiled again. (see otl.py)
+    Cancelling a build stops it between two of its phases, before the font is written.
+    """
+
+    name = "python"
+
+    def __init__(self):
+        self._cancelled: Optional[threading.Event] = None  # Of the build running, if any
+
+    def build(self, output_path: Path, use_cache: bool = True) -> BuildProfile:
+        profile = BuildProfile()
+        cache = BuildCache()
+        self._cancelled = cancelled = threading.Event()  # A cancel sent before this build was for an earlier one
+
+        with profile.phase("collect inputs"):
+            with open(config.padding_path, 'r') as f: padding_dict = json.load(f)
+
+            sources, inputs = collect_inputs(config.glyph_dir, config.padding_path, config.feature_path, config=[config.config_key(), self.name], order_path=config.glyph_order_path)
+            build_key = hash_json(inputs)
+
+        if use_cache and cache.output_is_fresh(output_path, build_key):
+            print("Font up to date at", output_path)
+            if woff_path(output_path) and not woff_path(output_path).is_file(): write_woff(output_path)
+            publish_font(output_path)
+            return profile
+        check_cancelled(cancelled)
+        if use_cache:
+            with profile.phase("patch"): patched = patch_font(output_path, self.name, cache)
+            if patched: return profile
+
+        with profile.phase("load glyphs"):
+            entries, imported = load_glyphs(sources, cache, use_cache, profile)
+        print("Imported", len(imported), "glyphs:", " ".join(imported))
+        check_cancelled(cancelled)
+
+        with profile.phase("padding"):
+            glyphs = outline_glyphs(entries, padding_dict)
+
+        with profile.phase("compile features"):
+            glyph_ids = {glyph.name: gid for gid, glyph in enumerate(glyphs)}
+            layout = parse_feature_file(config.feature_path, glyph_ids)
+            layout_tables, compiled = build_layout_tables(layout, glyph_ids, cache, use_cache)
+        print("Compiled", len(compiled), "lookups:", " ".join(compiled))
+        check_cancelled(cancelled)
+
+        with profile.phase("build tables"):
+            tables = build_tables(glyphs, max_context=layout.max_context)
+            tables.update(layout_tables)
+            data = build_sfnt(tables)
+        check_cancelled(cancelled)
+
+        with profile.phase("write"):
+            Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+            with open(output_path, 'wb') as f: f.write(data)
+            cache.record_output(output_path, build_key, inputs)
+            cache.save()
+
+        with profile.phase("woff"):
+            write_woff(output_path, data)  # Same tables, already in memory
+        with profile.phase("publish"):
+            publish_font(output_path, data)
+
+        print("Font generated at", output_path)
+        return profile
+
+    def cancel(self) -> None:
+        if self._cancelled is not None: self._cancelled.set()
+
+
+BACKENDS: Dict[str, Type[Backend]] = {
+    FontForgeBackend.name: FontForgeBackend,
+    PythonBackend.name: PythonBackend,
+}
+
+def default_backend() -> str:
+    """FontForge where the bundled ffpython can run, the pure python writer everywhere else."""
+    return FontForgeBackend.name if sys.platform == "win32" and ffpython_exe.is_file() else PythonBackend.name
+
+def get_backend(name: Optional[str] = None, **options) -> Backend:
+    """
+    Parameters:
+        name (str): One of BACKENDS, defaults to default_backend().
+        options: Passed to the backend, such as persistent=False for "fontforge".
+    """
+    name = name or default_backend()
+    if name not in BACKENDS: raise ValueError(f"Unknown backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
@@ -0,0 +1,194 @@
+"""
+Benchmark suite : time the build (cold, warm and up to date), the feature compiler, the
+shaper and the rasterizer, and measure the tables of the built font, to see when a change
+to features.fea, to the glyph set or to the code makes things slower or bigger.
+
+Every run is appended to benchmarks/history.jsonl at the project root, one json line per
+run keyed by the git commit it measured (and whether the tree had uncommitted changes).
+A run is compared with the last run of a clean tree on the same backend, and every metric
+that got worse by more than the threshold is reported as a regression.
+
+Builds go to .cache/benchmark so they never touch the fonts in output.
+
+NOTE : needs NumPy, through raster.py.
+"""
+
+import io
+import json
+import time
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple # type: ignore
+
+from .backend import default_backend
+from .cache import BuildCache, root_dir
+from .cff import read_glyph_names
+from .command import generate_font
+from .config import feature_path
+from .fea import parse_feature_file
+from .otl import build_layout_tables
+from .raster import Rasterizer
+from .regression import project_dir, sample_words
+from .sfnt import read_font
+from .shape import Shaper
+
+BENCHMARK_OUTPUT = ".cache/benchmark/font.otf"  # Relative to the package, like every path of generate_font
+history_path = project_dir / 'benchmarks' / 'history.jsonl'
+
+THRESHOLD = 0.2  # Relative change of a metric past which it is a regression
+REPEAT = 3  # Timings keep the best of that many runs
+SHAPED_WORDS = 20000
+RENDERED_WORDS = 2000
+SIZE_PREFIX = "size:"  # Followed by a table tag, size in bytes
+
+
+class Regression(NamedTuple):
+    metric: str
+    baseline: float
+    value: float
+    change: float  # Relative, positive means worse
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_second")
+
+
+def git_commit(directory: Path = project_dir) -> Tuple[Optional[str], bool]:
+    """Commit checked out in directory and whether tracked files were modified since, (None, False) outside of git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=directory, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(status.strip())
+
+
+def _best_time(function: Callable[[], object], repeat: int) -> float:
+    """Shortest of repeat runs of function, in seconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def measure(backend: Optional[str] = None, repeat: int = REPEAT, words: Optional[List[str]] = None) -> Dict[str, float]:
+    """
+    Run every benchmark once.
+
+    Parameters:
+        backend (str): Build backend, defaults to backend.default_backend().
+        repeat (int): Timings keep the best of that many runs.
+        words (list): Words shaped and rendered, defaults to the words of the regression suite.
+
+    Returns:
+        dict: Metric name to value. Times are in seconds, throughputs in words per second,
+            table sizes ("size:<tag>") in bytes.
+    """
+    output_path = root_dir / BENCHMARK_OUTPUT
+    metrics: Dict[str, float] = {}
+
+    def warm_build():
+        output_path.unlink(missing_ok=True)  # Rebuilt from the cached glyphs and lookups
+        generate_font(BENCHMARK_OUTPUT, backend=backend)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # Builds report every glyph and lookup
+        metrics["cold_build_seconds"] = _best_time(lambda: generate_font(BENCHMARK_OUTPUT, use_cache=False, backend=backend), repeat)
+        metrics["warm_build_seconds"] = _best_time(warm_build, repeat)
+        metrics["noop_build_seconds"] = _best_time(lambda: generate_font(BENCHMARK_OUTPUT, backend=backend), repeat)
+
+        _, tables = read_font(output_path)
+        names = read_glyph_names(tables["CFF "])
+        glyph_ids = {name: gid for gid, name in enumerate(names)}
+        metrics["feature_compile_seconds"] = _best_time(
+            lambda: build_layout_tables(parse_feature_file(feature_path, glyph_ids), glyph_ids, BuildCache(), use_cache=False), repeat)
+
+    metrics["glyphs"] = len(names)
+    metrics[SIZE_PREFIX + "font"] = output_path.stat().st_size
+    for tag, table in tables.items(): metrics[SIZE_PREFIX + tag.strip()] = len(table)
+
+    words = words or sample_words()
+    shaper = Shaper.from_font(output_path)
+    shaped = (words * (SHAPED_WORDS // len(words) + 1))[:SHAPED_WORDS]
+    metrics["shaping_words_per_second"] = len(shaped) / _best_time(lambda: [shaper.shape(word) for word in shaped], repeat)
+
+    rasterizer = Rasterizer.from_font(output_path)
+    runs = [shaper.shape(word) for word in shaped[:RENDERED_WORDS]]
+    metrics["raster_words_per_second"] = len(runs) / _best_time(lambda: [rasterizer.render_run(run) for run in runs], repeat)
+    return metrics
+
+
+# HISTORY =======================================
+
+def load_history(path: Path = history_path) -> List[dict]:
+    """Every recorded run, oldest first."""
+    if not path.is_file(): return []
+    with open(path, 'r', encoding='utf-8') as f: return [json.loads(line) for line in f if line.strip()]
+
+def append_history(record: dict, path: Path = history_path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8', newline='\n') as f: f.write(json.dumps(record, sort_keys=True) + "\n")
+
+def find_baseline(history: List[dict], backend: str) -> Optional[dict]:
+    """Last run of a clean tree with the same backend, the one a new run is compared with."""
+    for record in reversed(history):
+        if record.get("backend") == backend and record.get("commit") and not record.get("dirty"): return record
+    return None
+
+
+def compare(metrics: Dict[str, float], baseline: Dict[str, float], threshold: float = THRESHOLD) -> List[Regression]:
+    """Metrics that got worse than in baseline by more than threshold, worst first."""
+    regressions = []
+    for metric, value in metrics.items():
+        previous = baseline.get(metric)
+        if metric == "glyphs" or not previous: continue
+        change = (previous - value) / previous if higher_is_better(metric) else (value - previous) / previous
+        if change > threshold: regressions.append(Regression(metric, previous, value, change))
+    return sorted(regressions, key=lambda regression: -regression.change)
+
+
+def run_benchmarks(backend: Optional[str] = None, threshold: float = THRESHOLD, record: bool = True,
+                   repeat: int = REPEAT, path: Path = history_path):
+    """
+    Measure, compare with the baseline and append the run to the history.
+
+    Parameters:
+        backend (str): Build backend, defaults to backend.default_backend().
+        threshold (float): Relative change of a metric past which it is a regression. (0.2 = 20% worse)
+        record (bool): Append the run to the history.
+        repeat (int): Timings keep the best of that many runs.
+
+    Returns:
+        record (dict): The run, {"commit", "dirty", "date", "backend", "metrics"}.
+        baseline (dict): The run it was compared with, None if there is none yet.
+        regressions (list): Regression of every metric past the threshold.
+    """
+    backend = backend or default_backend()
+    commit, dirty = git_commit()
+    run = {
+        "commit": commit, "dirty": dirty, "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "backend": backend, "metrics": measure(backend, repeat),
+    }
+    history = load_history(path)
+    baseline = find_baseline(history, backend)
+    regressions = compare(run["metrics"], baseline["metrics"], threshold) if baseline else []
+    if record: append_history(run, path)
+    return run, baseline, regressions
+
+
+def format_report(run: dict, baseline: Optional[dict], regressions: List[Regression]) -> str:
+    """Table of the metrics of a run next to its baseline."""
+    flagged = {regression.metric for regression in regressions}
+    previous = baseline["metrics"] if baseline else {}
+    lines = [f"{'Metric':<28} {'value':>14} {'baseline':>14} {'change':>8}"]
+    for metric, value in run["metrics"].items():
+        before, change = "", ""
+        if previous.get(metric):
+            before, change = f"{previous[metric]:.6g}", f"{(value - previous[metric]) / previous[metric]:+.1%}"
+        lines.append(f"{metric:<28} {value:>14.6g} {before:>14} {change:>8}" + ("  REGRESSION" if metric in flagged else ""))
+    if baseline: lines.append(f"Baseline : {(baseline['commit'] or '?')[:12]} ({baseline['date']})")
+    else: lines.append("No baseline yet")
+    return "\n".join(lines)
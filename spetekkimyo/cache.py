@@ -0,0 +1,163 @@
+"""
+Persistent build cache for generate.py.
+
+Glyph outlines and bounding boxes are stored under .cache/glyphs, addressed by the
+content hash of their source EPS file, so only the glyphs whose file changed have to be
+parsed again. Compiled layout lookups are stored the same way under .cache/lookups,
+addressed by the hash of their expanded rules (see otl.py), and rendered words under
+.cache/renders, addressed by the hash of their glyph run (see regression.py), and shaped
+words under .cache/shaping (see shapecache.py). The manifest (.cache/build.json)
+remembers the key of the last build of each output file, which lets an untouched build
+be skipped entirely.
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional # type: ignore
+
+from .eps import BoundingBox, Contour
+
+CACHE_VERSION = 2
+CACHE_VARIABLE = "SPETEKKIMYO_CACHE"  # Moves the cache elsewhere, see config.INPUT_VARIABLE
+
+root_dir = Path(__file__).parent.resolve()
+cache_dir = Path(os.environ.get(CACHE_VARIABLE) or root_dir / '.cache')
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(path) -> str:
+    with open(path, 'rb') as f: return hash_bytes(f.read())
+
+def hash_json(value) -> str:
+    """Hash any json serializable value (key order independent)."""
+    return hash_bytes(json.dumps(value, sort_keys=True, separators=(',', ':')).encode())
+
+def write_json(path: Path, value) -> None:
+    """Write value as compact JSON, through a temporary file so an interrupted build never leaves a truncated entry."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f: json.dump(value, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def _write_bytes(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f: f.write(data)
+    os.replace(tmp_path, path)
+
+
+def collect_inputs(glyph_dir: Path, padding_path: Path, feature_path: Path, config=None, order_path: Optional[Path] = None):
+    """
+    Hash every input of a build. order_path is the glyph order file, if the build has one.
+
+    Returns:
+        sources (dict): Glyph name to (eps path, content hash).
+        inputs (dict): Input name (glyph name, "features", "padding:<glyph>"...) to its content hash.
+    """
+    with open(padding_path, 'r') as f: padding_dict = json.load(f)
+
+    sources = {}
+    for entry in os.listdir(glyph_dir):
+        glyph_path = os.path.join(glyph_dir, entry)
+        if os.path.isfile(glyph_path):
+            with open(glyph_path, 'rb') as f: sources[entry.removesuffix(".eps")] = (glyph_path, hash_bytes(f.read()))
+
+    inputs = {name: key for name, (_, key) in sources.items()}
+    inputs.update({"padding:" + name: hash_json(value) for name, value in padding_dict.items()})
+    inputs["features"] = hash_file(feature_path)
+    if order_path is not None and os.path.isfile(order_path): inputs["glyph_order"] = hash_file(order_path)
+    if config is not None: inputs["config"] = hash_json(config)
+    return sources, inputs
+
+
+class BuildCache:
+    """
+    On-disk cache of imported glyphs and of the last build of each output.
+
+    Parameters:
+        directory (Path): Where the cache lives. (defaults to spetekkimyo/.cache, or $SPETEKKIMYO_CACHE)
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory) if directory else cache_dir
+        self.manifest_path = self.directory / 'build.json'
+        self.manifest = {"version": CACHE_VERSION, "outputs": {}}
+        if self.manifest_path.is_file():
+            try:
+                with open(self.manifest_path, 'r') as f: manifest = json.load(f)
+                if manifest.get("version") == CACHE_VERSION: self.manifest = manifest
+            except (OSError, ValueError):
+                pass  # A corrupted manifest only costs a full rebuild
+
+    # GLYPHS ====================================
+
+    def _glyph_path(self, key: str) -> Path:
+        return self.directory / 'glyphs' / key[:2] / (key + '.json')
+
+    def load_glyph(self, key: str) -> Optional[dict]:
+        """Return the cached {"contours", "bbox"} entry of a glyph source, or None if it is dirty."""
+        try:
+            with open(self._glyph_path(key), 'r') as f: return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_glyph(self, key: str, contours: List[Contour], bbox: BoundingBox) -> None:
+        write_json(self._glyph_path(key), {"contours": contours, "bbox": list(bbox)})
+
+    # LOOKUPS ===================================
+
+    def _lookup_path(self, key: str) -> Path:
+        return self.directory / 'lookups' / key[:2] / (key + '.json')
+
+    def load_lookup(self, key: str) -> Optional[dict]:
+        """Return the cached compiled lookup of a feature file lookup block (see otl.py), or None."""
+        try:
+            with open(self._lookup_path(key), 'r') as f: return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_lookup(self, key: str, entry: dict) -> None:
+        write_json(self._lookup_path(key), entry)
+
+    # RENDERS ===================================
+
+    def _render_path(self, key: str) -> Path:
+        return self.directory / 'renders' / key[:2] / (key + '.png')
+
+    def load_render(self, key: str) -> Optional[bytes]:
+        """Return the cached PNG of a glyph run (see regression.py), or None."""
+        try:
+            with open(self._render_path(key), 'rb') as f: return f.read()
+        except OSError:
+            return None
+
+    def store_render(self, key: str, png: bytes) -> None:
+        _write_bytes(self._render_path(key), png)
+
+    # OUTPUTS ===================================
+
+    def output_is_fresh(self, output_path: Path, build_key: str) -> bool:
+        """True if output_path was produced by a build with the same inputs and was not touched since."""
+        entry = self.manifest["outputs"].get(str(output_path))
+        if entry is None or entry["key"] != build_key or not Path(output_path).is_file(): return False
+        return hash_file(output_path) == entry["hash"]
+
+    def record_output(self, output_path: Path, build_key: str, inputs: Dict[str, str]) -> None:
+        """
+        Remember which inputs produced output_path.
+
+        Parameters:
+            inputs (dict): Input name (glyph name, "features", "padding:<glyph>"...) to its content hash.
+        """
+        self.manifest["outputs"][str(output_path)] = {
+            "key": build_key,
+            "hash": hash_file(output_path),
+            "inputs": inputs,
+        }
+
+    def save(self) -> None:
+        write_json(self.manifest_path, self.manifest)
@@ -0,0 +1,452 @@
+"""
+Compact Font Format (CFF 1) writer, for the outlines of OpenType fonts, and the little
+reading the shaper and the rasterizer need (read_glyph_names, read_outlines).
+
+Glyphs are written as Type 2 charstrings without hints nor subroutines, which is what
+a font of a hundred flat shapes needs. Coordinates are kept exact : integers are
+written as such, anything else as 16.16 fixed point numbers.
+"""
+
+import struct
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple # type: ignore
+
+from .eps import Contour, segments
+
+# CFF spec, appendix A. Names found here are referenced by index instead of being stored.
+STANDARD_STRINGS = [
+    ".notdef", "space", "exclam", "quotedbl", "numbersign", "dollar", "percent",
+    "ampersand", "quoteright", "parenleft", "parenright", "asterisk", "plus", "comma",
+    "hyphen", "period", "slash", "zero", "one", "two", "three", "four", "five", "six",
+    "seven", "eight", "nine", "colon", "semicolon", "less", "equal", "greater", "question",
+    "at", "A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M", "N", "O", "P",
+    "Q", "R", "S", "T", "U", "V", "W", "X", "Y", "Z", "bracketleft", "backslash",
+    "bracketright", "asciicircum", "underscore", "quoteleft", "a", "b", "c", "d", "e", "f",
+    "g", "h", "i", "j", "k", "l", "m", "n", "o", "p", "q", "r", "s", "t", "u", "v", "w",
+    "x", "y", "z", "braceleft", "bar", "braceright", "asciitilde", "exclamdown", "cent",
+    "sterling", "fraction", "yen", "florin", "section", "currency", "quotesingle",
+    "quotedblleft", "guillemotleft", "guilsinglleft", "guilsinglright", "fi", "fl",
+    "endash", "dagger", "daggerdbl", "periodcentered", "paragraph", "bullet",
+    "quotesinglbase", "quotedblbase", "quotedblright", "guillemotright", "ellipsis",
+    "perthousand", "questiondown", "grave", "acute", "circumflex", "tilde", "macron",
+    "breve", "dotaccent", "dieresis", "ring", "cedilla", "hungarumlaut", "ogonek", "caron",
+    "emdash", "AE", "ordfeminine", "Lslash", "Oslash", "OE", "ordmasculine", "ae",
+    "dotlessi", "lslash", "oslash", "oe", "germandbls", "onesuperior", "logicalnot", "mu",
+    "trademark", "Eth", "onehalf", "plusminus", "Thorn", "onequarter", "divide",
+    "brokenbar", "degree", "thorn", "threequarters", "twosuperior", "registered", "minus",
+    "eth", "multiply", "threesuperior", "copyright", "Aacute", "Acircumflex", "Adieresis",
+    "Agrave", "Aring", "Atilde", "Ccedilla", "Eacute", "Ecircumflex", "Edieresis",
+    "Egrave", "Iacute", "Icircumflex", "Idieresis", "Igrave", "Ntilde", "Oacute",
+    "Ocircumflex", "Odieresis", "Ograve", "Otilde", "Scaron", "Uacute", "Ucircumflex",
+    "Udieresis", "Ugrave", "Yacute", "Ydieresis", "Zcaron", "aacute", "acircumflex",
+    "adieresis", "agrave", "aring", "atilde", "ccedilla", "eacute", "ecircumflex",
+    "edieresis", "egrave", "iacute", "icircumflex", "idieresis", "igrave", "ntilde",
+    "oacute", "ocircumflex", "odieresis", "ograve", "otilde", "scaron", "uacute",
+    "ucircumflex", "udieresis", "ugrave", "yacute", "ydieresis", "zcaron", "exclamsmall",
+    "Hungarumlautsmall", "dollaroldstyle", "dollarsuperior", "ampersandsmall",
+    "Acutesmall", "parenleftsuperior", "parenrightsuperior", "twodotenleader",
+    "onedotenleader", "zerooldstyle", "oneoldstyle", "twooldstyle", "threeoldstyle",
+    "fouroldstyle", "fiveoldstyle", "sixoldstyle", "sevenoldstyle", "eightoldstyle",
+    "nineoldstyle", "commasuperior", "threequartersemdash", "periodsuperior",
+    "questionsmall", "asuperior", "bsuperior", "centsuperior", "dsuperior", "esuperior",
+    "isuperior", "lsuperior", "msuperior", "nsuperior", "osuperior", "rsuperior",
+    "ssuperior", "tsuperior", "ff", "ffi", "ffl", "parenleftinferior",
+    "parenrightinferior", "Circumflexsmall", "hyphensuperior", "Gravesmall", "Asmall",
+    "Bsmall", "Csmall", "Dsmall", "Esmall", "Fsmall", "Gsmall", "Hsmall", "Ismall",
+    "Jsmall", "Ksmall", "Lsmall", "Msmall", "Nsmall", "Osmall", "Psmall", "Qsmall",
+    "Rsmall", "Ssmall", "Tsmall", "Usmall", "Vsmall", "Wsmall", "Xsmall", "Ysmall",
+    "Zsmall", "colonmonetary", "onefitted", "rupiah", "Tildesmall", "exclamdownsmall",
+    "centoldstyle", "Lslashsmall", "Scaronsmall", "Zcaronsmall", "Dieresissmall",
+    "Brevesmall", "Caronsmall", "Dotaccentsmall", "Macronsmall", "figuredash",
+    "hypheninferior", "Ogoneksmall", "Ringsmall", "Cedillasmall", "questiondownsmall",
+    "oneeighth", "threeeighths", "fiveeighths", "seveneighths", "onethird", "twothirds",
+    "zerosuperior", "foursuperior", "fivesuperior", "sixsuperior", "sevensuperior",
+    "eightsuperior", "ninesuperior", "zeroinferior", "oneinferior", "twoinferior",
+    "threeinferior", "fourinferior", "fiveinferior", "sixinferior", "seveninferior",
+    "eightinferior", "nineinferior", "centinferior", "dollarinferior", "periodinferior",
+    "commainferior", "Agravesmall", "Aacutesmall", "Acircumflexsmall", "Atildesmall",
+    "Adieresissmall", "Aringsmall", "AEsmall", "Ccedillasmall", "Egravesmall",
+    "Eacutesmall", "Ecircumflexsmall", "Edieresissmall", "Igravesmall", "Iacutesmall",
+    "Icircumflexsmall", "Idieresissmall", "Ethsmall", "Ntildesmall", "Ogravesmall",
+    "Oacutesmall", "Ocircumflexsmall", "Otildesmall", "Odieresissmall", "OEsmall",
+    "Oslashsmall", "Ugravesmall", "Uacutesmall", "Ucircumflexsmall", "Udieresissmall",
+    "Yacutesmall", "Thornsmall", "Ydieresissmall", "001.000", "001.001", "001.002",
+    "001.003", "Black", "Bold", "Book", "Light", "Medium", "Regular", "Roman", "Semibold",
+]
+STANDARD_SIDS = {name: sid for sid, name in enumerate(STANDARD_STRINGS)}
+
+MAX_STACK = 48  # Type 2 argument stack limit
+
+
+# ENCODING ======================================
+
+def encode_index(items: Sequence[bytes]) -> bytes:
+    """CFF INDEX structure : count, offset size, offsets then data."""
+    if not items: return b"\0\0"
+    offsets = [1]
+    for item in items: offsets.append(offsets[-1] + len(item))
+    off_size = 1 if offsets[-1] < 0x100 else 2 if offsets[-1] < 0x10000 else 3 if offsets[-1] < 0x1000000 else 4
+    packed = b"".join(offset.to_bytes(off_size, "big") for offset in offsets)
+    return struct.pack(">HB", len(items), off_size) + packed + b"".join(items)
+
+def encode_dict_int(value: int, fixed_size: bool = False) -> bytes:
+    """DICT integer operand. fixed_size always uses the 5 bytes form, for offsets known later."""
+    if fixed_size: return b"\x1d" + struct.pack(">i", value)
+    if -107 <= value <= 107: return bytes([value + 139])
+    if 108 <= value <= 1131: return bytes([((value - 108) >> 8) + 247, (value - 108) & 0xFF])
+    if -1131 <= value <= -108: return bytes([((-value - 108) >> 8) + 251, (-value - 108) & 0xFF])
+    if -32768 <= value <= 32767: return b"\x1c" + struct.pack(">h", value)
+    return b"\x1d" + struct.pack(">i", value)
+
+def encode_charstring_number(value: float) -> bytes:
+    """Type 2 charstring operand, integers when possible, 16.16 fixed otherwise."""
+    if float(value).is_integer() and -32768 <= value <= 32767:
+        value = int(value)
+        if -107 <= value <= 107: return bytes([value + 139])
+        if 108 <= value <= 1131: return bytes([((value - 108) >> 8) + 247, (value - 108) & 0xFF])
+        if -1131 <= value <= -108: return bytes([((-value - 108) >> 8) + 251, (-value - 108) & 0xFF])
+        return b"\x1c" + struct.pack(">h", value)
+    return b"\xff" + struct.pack(">i", round(value * 65536))
+
+def _fixed(value: float) -> float:
+    """Snap a coordinate on the 16.16 grid, so that relative moves add up exactly."""
+    return round(value * 65536) / 65536
+
+
+# DECODING ======================================
+
+def read_index(data: bytes, position: int) -> Tuple[List[bytes], int]:
+    """Returns the items of the INDEX at position, and the position right after it."""
+    count, = struct.unpack_from(">H", data, position)
+    if count == 0: return [], position + 2
+    off_size = data[position + 2]
+    start = position + 3
+    offsets = [int.from_bytes(data[start + i * off_size:start + (i + 1) * off_size], "big") for i in range(count + 1)]
+    base = start + (count + 1) * off_size - 1  # Offsets start at 1
+    return [data[base + offsets[i]:base + offsets[i + 1]] for i in range(count)], base + offsets[-1]
+
+def read_dict(data: bytes) -> Dict[int, list]:
+    """DICT operator (12 x escaped ones as 1200 + x) to its operands. Real numbers are skipped."""
+    result: Dict[int, list] = {}
+    operands: list = []
+    position = 0
+    while position < len(data):
+        b0 = data[position]
+        if b0 <= 21:
+            operator = 1200 + data[position + 1] if b0 == 12 else b0
+            position += 2 if b0 == 12 else 1
+            result[operator] = operands
+            operands = []
+        elif b0 == 28:
+            operands.append(struct.unpack_from(">h", data, position + 1)[0]); position += 3
+        elif b0 == 29:
+            operands.append(struct.unpack_from(">i", data, position + 1)[0]); position += 5
+        elif b0 == 30:
+            position += 1
+            while data[position] & 0x0F != 0x0F and data[position] >> 4 != 0x0F: position += 1
+            position += 1
+            operands.append(0.0)
+        elif b0 <= 246:
+            operands.append(b0 - 139); position += 1
+        elif b0 <= 250:
+            operands.append((b0 - 247) * 256 + data[position + 1] + 108); position += 2
+        elif b0 <= 254:
+            operands.append(-(b0 - 251) * 256 - data[position + 1] - 108); position += 2
+        else:
+            raise ValueError(f"Invalid DICT byte {b0}")
+    return result
+
+def read_glyph_names(data: bytes) -> List[str]:
+    """Glyph names of a CFF table in glyph order, from its charset."""
+    position = data[2]  # hdrSize
+    _, position = read_index(data, position)  # Name INDEX
+    top_dicts, position = read_index(data, position)
+    strings, _ = read_index(data, position)
+    top_dict = read_dict(top_dicts[0])
+
+    charstrings, _ = read_index(data, top_dict[17][0])
+    count = len(charstrings)
+    charset_offset = top_dict.get(15, [0])[0]
+
+    def name(sid: int) -> str:
+        return STANDARD_STRINGS[sid] if sid < len(STANDARD_STRINGS) else strings[sid - len(STANDARD_STRINGS)].decode("latin-1")
+
+    if charset_offset == 0: return [name(sid) for sid in range(count)]  # ISOAdobe
+    if charset_offset <= 2: raise ValueError("Expert charsets are not supported")
+    sids = [0]
+    charset_format = data[charset_offset]
+    position = charset_offset + 1
+    while len(sids) < count:
+        if charset_format == 0:
+            sids.append(struct.unpack_from(">H", data, position)[0]); position += 2
+        else:
+            first, = struct.unpack_from(">H", data, position)
+            left = data[position + 2] if charset_format == 1 else struct.unpack_from(">H", data, position + 2)[0]
+            position += 3 if charset_format == 1 else 4
+            sids += range(first, first + left + 1)
+    return [name(sid) for sid in sids[:count]]
+
+
+def _subroutine_bias(subroutines: List[bytes]) -> int:
+    return 107 if len(subroutines) < 1240 else 1131 if len(subroutines) < 33900 else 32768
+
+def read_charstring(program: bytes, global_subrs: List[bytes], local_subrs: List[bytes]) -> List[Contour]:
+    """
+    Contours a Type 2 charstring draws, in the point layout of eps.py. Hints are skipped,
+    subroutines followed. (seac accented glyphs and arithmetic operators are not supported)
+    """
+    contours: List[Contour] = []
+    contour: Contour = []
+    stack: List[float] = []
+    x = y = 0.0
+    stems = 0
+    width_parsed = False
+
+    def close():
+        if len(contour) > 1 and contour[-1][2] and contour[-1][:2] == contour[0][:2]: contour.pop()
+        if len(contour) > 1: contours.append(contour)  # A lone moveto draws nothing
+
+    def line(dx, dy):
+        nonlocal x, y
+        x += dx; y += dy
+        contour.append((x, y, True))
+
+    def curve(dxa, dya, dxb, dyb, dxc, dyc):
+        nonlocal x, y
+        x += dxa; y += dya
+        contour.append((x, y, False))
+        x += dxb; y += dyb
+        contour.append((x, y, False))
+        x += dxc; y += dyc
+        contour.append((x, y, True))
+
+    def alternating(arguments, horizontal):
+        """hvcurveto and vhcurveto : tangents alternate between horizontal and vertical."""
+        while len(arguments) >= 4:
+            last = arguments[4] if len(arguments) == 5 else 0
+            a, b, c, d = arguments[:4]
+            if horizontal: curve(a, 0, b, c, last, d)
+            else: curve(0, a, b, c, d, last)
+            arguments = arguments[4:] if len(arguments) != 5 else []
+            horizontal = not horizontal
+
+    def run(program: bytes) -> bool:
+        """Interpret program, True once endchar is reached."""
+        nonlocal contour, x, y, stems, stack, width_parsed
+        position = 0
+        while position < len(program):
+            b0 = program[position]
+            if b0 == 28:
+                stack.append(struct.unpack_from(">h", program, position + 1)[0]); position += 3; continue
+            if b0 >= 32:
+                if b0 <= 246: stack.append(b0 - 139); position += 1
+                elif b0 <= 250: stack.append((b0 - 247) * 256 + program[position + 1] + 108); position += 2
+                elif b0 <= 254: stack.append(-(b0 - 251) * 256 - program[position + 1] - 108); position += 2
+                else: stack.append(struct.unpack_from(">i", program, position + 1)[0] / 65536); position += 5
+                continue
+
+            operator = 1200 + program[position + 1] if b0 == 12 else b0
+            position += 2 if b0 == 12 else 1
+
+            if operator in (10, 29):  # callsubr, callgsubr
+                subroutines = local_subrs if operator == 10 else global_subrs
+                index = int(stack.pop()) + _subroutine_bias(subroutines)
+                if run(subroutines[index]): return True
+                continue
+            if operator == 11: return False  # return
+
+            # The first stack clearing operator may carry the advance width first
+            if not width_parsed and operator in (1, 3, 4, 14, 18, 19, 20, 21, 22, 23):
+                width_parsed = True
+                arguments = {21: 2, 22: 1, 4: 1}.get(operator)
+                if (len(stack) > arguments) if arguments is not None else len(stack) % 2: stack = stack[1:]
+
+            if operator in (1, 3, 18, 23):  # hstem, vstem, hstemhm, vstemhm
+                stems += len(stack) // 2
+            elif operator in (19, 20):  # hintmask, cntrmask, with implied vstems before them
+                stems += len(stack) // 2
+                position += (stems + 7) // 8
+            elif operator in (21, 22, 4):  # rmoveto, hmoveto, vmoveto
+                close()
+                dx, dy = (stack[-2], stack[-1]) if operator == 21 else (stack[-1], 0) if operator == 22 else (0, stack[-1])
+                x += dx; y += dy
+                contour = [(x, y, True)]
+            elif operator == 5:  # rlineto
+                for i in range(0, len(stack) - 1, 2): line(stack[i], stack[i + 1])
+            elif operator in (6, 7):  # hlineto, vlineto
+                horizontal = operator == 6
+                for value in stack:
+                    if horizontal: line(value, 0)
+                    else: line(0, value)
+                    horizontal = not horizontal
+            elif operator == 8:  # rrcurveto
+                for i in range(0, len(stack) - 5, 6): curve(*stack[i:i + 6])
+            elif operator == 24:  # rcurveline
+                for i in range(0, len(stack) - 7, 6): curve(*stack[i:i + 6])
+                line(stack[-2], stack[-1])
+            elif operator == 25:  # rlinecurve
+                for i in range(0, len(stack) - 6, 2): line(stack[i], stack[i + 1])
+                curve(*stack[-6:])
+            elif operator == 26:  # vvcurveto
+                arguments = stack
+                dx = 0
+                if len(arguments) % 4: dx, arguments = arguments[0], arguments[1:]
+                for i in range(0, len(arguments), 4):
+                    curve(dx, arguments[i], arguments[i + 1], arguments[i + 2], 0, arguments[i + 3])
+                    dx = 0
+            elif operator == 27:  # hhcurveto
+                arguments = stack
+                dy = 0
+                if len(arguments) % 4: dy, arguments = arguments[0], arguments[1:]
+                for i in range(0, len(arguments), 4):
+                    curve(arguments[i], dy, arguments[i + 1], arguments[i + 2], arguments[i + 3], 0)
+                    dy = 0
+            elif operator in (30, 31):  # vhcurveto, hvcurveto
+                alternating(stack, operator == 31)
+            elif operator == 1235:  # flex
+                curve(*stack[0:6]); curve(*stack[6:12])
+            elif operator == 1234:  # hflex
+                dx1, dx2, dy2, dx3, dx4, dx5, dx6 = stack[:7]
+                curve(dx1, 0, dx2, dy2, dx3, 0); curve(dx4, 0, dx5, -dy2, dx6, 0)
+            elif operator == 1236:  # hflex1
+                dx1, dy1, dx2, dy2, dx3, dx4, dx5, dy5, dx6 = stack[:9]
+                curve(dx1, dy1, dx2, dy2, dx3, 0); curve(dx4, 0, dx5, dy5, dx6, -(dy1 + dy2 + dy5))
+            elif operator == 1237:  # flex1
+                d = stack[:11]
+                dx = d[0] + d[2] + d[4] + d[6] + d[8]
+                dy = d[1] + d[3] + d[5] + d[7] + d[9]
+                curve(*d[0:6])
+                if abs(dx) > abs(dy): curve(d[6], d[7], d[8], d[9], d[10], -dy)
+                else: curve(d[6], d[7], d[8], d[9], -dx, d[10])
+            elif operator == 14:  # endchar
+                if len(stack) >= 4: raise ValueError("seac accented glyphs are not supported")
+                close()
+                return True
+            else:
+                raise ValueError(f"Unsupported charstring operator {operator}")
+            stack = []
+        return False
+
+    run(program)
+    return contours
+
+def read_outlines(data: bytes) -> List[List[Contour]]:
+    """Contours of every glyph of a CFF table, in glyph order."""
+    position = data[2]
+    _, position = read_index(data, position)
+    top_dicts, position = read_index(data, position)
+    _, position = read_index(data, position)
+    global_subrs, _ = read_index(data, position)
+    top_dict = read_dict(top_dicts[0])
+
+    charstrings, _ = read_index(data, top_dict[17][0])
+    local_subrs: List[bytes] = []
+    if 18 in top_dict:
+        size, offset = top_dict[18]
+        private_dict = read_dict(data[offset:offset + size])
+        if 19 in private_dict: local_subrs, _ = read_index(data, offset + private_dict[19][0])
+    return [read_charstring(program, global_subrs, local_subrs) for program in charstrings]
+
+
+# CHARSTRINGS ===================================
+
+RMOVETO, RLINETO, RRCURVETO, ENDCHAR = 21, 5, 8, 14
+
+def charstring(contours: List[Contour], width=None) -> bytes:
+    """
+    Type 2 charstring drawing contours.
+
+    Parameters:
+        width: Advance width minus nominalWidthX, or None if it is the defaultWidthX.
+    """
+    program = bytearray()
+    arguments: List[float] = [] if width is None else [width]
+    x = y = 0.0
+
+    def flush(operator: int):
+        nonlocal arguments
+        for argument in arguments: program.extend(encode_charstring_number(argument))
+        program.append(operator)
+        arguments = []
+
+    for contour in contours:
+        parts = list(segments(contour))
+        if not parts: continue
+        start = (_fixed(parts[0][0][0]), _fixed(parts[0][0][1]))
+        if len(parts[-1]) == 2: parts.pop()  # The last segment goes back to the start, as a line it is implied
+
+        arguments += [start[0] - x, start[1] - y]
+        x, y = start
+        flush(RMOVETO)
+
+        operator = None
+        for part in parts:
+            kind = RLINETO if len(part) == 2 else RRCURVETO
+            if operator is not None and (kind != operator or len(arguments) + 2 * (len(part) - 1) > MAX_STACK): flush(operator)
+            operator = kind
+            for point in part[1:]:
+                px, py = _fixed(point[0]), _fixed(point[1])
+                arguments += [px - x, py - y]
+                x, y = px, py
+        if operator is not None: flush(operator)
+
+    flush(ENDCHAR)
+    return bytes(program)
+
+
+# FONT ==========================================
+
+def build_cff(ps_name: str, glyphs: List[Tuple[str, List[Contour], int]], font_bbox: Tuple[int, int, int, int],
+              full_name: str = "", family_name: str = "", weight: str = "Regular") -> bytes:
+    """
+    Build a CFF table.
+
+    Parameters:
+        ps_name (str): PostScript name of the font.
+        glyphs (list): (glyph name, contours, advance width) in glyph order, .notdef first.
+        font_bbox (tuple): xmin, ymin, xmax, ymax of every glyph.
+    """
+    strings: List[bytes] = []
+    string_ids: Dict[str, int] = {}
+
+    def sid(name: str) -> int:
+        if name in STANDARD_SIDS: return STANDARD_SIDS[name]
+        if name not in string_ids:
+            string_ids[name] = len(STANDARD_STRINGS) + len(strings)
+            strings.append(name.encode("latin-1"))
+        return string_ids[name]
+
+    widths = [width for _, _, width in glyphs]
+    default_width = Counter(widths).most_common(1)[0][0] if widths else 0
+    nominal_width = 0
+
+    top_dict = bytearray()
+    if full_name: top_dict += encode_dict_int(sid(full_name)) + bytes([2])
+    if family_name: top_dict += encode_dict_int(sid(family_name)) + bytes([3])
+    if weight: top_dict += encode_dict_int(sid(weight)) + bytes([4])
+    top_dict += b"".join(encode_dict_int(int(value)) for value in font_bbox) + bytes([5])
+
+    charset = b"\0" + b"".join(struct.pack(">H", sid(name)) for name, _, _ in glyphs[1:])
+    charstrings = encode_index([
+        charstring(contours, None if width == default_width else width - nominal_width)
+        for _, contours, width in glyphs
+    ])
+    private_dict = encode_dict_int(default_width) + bytes([20]) + encode_dict_int(nominal_width) + bytes([21])
+
+    header = bytes([1, 0, 4, 4])
+    name_index = encode_index([ps_name.encode("latin-1")])
+    string_index = encode_index(strings)
+    global_subrs = encode_index([])
+
+    # Offsets use the 5 bytes integer form, the size of the top dict does not depend on them
+    top_dict_size = len(top_dict) + (5 + 1) + (5 + 1) + (5 + 5 + 1)
+    charset_offset = len(header) + len(name_index) + len(encode_index([bytes(top_dict_size)])) + len(string_index) + len(global_subrs)
+    charstrings_offset = charset_offset + len(charset)
+    private_offset = charstrings_offset + len(charstrings)
+
+    top_dict += encode_dict_int(charset_offset, fixed_size=True) + bytes([15])
+    top_dict += encode_dict_int(charstrings_offset, fixed_size=True) + bytes([17])
+    top_dict += encode_dict_int(len(private_dict), fixed_size=True) + encode_dict_int(private_offset, fixed_size=True) + bytes([18])
+    assert len(top_dict) == top_dict_size
+
+    return header + name_index + encode_index([bytes(top_dict)]) + string_index + global_subrs + charset + charstrings + private_dict
@@ -3,47 +3,231 @@ Provide a command line interface (and a function) for generating the spetekmyo f
 based the provided feature file and glyphs. (resources fetched internally for now)
 """
 
-import os
 import sys
-import subprocess
 from pathlib import Path
+from typing import List, Optional # type: ignore
+
+from .backend import FontForgeBackend, default_backend, get_backend
+from .profiling import BuildProfile
 
 root_dir = Path(__file__).parent.resolve()
-ffpython_exe = root_dir / 'ffpython' / 'bin' / 'ffpython.exe'
-path_to_generate_script = root_dir / 'generate.py'
 
-def generate_font(output_path: str):
+def generate_font(output_path: str, use_cache: bool = True, persistent: bool = True, backend: Optional[str] = None,
+                  trace_path: Optional[str] = None) -> BuildProfile:
     """
-    Run generate.py using the ffpython library, 
+    Build the font, with FontForge (generate.py in ffpython) or the pure python writer.
 
     Parameters:
         output_path (str): The location of the file to write the font to. (such as "output/font.otf")
+        use_cache (bool): Only re-import the glyphs that changed since the last build. (see cache.py)
+        persistent (bool): Build on the long-lived worker (see worker.py) instead of starting a new ffpython.
+        backend (str): "fontforge" or "python", defaults to FontForge where ffpython can run. (see backend.py)
+        trace_path (str): Where to write the timings of the build as a Chrome trace, if anywhere. (see profiling.py)
+
+    Returns:
+        BuildProfile: Timings of every phase of the build, and of every glyph imported.
 
     NOTE : generate.py must be run in fontforge's custom python environment.
     """
     if output_path[0] in ("/", "\\"): raise ValueError("Path must not have / or \\ at position 0.")
-    subprocess.run(
-        [str(ffpython_exe), str(path_to_generate_script), str(root_dir / output_path)],
-        cwd=str(root_dir),  # ensure the working directory is set to the root
-        check=True,         # will raise CalledProcessError if the command fails
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-    )
+    backend = backend or default_backend()
+    options = {"persistent": persistent} if backend == FontForgeBackend.name else {}
+    profile = get_backend(backend, **options).build(root_dir / output_path, use_cache=use_cache)
     print(f"Font successfully generated at {str(root_dir.joinpath(output_path))}")
+    if trace_path: profile.write_trace(trace_path)
+    return profile
+
+def shape_corpus_file(corpus_path: str, output_path: str = "-", font_path: Optional[str] = None, workers: Optional[int] = None,
+                      use_cache: bool = True):
+    """
+    Shape every line of a corpus into JSONL. (see corpus.py)
+
+    Parameters:
+        corpus_path (str): One word or line per record, "-" for stdin.
+        output_path (str): Where the JSONL goes, "-" for stdout.
+        font_path (str): Built font to take the lookups from, defaults to the inputs themselves. (no build needed)
+        workers (int): Size of the process pool, defaults to the number of cores.
+        use_cache (bool): Reuse the runs shaped before with the same font. (see shapecache.py)
+    """
+    from .corpus import read_records, shape_corpus
+    from .shape import Shaper
+    shaper = Shaper.from_font(font_path) if font_path else Shaper.from_features()
+    source = sys.stdin if corpus_path == "-" else open(corpus_path, 'r', encoding='utf-8')
+    output = sys.stdout if output_path == "-" else open(output_path, 'w', encoding='utf-8', newline='\n')
+    try:
+        count = shape_corpus(read_records(source), output, shaper, workers=workers, use_cache=use_cache)
+    finally:
+        if source is not sys.stdin: source.close()
+        if output is not sys.stdout: output.close()
+    print(f"Shaped {count} records", file=sys.stderr)
+
+def subset_font_file(font_path: str, text_path: str, output_path: str) -> int:
+    """
+    Write a subset of a built font with what a page or a sample set needs. (see subset.py)
+
+    Parameters:
+        font_path (str): Built font to subset.
+        text_path (str): Text to shape with the subset, an HTML page (its text is taken) or "-" for stdin.
+        output_path (str): Where the subset font goes.
+
+    Returns:
+        int: Size of the subset, in bytes.
+    """
+    from .subset import page_text, subset_font
+    text = sys.stdin.read() if text_path == "-" else page_text(text_path)
+    data = subset_font(font_path, text)
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'wb') as f: f.write(data)
+    print(f"Subset of {len(set(text))} characters written to {output_path} ({len(data)} bytes, {Path(font_path).stat().st_size} for the whole font)")
+    return len(data)
+
+def check_regressions(font_path: Optional[str] = None, update: bool = False) -> bool:
+    """
+    Run the golden image regression suite (see regression.py) and print a summary.
+
+    Parameters:
+        font_path (str): Built font to check, defaults to output/test.otf in the project folder.
+        update (bool): Accept the current renders as the new references.
+
+    Returns:
+        bool: True if no word changed (or the references were updated).
+    """
+    from .regression import CHANGED, NEW, project_dir, report_path, run_regression
+    results = run_regression(font_path or project_dir / "output" / "test.otf", update=update)
+    changed = [result.word for result in results if result.status == CHANGED]
+    new = [result.word for result in results if result.status == NEW]
+    print(f"{len(results)} words checked : {len(changed)} changed, {len(new)} new")
+    if changed: print("Changed:", " | ".join(changed))
+    print("Report at", report_path)
+    if update: print("References updated")
+    return update or not (changed or new)
+
+def run_benchmark_suite(threshold: Optional[float] = None, record: bool = True, backend: Optional[str] = None) -> bool:
+    """
+    Run the benchmark suite (see benchmark.py) and print its report.
+
+    Parameters:
+        threshold (float): Relative change of a metric past which it is a regression, 0.2 by default.
+        record (bool): Append the run to benchmarks/history.jsonl.
+        backend (str): Build backend, defaults to FontForge where ffpython can run.
+
+    Returns:
+        bool: True if no metric regressed.
+    """
+    from .benchmark import THRESHOLD, format_report, history_path, run_benchmarks
+    run, baseline, regressions = run_benchmarks(backend, threshold=THRESHOLD if threshold is None else threshold, record=record)
+    print(format_report(run, baseline, regressions))
+    if record: print("Recorded in", history_path)
+    if regressions: print(len(regressions), "regressions:", ", ".join(regression.metric for regression in regressions))
+    return not regressions
+
+def run_synthetic_benchmarks(glyph_counts: Optional[List[int]] = None, backend: Optional[str] = None) -> List[dict]:
+    """
+    Build and shape synthetic fonts of growing size and print how each phase scales. (see synthetic.py)
+
+    Parameters:
+        glyph_counts (list): Sizes of the synthetic glyph sets, 1000, 5000 and 20000 by default.
+        backend (str): Build backend, defaults to FontForge where ffpython can run.
+    """
+    from .synthetic import SCALES, format_results, run_synthetic_benchmark
+    results = run_synthetic_benchmark(glyph_counts or SCALES, backend)
+    print(format_results(results))
+    return results
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python file.py <output_path>")
+    usage = (
+        "Usage: spetekkimyo <output_path> [--profile]\n"
+        "       spetekkimyo watch [output_path] [port]\n"
+        "       spetekkimyo serve [font_path] [port]\n"
+        "       spetekkimyo shape <corpus_path|-> [output_path|-] [font_path] [--no-cache]\n"
+        "       spetekkimyo subset <font_path> <text_path|-> <output_path>\n"
+        "       spetekkimyo regress [font_path] [--update]\n"
+        "       spetekkimyo bench [--threshold <ratio>] [--no-record]\n"
+        "       spetekkimyo bench --synthetic [glyph_count ...]"
+    )
+    arguments = sys.argv[1:]
+
+    if arguments[:1] == ["watch"]:
+        if len(arguments) > 3:
+            print(usage)
+            sys.exit(1)
+        from .watch import watch
+        options = {}
+        if len(arguments) > 1: options["output_path"] = arguments[1]
+        if len(arguments) > 2: options["port"] = int(arguments[2])
+        watch(**options)
+        return
+
+    if arguments[:1] == ["serve"]:
+        if len(arguments) > 3:
+            print(usage)
+            sys.exit(1)
+        from .server import serve
+        options = {}
+        if len(arguments) > 1: options["font_path"] = arguments[1]
+        if len(arguments) > 2: options["port"] = int(arguments[2])
+        serve(**options)
+        return
+
+    if arguments[:1] == ["shape"]:
+        use_cache = "--no-cache" not in arguments
+        arguments = [argument for argument in arguments if argument != "--no-cache"]
+        if not 2 <= len(arguments) <= 4:
+            print(usage)
+            sys.exit(1)
+        shape_corpus_file(*arguments[1:], use_cache=use_cache)
+        return
+
+    if arguments[:1] == ["subset"]:
+        if len(arguments) != 4:
+            print(usage)
+            sys.exit(1)
+        subset_font_file(*arguments[1:])
+        return
+
+    if arguments[:1] == ["regress"]:
+        update = "--update" in arguments
+        arguments = [argument for argument in arguments[1:] if argument != "--update"]
+        if len(arguments) > 1:
+            print(usage)
+            sys.exit(1)
+        if not check_regressions(*arguments, update=update): sys.exit(1)
+        return
+
+    if arguments[:2] == ["bench", "--synthetic"]:
+        if not all(argument.isdigit() for argument in arguments[2:]):
+            print(usage)
+            sys.exit(1)
+        run_synthetic_benchmarks([int(argument) for argument in arguments[2:]])
+        return
+
+    if arguments[:1] == ["bench"]:
+        record = "--no-record" not in arguments
+        arguments = [argument for argument in arguments[1:] if argument != "--no-record"]
+        if arguments not in ([], ["--threshold"] + arguments[1:2]) or len(arguments) == 1:
+            print(usage)
+            sys.exit(1)
+        if not run_benchmark_suite(float(arguments[1]) if arguments else None, record=record): sys.exit(1)
+        return
+
+    profile = "--profile" in arguments
+    arguments = [argument for argument in arguments if argument != "--profile"]
+    if len(arguments) != 1:
+        print(usage)
         sys.exit(1)
 
-    output_path = sys.argv[1]
+    output_path = arguments[0]
+    trace_path = str(root_dir / (output_path + ".trace.json")) if profile else None
 
     try:
-        generate_font(output_path)
+        result = generate_font(output_path, trace_path=trace_path)
     except Exception as e:
         print(f"An error occurred: {e}")
         sys.exit(1)
 
+    if profile:
+        print(result.format_summary())
+        print("Trace at", trace_path)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,44 @@
+"""
+Font settings and input locations shared by every build backend.
+"""
+
+import os
+from pathlib import Path
+
+INPUT_VARIABLE = "SPETEKKIMYO_INPUT"  # Builds another input folder, such as the synthetic ones of synthetic.py
+
+root_dir = Path(__file__).parent.resolve()
+input_dir = Path(os.environ.get(INPUT_VARIABLE) or root_dir / 'input')
+feature_path = input_dir / 'features.fea'
+glyph_dir = input_dir / 'glyphs'
+padding_path = input_dir / 'padding.json'
+glyph_order_path = input_dir / 'glyph_order.txt'  # Optional, see otf.glyph_order
+
+# CONFIG ========================================
+
+FONT_NAMES = {
+    "fontname": "Seiso",
+    "fullname": "spe seiso tekkimyo",
+    "familyname": "Seiso",
+}
+ENCODING = "UnicodeFull"  # Use full Unicode encodingdisc
+
+default_padding = 0
+
+# Vertical metrics, FontForge's defaults for a new font
+UNITS_PER_EM = 1000
+ASCENT = 800
+DESCENT = 200
+
+# Creation and modification time written in the font (unix time), fixed so that the same
+# inputs always give the same bytes. $SOURCE_DATE_EPOCH overrides it, as for any
+# reproducible build.
+TIMESTAMP_VARIABLE = "SOURCE_DATE_EPOCH"
+DEFAULT_TIMESTAMP = 1704067200  # 2024-01-01 00:00 UTC
+timestamp = int(os.environ.get(TIMESTAMP_VARIABLE) or DEFAULT_TIMESTAMP)
+
+# END CONFIG ====================================
+
+def config_key() -> list:
+    """Everything above that changes the output, hashed into the build keys."""
+    return [FONT_NAMES, ENCODING, default_padding, UNITS_PER_EM, ASCENT, DESCENT, timestamp]
@@ -0,0 +1,113 @@
+"""
+Shape a whole corpus (one word or line per record) across a process pool and stream the
+result as JSONL, in input order.
+
+Records are read lazily and sent to the workers in chunks, with only a few chunks in
+flight at a time, so memory stays bounded however long the corpus is. Words met before
+come from the shaping cache, shared by the workers. (see shapecache.py)
+
+Each output line looks like :
+    {"text": "kasu", "width": 1830, "glyphs": [["k", 0, 480, 0, 0, 0], ...]}
+with one [name, cluster, x advance, y advance, x offset, y offset] list per glyph, in the
+order of ShapedGlyph.
+"""
+
+import os
+import json
+from collections import deque
+from itertools import islice
+from multiprocessing.util import Finalize
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterable, Iterator, List, Optional # type: ignore
+
+from .shape import ShapedGlyph, Shaper
+from .shapecache import ShapeCache
+
+CHUNK_SIZE = 2000  # Records per task, large enough to hide the cost of sending them
+CHUNKS_IN_FLIGHT = 2  # Per worker, bounds what is held in memory at any time
+
+
+def format_record(text: str, glyphs: List[ShapedGlyph]) -> str:
+    """The JSONL line of a shaped record, without its line break."""
+    return json.dumps({
+        "text": text,
+        "width": sum(glyph.x_advance for glyph in glyphs),
+        "glyphs": [list(glyph) for glyph in glyphs],
+    }, ensure_ascii=False)
+
+def shape_record(shaper: Shaper, text: str) -> str:
+    """The JSONL line of a record, without its line break."""
+    return format_record(text, shaper.shape(text))
+
+def shape_chunk(shaper: Shaper, records: List[str], cache: Optional[ShapeCache] = None) -> str:
+    """The JSONL lines of records, taking the runs cache has already."""
+    runs = cache.shape_many(shaper, records) if cache else [shaper.shape(text) for text in records]
+    return "".join(format_record(text, glyphs) + "\n" for text, glyphs in zip(records, runs))
+
+def _open_cache(shaper: Shaper, use_cache: bool) -> Optional[ShapeCache]:
+    return ShapeCache.for_shaper(shaper) if use_cache and shaper.font_hash else None
+
+
+_shaper: Optional[Shaper] = None
+_cache: Optional[ShapeCache] = None
+
+def _start_worker(shaper: Shaper, use_cache: bool) -> None:
+    global _shaper, _cache
+    _shaper = shaper
+    _cache = _open_cache(shaper, use_cache)  # Every worker has its own memory tier, the disk tier is shared
+    if _cache is not None: Finalize(_cache, _cache.close, exitpriority=10)  # Pool processes exit without running atexit
+
+def _shape_chunk(records: List[str]) -> str:
+    return shape_chunk(_shaper, records, _cache)
+
+
+def read_records(lines: Iterable[str]) -> Iterator[str]:
+    """One record per line, without its line break. Empty lines are kept so output lines match input lines."""
+    for line in lines: yield line.rstrip("\r\n")
+
+def shape_corpus(records: Iterable[str], output: IO[str], shaper: Shaper,
+                 workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE, use_cache: bool = True) -> int:
+    """
+    Shape every record and write its JSONL line to output, in input order.
+
+    Parameters:
+        records (Iterable[str]): Texts to shape, consumed lazily.
+        output (IO[str]): Where the JSONL goes.
+        shaper (Shaper): Sent once to each worker.
+        workers (int): Size of the process pool. (defaults to the number of cores, 1 shapes in process)
+        chunk_size (int): Records per task.
+        use_cache (bool): Take the runs shaped before with the same font from the shaping cache,
+            and store the new ones there. (see shapecache.py)
+
+    Returns:
+        int: Number of records shaped.
+    """
+    workers = workers or os.cpu_count() or 1
+    records = iter(records)
+    count = 0
+
+    if workers == 1:
+        cache = _open_cache(shaper, use_cache)
+        try:
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk: break
+                output.write(shape_chunk(shaper, chunk, cache))
+                count += len(chunk)
+        finally:
+            if cache: cache.close()
+        return count
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker, initargs=(shaper, use_cache)) as executor:
+        pending = deque()
+        while True:
+            # Keep the pool busy without reading ahead more than a few chunks
+            while len(pending) < workers * CHUNKS_IN_FLIGHT:
+                chunk = list(islice(records, chunk_size))
+                if not chunk: break
+                pending.append((executor.submit(_shape_chunk, chunk), len(chunk)))
+            if not pending: break
+            future, size = pending.popleft()
+            output.write(future.result())  # The oldest chunk first, whatever finished before it
+            count += size
+    return count
@@ -0,0 +1,142 @@
+"""
+Read the EPS files exported by FontForge without FontForge.
+
+Only the subset FontForge writes for a glyph is understood : absolute moveto, lineto,
+curveto and closepath, wrapped in gsave newpath ... fill grestore. The %%BeginPreview
+bitmap, which makes up most of the file, is skipped line by line without being kept.
+
+Contours use FontForge's point layout : a list of (x, y, on_curve) where every cubic
+segment is two off-curve points followed by its on-curve end point, the closing point
+of the contour being implied by the first one.
+"""
+
+from pathlib import Path
+from typing import Iterable, List, Tuple # type: ignore
+
+Point = Tuple[float, float, bool]  # x, y, on_curve
+Contour = List[Point]
+BoundingBox = Tuple[float, float, float, float]  # xmin, ymin, xmax, ymax
+
+IGNORED_OPERATORS = {b"gsave", b"grestore", b"newpath", b"fill", b"eofill"}
+
+
+class EPSError(ValueError):
+    """The file uses something that is not part of FontForge's glyph EPS output."""
+
+
+def _number(token: bytes):
+    value = float(token)
+    return int(value) if value.is_integer() else value
+
+def _close(contour: Contour) -> Contour:
+    # FontForge draws the closing segment explicitly, the end point repeats the start point
+    if len(contour) > 1 and contour[-1][2] and contour[-1][:2] == contour[0][:2]: contour.pop()
+    return contour
+
+def parse_eps_lines(lines: Iterable[bytes], source: str = "<eps>") -> List[Contour]:
+    """
+    Parse the lines of a FontForge glyph EPS file into contours.
+
+    Parameters:
+        lines (Iterable[bytes]): The lines of the file, such as an open binary file.
+        source (str): Name used in error messages.
+    """
+    contours: List[Contour] = []
+    contour: Contour = []
+    stack: list = []
+    in_preview = False
+
+    for number, line in enumerate(lines, start=1):
+
+        if line.startswith(b"%"):
+            if in_preview:
+                in_preview = not line.startswith(b"%%EndPreview")
+            elif line.startswith(b"%%BeginPreview"):
+                in_preview = True
+            continue
+
+        for token in line.split():
+            if token[0] in b"-.0123456789":
+                stack.append(_number(token))
+            elif token == b"moveto":
+                if contour: contours.append(_close(contour))  # An open contour, keep it anyway
+                contour = [(stack[-2], stack[-1], True)]
+                stack.clear()
+            elif token == b"lineto":
+                contour.append((stack[-2], stack[-1], True))
+                stack.clear()
+            elif token == b"curveto":
+                x1, y1, x2, y2, x3, y3 = stack[-6:]
+                contour += [(x1, y1, False), (x2, y2, False), (x3, y3, True)]
+                stack.clear()
+            elif token == b"closepath":
+                if contour: contours.append(_close(contour))
+                contour = []
+            elif token not in IGNORED_OPERATORS:
+                raise EPSError(f"{source}:{number}: unsupported operator {token.decode(errors='replace')!r}")
+
+    if contour: contours.append(_close(contour))
+    return contours
+
+def parse_eps(path) -> List[Contour]:
+    """Parse a FontForge glyph EPS file into contours."""
+    with open(path, 'rb') as f: return parse_eps_lines(f, source=str(path))
+
+
+# METRICS =======================================
+
+def _cubic_extrema(a: float, b: float, c: float, d: float) -> List[float]:
+    """Values taken by a cubic bezier coordinate where its derivative is zero."""
+    # B'(t)/3 = p(1-t)^2 + 2q(1-t)t + rt^2 = qa t^2 + qb t + qc
+    p, q, r = b - a, c - b, d - c
+    qa, qb, qc = p - 2 * q + r, 2 * (q - p), p
+    roots = []
+    if abs(qa) < 1e-12:
+        if abs(qb) > 1e-12: roots.append(-qc / qb)
+    else:
+        delta = qb * qb - 4 * qa * qc
+        if delta >= 0:
+            delta **= 0.5
+            roots += [(-qb + delta) / (2 * qa), (-qb - delta) / (2 * qa)]
+    values = []
+    for t in roots:
+        if 0 < t < 1:
+            mt = 1 - t
+            values.append(mt * mt * mt * a + 3 * mt * mt * t * b + 3 * mt * t * t * c + t * t * t * d)
+    return values
+
+def segments(contour: Contour):
+    """Yield the segments of a closed contour as tuples of 2 (line) or 4 (cubic) (x, y) points."""
+    if not contour: return
+    start = next((i for i, point in enumerate(contour) if point[2]), None)
+    if start is None: return  # No on-curve point, nothing FontForge would export
+    points = contour[start:] + contour[:start] + [contour[start]]
+    current = points[0][:2]
+    pending = []
+    for x, y, on_curve in points[1:]:
+        if not on_curve:
+            pending.append((x, y))
+            continue
+        if pending: yield (current, pending[0], pending[1], (x, y))
+        else: yield (current, (x, y))
+        current = (x, y)
+        pending = []
+
+def bounding_box(contours: List[Contour]) -> BoundingBox:
+    """Tight bounding box of the outlines (curve extrema included), (0, 0, 0, 0) if there are none."""
+    xs: List[float] = []
+    ys: List[float] = []
+    for contour in contours:
+        for segment in segments(contour):
+            xs += [point[0] for point in segment[::len(segment) - 1]]
+            ys += [point[1] for point in segment[::len(segment) - 1]]
+            if len(segment) == 4:
+                xs += _cubic_extrema(*(point[0] for point in segment))
+                ys += _cubic_extrema(*(point[1] for point in segment))
+    if not xs: return (0, 0, 0, 0)
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def load_glyphs(glyph_dir) -> dict:
+    """Parse every EPS file of glyph_dir, returns glyph name -> contours."""
+    return {path.stem: parse_eps(path) for path in sorted(Path(glyph_dir).glob("*.eps"))}
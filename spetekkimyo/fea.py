@@ -0,0 +1,444 @@
+"""
+Parse OpenType feature files (.fea) into a layout.Layout, without FontForge.
+
+Only the part of the feature file syntax features.fea uses is understood :
+    languagesystem, glyph classes (@name = [...];)
+    table GDEF { GlyphClassDef ...; } GDEF;
+    feature blocks with script, language, lookupflag and lookup blocks or references
+    sub : single, multiple, ligature, and chained contextual (marked with ') that apply one of them
+    pos : single and pair, with a number (x advance) or a <xPla yPla xAdv yAdv> value record
+Anything else raises a FeatureError pointing at the line.
+
+The source text of every lookup block is kept (Lookup.source), for the errors about that
+lookup to show it.
+"""
+
+import re
+from itertools import product
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple # type: ignore
+
+from .layout import (
+    BASE_GLYPH, CHAIN_SUB, COMPONENT_GLYPH, GPOS, GSUB, IGNORE_BASE_GLYPHS, IGNORE_LIGATURES, IGNORE_MARKS,
+    LIGATURE_GLYPH, LIGATURE_SUB, MARK_GLYPH, MULTIPLE_SUB, PAIR_POS, RIGHT_TO_LEFT, SINGLE_POS, SINGLE_SUB,
+    ChainRule, Layout, LayoutError, Lookup, ValueRecord,
+)
+
+DEFAULT_LANGUAGE_SYSTEM = ("DFLT", "dflt")
+
+LOOKUP_FLAGS = {
+    "RightToLeft": RIGHT_TO_LEFT,
+    "IgnoreBaseGlyphs": IGNORE_BASE_GLYPHS,
+    "IgnoreLigatures": IGNORE_LIGATURES,
+    "IgnoreMarks": IGNORE_MARKS,
+}
+GLYPH_CLASS_ORDER = [BASE_GLYPH, LIGATURE_GLYPH, MARK_GLYPH, COMPONENT_GLYPH]  # GlyphClassDef arguments
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>\#[^\n]*)
+  | (?P<number>-?\d+)
+  | (?P<class>@[A-Za-z0-9_.]+)
+  | (?P<name>\\?[A-Za-z_.][A-Za-z0-9_.]*)
+  | (?P<symbol>[\[\]{};'<>,=()])
+""", re.VERBOSE)
+
+
+class FeatureError(ValueError):
+    """The feature file is invalid, or uses syntax this parser does not support."""
+
+
+class Token(NamedTuple):
+    kind: str  # number, class, name or symbol
+    value: str
+    line: int
+    start: int  # Offsets in the text
+    end: int
+
+
+def tokenize(text: str, source: str = "<features>") -> Iterator[Token]:
+    line = 1
+    position = 0
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None: raise FeatureError(f"{source}:{line}: unexpected character {text[position]!r}")
+        kind = match.lastgroup
+        if kind not in ("space", "comment"):
+            value = match.group()
+            if kind == "name": value = value.lstrip("\\")
+            yield Token(kind, value, line, match.start(), match.end())
+        line += match.group().count("\n")
+        position = match.end()
+
+
+class _Parser:
+
+    def __init__(self, text: str, source: str, glyph_names: Optional[Set[str]]):
+        self.text = text
+        self.source = source
+        self.glyph_names = glyph_names
+        self.tokens = list(tokenize(text, source))
+        self.position = 0
+        self.layout = Layout()
+        self.classes: Dict[str, Tuple[str, ...]] = {}
+        self.named: Dict[str, Lookup] = {}
+        self.language_systems: List[Tuple[str, str]] = []
+
+        self.block_glyphs: Set[str] = set()  # Glyphs mentioned by the lookup being parsed
+
+    # TOKENS ====================================
+
+    def error(self, message: str, token: Optional[Token] = None) -> FeatureError:
+        token = token or self.peek()
+        line = token.line if token else self.text.count("\n") + 1
+        return FeatureError(f"{self.source}:{line}: {message}")
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None: raise self.error("unexpected end of file")
+        self.position += 1
+        return token
+
+    def at(self, *values: str) -> bool:
+        token = self.peek()
+        return token is not None and token.kind in ("name", "symbol") and token.value in values
+
+    def expect(self, value: str) -> Token:
+        token = self.next()
+        if token.value != value or token.kind not in ("name", "symbol"): raise self.error(f"expected {value!r}, got {token.value!r}", token)
+        return token
+
+    def expect_name(self) -> str:
+        token = self.next()
+        if token.kind != "name": raise self.error(f"expected a name, got {token.value!r}", token)
+        return token.value
+
+    def expect_number(self) -> int:
+        token = self.next()
+        if token.kind != "number": raise self.error(f"expected a number, got {token.value!r}", token)
+        return int(token.value)
+
+    def end_block(self, name: str) -> Token:
+        """Parse the '} name;' closing a block."""
+        self.expect("}")
+        token = self.next()
+        if token.value != name: raise self.error(f"block {name!r} closed as {token.value!r}", token)
+        return self.expect(";")
+
+    # GLYPHS ====================================
+
+    def glyph(self, token: Token) -> str:
+        if self.glyph_names is not None and token.value not in self.glyph_names:
+            raise self.error(f"unknown glyph {token.value!r}", token)
+        self.block_glyphs.add(token.value)
+        return token.value
+
+    def glyph_set(self) -> Tuple[str, ...]:
+        """A glyph, a [class] or an @class, as an ordered tuple without duplicates."""
+        token = self.next()
+        if token.kind == "name": return (self.glyph(token),)
+        if token.kind == "class":
+            if token.value not in self.classes: raise self.error(f"unknown glyph class {token.value!r}", token)
+            self.block_glyphs.update(self.classes[token.value])
+            return self.classes[token.value]
+        if token.value != "[": raise self.error(f"expected a glyph or a glyph class, got {token.value!r}", token)
+        glyphs: List[str] = []
+        while not self.at("]"):
+            for glyph in self.glyph_set():
+                if glyph not in glyphs: glyphs.append(glyph)
+        self.next()
+        return tuple(glyphs)
+
+    def at_glyph_set(self) -> bool:
+        token = self.peek()
+        return token is not None and (token.kind in ("name", "class") or token.value == "[") and not self.at("by", "from")
+
+    # TOP LEVEL =================================
+
+    def parse(self) -> Layout:
+        while self.peek() is not None:
+            token = self.peek()
+            if token.kind == "class": self.class_definition()
+            elif self.at("languagesystem"): self.language_system()
+            elif self.at("table"): self.table()
+            elif self.at("feature"): self.feature()
+            elif self.at("lookup"): self.lookup_block(register=None)
+            elif self.at(";"): self.next()
+            else: raise self.error(f"unsupported statement {token.value!r}")
+        return self.layout
+
+    def class_definition(self) -> None:
+        name = self.next().value
+        self.expect("=")
+        glyphs = self.glyph_set()
+        self.expect(";")
+        self.classes[name] = glyphs
+
+    def language_system(self) -> None:
+        self.next()
+        script, language = self.expect_name(), self.expect_name()
+        self.expect(";")
+        if (script, language) not in self.language_systems: self.language_systems.append((script, language))
+
+    def table(self) -> None:
+        self.next()
+        tag = self.expect_name()
+        if tag != "GDEF": raise self.error(f"unsupported table {tag!r}")
+        self.expect("{")
+        while not self.at("}"):
+            if not self.at("GlyphClassDef"): raise self.error(f"unsupported GDEF statement {self.peek().value!r}")
+            self.next()
+            for glyph_class in GLYPH_CLASS_ORDER:
+                if not self.at(",", ";"):
+                    for glyph in self.glyph_set(): self.layout.glyph_classes[glyph] = glyph_class
+                if glyph_class != COMPONENT_GLYPH: self.expect(",")
+            self.expect(";")
+        self.end_block(tag)
+
+    # FEATURES ==================================
+
+    def feature(self) -> None:
+        self.next()
+        tag = self.expect_name()
+        self.expect("{")
+
+        targets = list(self.language_systems or [DEFAULT_LANGUAGE_SYSTEM])
+        script = targets[0][0]
+        flag = 0
+        implicit: Optional[Lookup] = None  # Lookup collecting the rules written directly in the feature
+
+        def register(lookup: Lookup) -> None:
+            systems = self.layout.features.setdefault((lookup.table, tag), {})
+            for target in targets:
+                lookups = systems.setdefault(target, [])
+                if lookup not in lookups: lookups.append(lookup)
+
+        while not self.at("}"):
+            token = self.peek()
+            if self.at("script"):
+                self.next()
+                script = self.expect_name()
+                self.expect(";")
+                targets = [(script, "dflt")]
+                implicit = None
+            elif self.at("language"):
+                self.next()
+                language = self.expect_name()
+                include_default = True
+                while not self.at(";"):
+                    option = self.expect_name()
+                    if option == "exclude_dflt": include_default = False
+                    elif option not in ("include_dflt", "required"):  # required is ignored, like FontForge does
+                        raise self.error(f"unexpected {option!r} in language statement")
+                self.next()
+                targets = [(script, language)]
+                if language != "dflt" and include_default:
+                    for (table, feature_tag), systems in self.layout.features.items():
+                        if feature_tag == tag and (script, "dflt") in systems:
+                            systems.setdefault((script, language), list(systems[(script, "dflt")]))
+                implicit = None
+            elif self.at("lookupflag"):
+                flag = self.lookup_flag()
+                implicit = None
+            elif self.at("lookup") and self.peek(2) is not None and self.peek(2).value == ";":
+                self.next()
+                name = self.expect_name()
+                self.expect(";")
+                if name not in self.named: raise self.error(f"unknown lookup {name!r}", token)
+                register(self.named[name])
+                implicit = None
+            elif self.at("lookup"):
+                self.lookup_block(register)
+                implicit = None
+            elif self.at("sub", "substitute", "pos", "position"):
+                self.block_glyphs = set()
+                start = self.position
+                rule_lookup = self.rule(implicit, flag)
+                if rule_lookup is not implicit:
+                    implicit = rule_lookup
+                    self.layout.lookups.append(implicit)
+                    register(implicit)
+                implicit.source += self.text[self.tokens[start].start:self.tokens[self.position - 1].end] + "\n"
+                implicit.glyphs |= self.block_glyphs
+            elif self.at(";"):
+                self.next()
+            else:
+                raise self.error(f"unsupported statement {token.value!r} in feature {tag!r}")
+
+        self.end_block(tag)
+
+    def lookup_flag(self) -> int:
+        self.next()
+        flag = 0
+        if self.peek() is not None and self.peek().kind == "number":
+            flag = self.expect_number()
+        else:
+            while not self.at(";"):
+                token = self.next()
+                if token.value not in LOOKUP_FLAGS: raise self.error(f"unsupported lookup flag {token.value!r}", token)
+                flag |= LOOKUP_FLAGS[token.value]
+        self.expect(";")
+        return flag
+
+    def lookup_block(self, register) -> None:
+        start = self.next()
+        name = self.expect_name()
+        if name in self.named: raise self.error(f"lookup {name!r} is already defined", start)
+        if self.at("useExtension"): self.next()
+        self.expect("{")
+
+        self.block_glyphs = set()
+        flag = 0
+        lookup: Optional[Lookup] = None
+        while not self.at("}"):
+            if self.at("lookupflag"):
+                if lookup is not None: raise self.error(f"lookupflag must come before the rules of lookup {name!r}")
+                flag = self.lookup_flag()
+            elif self.at(";"):
+                self.next()
+            elif self.at("sub", "substitute", "pos", "position"):
+                token = self.peek()
+                rule_lookup = self.rule(lookup, flag, name)
+                if lookup is not None and rule_lookup is not lookup:
+                    raise self.error(f"rules of different types in lookup {name!r}", token)
+                lookup = rule_lookup
+            else:
+                raise self.error(f"unsupported statement {self.peek().value!r} in lookup {name!r}")
+        end = self.end_block(name)
+
+        if lookup is None: raise self.error(f"lookup {name!r} is empty", start)
+        lookup.source = self.text[start.start:end.end]
+        lookup.glyphs = self.block_glyphs
+        self.named[name] = lookup
+        self.layout.lookups.append(lookup)
+        if register is not None: register(lookup)
+
+    # RULES =====================================
+
+    def rule(self, lookup: Optional[Lookup], flag: int, name: Optional[str] = None) -> Lookup:
+        """
+        Parse a sub or pos rule and add it to lookup, or to a new lookup when it does not fit
+        (lookup is None or of another type).
+
+        Returns:
+            Lookup: Where the rule went.
+        """
+        token = self.next()
+        try:
+            if token.value in ("sub", "substitute"): return self.substitution(lookup, flag, name)
+            return self.positioning(lookup, flag, name)
+        except LayoutError as e:
+            raise self.error(str(e), token) from None
+
+    def _lookup_for(self, lookup: Optional[Lookup], table: str, lookup_type: int, flag: int, name: Optional[str]) -> Lookup:
+        if lookup is not None and lookup.table == table and lookup.type == lookup_type: return lookup
+        return Lookup(table, lookup_type, flag, name)
+
+    def pattern(self):
+        """Glyph sets up to 'by' or ';', and which ones are marked with '."""
+        sets, marked = [], []
+        while self.at_glyph_set():
+            sets.append(self.glyph_set())
+            marked.append(self.at("'"))
+            if marked[-1]: self.next()
+        return sets, marked
+
+    def substitution(self, lookup: Optional[Lookup], flag: int, name: Optional[str]) -> Lookup:
+        token = self.peek()
+        sets, marked = self.pattern()
+        if self.at("from"): raise self.error("alternate substitutions are not supported")
+        self.expect("by")
+        replacement = []
+        while self.at_glyph_set(): replacement.append(self.glyph_set())
+        self.expect(";")
+        if not sets or not replacement: raise self.error("incomplete substitution", token)
+
+        if any(marked):
+            first = marked.index(True)
+            last = len(marked) - marked[::-1].index(True)
+            if not all(marked[first:last]): raise self.error("the marked glyphs of a rule must follow each other", token)
+            lookup = self._lookup_for(lookup, GSUB, CHAIN_SUB, flag, name)
+            inputs = sets[first:last]
+            lookup_type, entries = self.substitution_entries(inputs, replacement, token)
+            action = lookup.nested_lookup(lookup_type, entries)
+            lookup.add_chain_rule(ChainRule(
+                [frozenset(glyphs) for glyphs in sets[:first]],
+                [frozenset(glyphs) for glyphs in inputs],
+                [frozenset(glyphs) for glyphs in sets[last:]],
+                [(0, action)],
+            ))
+            return lookup
+
+        lookup_type, entries = self.substitution_entries(sets, replacement, token)
+        lookup = self._lookup_for(lookup, GSUB, lookup_type, flag, name)
+        for key, value in entries.items(): lookup.add(key, value)
+        return lookup
+
+    def substitution_entries(self, inputs, replacement, token: Token):
+        """Expand the glyph classes of a substitution into (lookup type, {input: output})."""
+        if len(inputs) == 1 and len(replacement) == 1:
+            glyphs, targets = inputs[0], replacement[0]
+            if len(targets) == 1: return SINGLE_SUB, {glyph: targets[0] for glyph in glyphs}
+            if len(targets) != len(glyphs): raise self.error("a class can only be replaced by a class of the same size", token)
+            return SINGLE_SUB, dict(zip(glyphs, targets))
+        if any(len(glyphs) != 1 for glyphs in replacement): raise self.error("the replacement sequence cannot contain classes", token)
+        if len(inputs) == 1:
+            return MULTIPLE_SUB, {glyph: tuple(glyphs[0] for glyphs in replacement) for glyph in inputs[0]}
+        if len(replacement) == 1:
+            return LIGATURE_SUB, {components: replacement[0][0] for components in product(*inputs)}
+        raise self.error("cannot replace a sequence by another sequence", token)
+
+    def value_record(self) -> ValueRecord:
+        if self.peek() is not None and self.peek().kind == "number": return ValueRecord(x_advance=self.expect_number())
+        self.expect("<")
+        if self.at("NULL"):
+            self.next()
+            values = [0, 0, 0, 0]
+        else:
+            values = [self.expect_number()]
+            if not self.at(">"): values += [self.expect_number() for _ in range(3)]
+            else: values = [0, 0, values[0], 0]
+        self.expect(">")
+        return ValueRecord(*values)
+
+    def at_value_record(self) -> bool:
+        token = self.peek()
+        return token is not None and (token.kind == "number" or token.value == "<")
+
+    def positioning(self, lookup: Optional[Lookup], flag: int, name: Optional[str]) -> Lookup:
+        token = self.peek()
+        sets = []
+        values = []
+        while self.at_glyph_set():
+            sets.append(self.glyph_set())
+            if self.at("'"): raise self.error("contextual positioning is not supported")
+            values.append(self.value_record() if self.at_value_record() else None)
+        self.expect(";")
+
+        if len(sets) == 1 and values[0] is not None:
+            lookup = self._lookup_for(lookup, GPOS, SINGLE_POS, flag, name)
+            for glyph in sets[0]: lookup.add(glyph, values[0])
+            return lookup
+        if len(sets) == 2 and values[1] is not None and values[0] is None:
+            lookup = self._lookup_for(lookup, GPOS, PAIR_POS, flag, name)
+            for pair in product(*sets): lookup.add(pair, values[1])
+            return lookup
+        raise self.error("unsupported positioning rule", token)
+
+
+def parse_features(text: str, glyph_names=None, source: str = "<features>") -> Layout:
+    """
+    Parameters:
+        text (str): Content of the feature file.
+        glyph_names (Iterable[str]): Glyphs of the font, to report unknown names. (not checked if None)
+        source (str): Name used in error messages.
+    """
+    return _Parser(text, source, set(glyph_names) if glyph_names is not None else None).parse()
+
+def parse_feature_file(path, glyph_names=None) -> Layout:
+    # features.fea has latin-1 accents in its comments
+    with open(path, 'r', encoding='latin-1') as f: return parse_features(f.read(), glyph_names, Path(path).name)
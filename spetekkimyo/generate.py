@@ -1,57 +1,134 @@
 import os
 import sys
 import json
-from typing import List # type: ignore
+import threading
+from typing import List, Optional # type: ignore
 from pathlib import Path # type: ignore
 import fontforge
 
-if len(sys.argv) <= 1: raise ValueError("Missing output_dir argument")
-
 root_dir = Path(__file__).parent.resolve()
-feature_path = root_dir / 'input' / 'features.fea'
-glyph_dir = root_dir / 'input' / 'glyphs'
-padding_path = root_dir / 'input' / 'padding.json'
-output_path = root_dir / Path(sys.argv[1]) if sys.argv[1][1] == ":" else Path(sys.argv[1])
-
-font = fontforge.font()
-
-# CONFIG ========================================
-
-font.fontname = "Seiso"
-font.fullname = "spe seiso tekkimyo"
-font.familyname = "Seiso"
-font.encoding = "UnicodeFull"  # Use full Unicode encodingdisc
-
-default_padding = 0
-
-# END CONFIG ====================================
-
-with open(padding_path, 'r') as f: padding_dict = json.load(f)
-
-imported: List[str] = []
-
-for entry in os.listdir(glyph_dir):
-
-    glyph_path = os.path.join(glyph_dir, entry)
-    if os.path.isfile(glyph_path):
-
-        glyph_name = entry.removesuffix(".eps")
-        imported.append(glyph_name)
-        
-        glyph = font.createChar(-1, glyph_name)
-        glyph.importOutlines(glyph_path)
-        
-        # Set glyph width based on rightmost point
-        bbox = glyph.boundingBox()
-        # Use custom padding if available, otherwise use default
-        padding = padding_dict.get(glyph_name, default_padding)
-        glyph.width = int(bbox[2] + padding)  # Use xmax (rightmost point) + padding
-
-print("Imported", len(imported), "glyphs:", " ".join(imported))
-
-font.mergeFeature(str(feature_path))
-print("Imported features")
-
-font.generate(str(output_path))
-
-print("Font generated at", output_path)
+sys.path.insert(0, str(root_dir.parent))  # generate.py runs as a script inside ffpython
+# Every spetekkimyo module imported here, and the ones they import, must stay runnable in ffpython (3.10)
+from spetekkimyo.cache import BuildCache, collect_inputs, hash_json
+from spetekkimyo.config import (
+    ENCODING, FONT_NAMES, TIMESTAMP_VARIABLE, config_key, default_padding, feature_path, glyph_dir, glyph_order_path, padding_path, timestamp,
+)
+from spetekkimyo.glyphs import advance_width, load_glyphs
+from spetekkimyo.otf import glyph_order, read_glyph_order
+from spetekkimyo.patch import patch_font
+from spetekkimyo.profiling import GLYPH, BuildProfile
+from spetekkimyo.publish import publish_font
+from spetekkimyo.sfnt import woff_path, write_woff
+from spetekkimyo.worker import check_cancelled
+
+def load_contours(glyph, contours) -> None:
+    """Draw parsed contours (see eps.py) into the glyph."""
+    layer = fontforge.layer()
+    for points in contours:
+        contour = fontforge.contour()
+        for x, y, on_curve in points: contour += fontforge.point(x, y, on_curve)
+        contour.closed = True
+        layer += contour
+    glyph.foreground = layer
+
+def build(output_path: Path, use_cache: bool = True, profile: Optional[BuildProfile] = None,
+          cancelled: Optional[threading.Event] = None) -> BuildProfile:
+    """
+    Build the font from the input folder and write it to output_path.
+
+    Parameters:
+        output_path (Path): Absolute location of the generated font.
+        use_cache (bool): Reuse the glyphs cached by previous builds, skip the build
+            entirely if none of the inputs changed and patch the previous font if only the
+            feature file did. (see patch.py)
+        profile (BuildProfile): Where the timings of the build go, a new one by default.
+        cancelled (threading.Event): Set to abandon the build, which raises BuildCancelled at
+            the end of the phase it is in. The font is written to a temporary file and moved
+            into place once complete, a build abandoned or interrupted leaves the previous one.
+
+    Returns:
+        BuildProfile: Timings of every phase of the build.
+    """
+    profile = profile if profile is not None else BuildProfile()
+    cache = BuildCache()
+
+    with profile.phase("collect inputs"):
+        with open(padding_path, 'r') as f: padding_dict = json.load(f)
+
+        # Hash every input first, this is cheap compared to parsing the outlines
+        sources, inputs = collect_inputs(glyph_dir, padding_path, feature_path, config=[config_key(), "fontforge"], order_path=glyph_order_path)
+        build_key = hash_json(inputs)
+
+    if use_cache and cache.output_is_fresh(output_path, build_key):
+        print("Font up to date at", output_path)
+        if woff_path(output_path) and not woff_path(output_path).is_file(): write_woff(output_path)
+        publish_font(output_path)
+        return profile
+    check_cancelled(cancelled)
+    if use_cache:
+        with profile.phase("patch"): patched = patch_font(output_path, "fontforge", cache)
+        if patched: return profile
+
+    # FontForge dates the font (head, name) with $SOURCE_DATE_EPOCH when it is set, instead of now
+    os.environ[TIMESTAMP_VARIABLE] = str(timestamp)
+    font = fontforge.font()
+    for attribute, value in FONT_NAMES.items(): setattr(font, attribute, value)
+    font.appendSFNTName("English (US)", "UniqueID", f"{FONT_NAMES['fullname']} : {FONT_NAMES['fontname']}")  # Same as otf.build_tables
+    font.encoding = ENCODING
+
+    with profile.phase("load glyphs"):
+        entries, imported = load_glyphs(sources, cache, use_cache, profile)
+    reused: List[str] = sorted(set(entries) - set(imported))
+    check_cancelled(cancelled)
+
+    order = read_glyph_order(glyph_order_path)
+    with profile.phase("draw outlines"):
+        for glyph_name in glyph_order(entries, order)[1:]:  # Deterministic order, whatever os.listdir returns
+            glyph = font.createChar(-1, glyph_name)
+            with profile.phase("draw outline", GLYPH, glyph=glyph_name):
+                load_contours(glyph, entries[glyph_name]["contours"])
+    check_cancelled(cancelled)
+
+    with profile.phase("padding"):
+        for glyph_name in sorted(entries):
+            # Set glyph width based on rightmost point
+            # Use custom padding if available, otherwise use default
+            padding = padding_dict.get(glyph_name, default_padding)
+            font[glyph_name].width = advance_width(entries[glyph_name]["bbox"], padding)  # Use xmax (rightmost point) + padding
+
+    print("Imported", len(imported), "glyphs:", " ".join(imported))
+    if reused: print("Reused", len(reused), "cached glyphs")
+
+    with profile.phase("merge features"):
+        font.mergeFeature(str(feature_path))
+    print("Imported features")
+    check_cancelled(cancelled)
+
+    with profile.phase("generate"):
+        # Glyphs are laid out in the order of the encoding, which only follows the order file
+        # once the font is reencoded in the order the glyphs were created
+        if order: font.encoding = "Original"
+        tmp_path = output_path.with_name(output_path.stem + ".tmp" + output_path.suffix)  # FontForge picks the format from the extension
+        font.generate(str(tmp_path))
+        os.replace(tmp_path, output_path)
+    with profile.phase("woff"):
+        write_woff(output_path)  # From the font just written, not a second generate
+    with profile.phase("publish"):
+        publish_font(output_path)
+
+    cache.record_output(output_path, build_key, inputs)
+    cache.save()
+
+    print("Font generated at", output_path)
+    return profile
+
+if __name__ == "__main__":
+
+    if len(sys.argv) <= 1: raise ValueError("Missing output_dir argument")
+
+    output_path = root_dir / Path(sys.argv[1]) if sys.argv[1][1] == ":" else Path(sys.argv[1])
+
+    profile = build(output_path, use_cache="--no-cache" not in sys.argv[2:])
+
+    if "--profile" in sys.argv[2:]:  # Followed by where to write the timings, read back by backend.py
+        with open(sys.argv[sys.argv.index("--profile") + 1], 'w') as f: json.dump(profile.to_dict(), f)
@@ -0,0 +1,141 @@
+"""
+Glyph import stage : parse the EPS sources, clean their outlines and compute their
+metrics, spread over a process pool when there are enough glyphs to make it worth it.
+
+The pool is kept alive between calls, so a long-lived process (such as the build worker)
+only pays for starting it once.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple # type: ignore
+
+from .cache import BuildCache
+from .eps import BoundingBox, Contour, bounding_box, parse_eps
+from .profiling import GLYPH, BuildProfile
+
+PARALLEL_THRESHOLD = 64  # Below that, starting the pool costs more than parsing everything
+
+
+class ImportedGlyph(NamedTuple):
+    name: str
+    contours: List[Contour]
+    bbox: BoundingBox
+    timings: Tuple[Tuple[str, float, float], ...] = ()  # (step, start, seconds), see profiling.py
+    pid: int = 0  # Process the glyph was imported in
+
+
+def clean_contours(contours: List[Contour]) -> List[Contour]:
+    """Drop repeated on-curve points and contours that cannot enclose anything."""
+    cleaned = []
+    for contour in contours:
+        points = []
+        for point in contour:
+            if point[2] and points and points[-1][2] and points[-1][:2] == point[:2]: continue
+            points.append(point)
+        if len(points) > 1 and points[-1][2] and points[-1][:2] == points[0][:2]: points.pop()
+        if len(points) >= 3 or (len(points) == 2 and not all(point[2] for point in points)):
+            cleaned.append(points)
+    return cleaned
+
+def _signed_area(contour: Contour) -> float:
+    """Twice the area of the polygon of the points, positive when counter-clockwise."""
+    return sum(x0 * y1 - x1 * y0 for (x0, y0, _), (x1, y1, _) in zip(contour, contour[1:] + contour[:1]))
+
+def _encloses(contour: Contour, x: float, y: float) -> bool:
+    """Whether the polygon of the points (control points included) encloses (x, y), even-odd."""
+    inside = False
+    for (x0, y0, _), (x1, y1, _) in zip(contour, contour[1:] + contour[:1]):
+        if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0): inside = not inside
+    return inside
+
+def correct_directions(contours: List[Contour]) -> List[Contour]:
+    """
+    Turn outer contours counter-clockwise and the ones they enclose clockwise, alternating with
+    depth, as FontForge's EPS import does. A contour is reversed from the same start point.
+    """
+    corrected = []
+    for index, contour in enumerate(contours):
+        x, y, _ = contour[0]
+        depth = sum(_encloses(other, x, y) for other_index, other in enumerate(contours) if other_index != index)
+        if (_signed_area(contour) > 0) == (depth % 2 == 1): contour = contour[:1] + contour[:0:-1]
+        corrected.append(contour)
+    return corrected
+
+def import_glyph(job: Tuple[str, str]) -> ImportedGlyph:
+    """Parse a single glyph. (job = (glyph name, eps path))"""
+    name, path = job
+    start = time.time()
+    started = time.perf_counter()
+    contours = correct_directions(clean_contours(parse_eps(path)))
+    parsed = time.perf_counter()
+    bbox = bounding_box(contours)
+    timings = (("eps parse", start, parsed - started), ("bounding box", start + parsed - started, time.perf_counter() - parsed))
+    return ImportedGlyph(name, contours, bbox, timings, os.getpid())
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0  # Size of _executor
+
+def _get_executor(workers: Optional[int]) -> ProcessPoolExecutor:
+    global _executor, _executor_workers
+    workers = workers or os.cpu_count() or 1
+    if _executor is None or _executor_workers != workers:
+        if _executor is not None: _executor.shutdown()
+        _executor = ProcessPoolExecutor(max_workers=workers)
+        _executor_workers = workers
+    return _executor
+
+def import_glyphs(sources: Dict[str, str], workers: Optional[int] = None) -> List[ImportedGlyph]:
+    """
+    Import every glyph of sources, in parallel when there are many of them.
+
+    Parameters:
+        sources (dict): Glyph name to eps path.
+        workers (int): Size of the process pool. (defaults to the number of cores, 1 disables the pool)
+
+    Returns:
+        List[ImportedGlyph]: Sorted by glyph name, whatever the order the workers finished in.
+    """
+    jobs = sorted(sources.items())
+    if workers == 1 or len(jobs) < PARALLEL_THRESHOLD:
+        return [import_glyph(job) for job in jobs]
+    executor = _get_executor(workers)
+    chunksize = max(1, len(jobs) // (4 * _executor_workers))
+    return list(executor.map(import_glyph, jobs, chunksize=chunksize))  # map keeps the submission order
+
+
+def load_glyphs(sources: Dict[str, Tuple[str, str]], cache: BuildCache, use_cache: bool = True, profile: Optional[BuildProfile] = None):
+    """
+    Get the outlines of every glyph, from the cache when their source did not change.
+
+    Parameters:
+        sources (dict): Glyph name to (eps path, content hash), as returned by cache.collect_inputs.
+        profile (BuildProfile): Receives the parse and bounding box timings of every imported glyph.
+
+    Returns:
+        entries (dict): Glyph name to {"contours", "bbox"}.
+        imported (list): Names of the glyphs that had to be parsed.
+    """
+    entries = {}
+    dirty = {}
+    for glyph_name, (glyph_path, key) in sources.items():
+        entry = cache.load_glyph(key) if use_cache else None
+        if entry is None: dirty[glyph_name] = glyph_path
+        else: entries[glyph_name] = entry
+
+    # Only the glyphs whose source changed are parsed, across a process pool if there are many
+    for imported_glyph in import_glyphs(dirty):
+        cache.store_glyph(sources[imported_glyph.name][1], imported_glyph.contours, imported_glyph.bbox)
+        entries[imported_glyph.name] = {"contours": imported_glyph.contours, "bbox": imported_glyph.bbox}
+        if profile is not None:
+            for step, start, seconds in imported_glyph.timings:
+                profile.add(step, start, seconds, GLYPH, pid=imported_glyph.pid, tid=imported_glyph.pid, glyph=imported_glyph.name)
+
+    return entries, sorted(dirty)
+
+
+def advance_width(bbox: BoundingBox, padding: float) -> int:
+    """Glyph width based on the rightmost point of the outlines plus its padding."""
+    return int(bbox[2] + padding)
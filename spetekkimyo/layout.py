@@ -0,0 +1,248 @@
+"""
+OpenType layout lookups by glyph name : what the feature file describes once its rules
+are expanded, before glyph ids and binary offsets come into play.
+
+fea.py builds these from features.fea, otl.py turns them into GSUB/GPOS/GDEF tables.
+
+NOTE : Only the lookup types features.fea uses are modelled :
+    GSUB 1 (single), 2 (multiple), 4 (ligature), 6 (chained context)
+    GPOS 1 (single), 2 (pair)
+"""
+
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple # type: ignore
+
+GSUB = "GSUB"
+GPOS = "GPOS"
+
+# Lookup types
+SINGLE_SUB = 1
+MULTIPLE_SUB = 2
+LIGATURE_SUB = 4
+CHAIN_SUB = 6
+SINGLE_POS = 1
+PAIR_POS = 2
+
+# Lookup flags
+RIGHT_TO_LEFT = 0x0001
+IGNORE_BASE_GLYPHS = 0x0002
+IGNORE_LIGATURES = 0x0004
+IGNORE_MARKS = 0x0008
+
+# GDEF glyph classes
+BASE_GLYPH = 1
+LIGATURE_GLYPH = 2
+MARK_GLYPH = 3
+COMPONENT_GLYPH = 4
+
+GlyphSet = FrozenSet[str]
+
+
+class LayoutError(ValueError):
+    """A lookup that cannot be built, read or applied, such as two of its rules contradicting each other."""
+
+
+class UnsupportedLookup(LayoutError):
+    """A lookup of a type the compiler or the shaper does not handle, with the block it comes from."""
+
+    def __init__(self, lookup: "Lookup", action: str):
+        self.lookup = lookup
+        message = f"Cannot {action} {lookup.table} lookups of type {lookup.type}, in lookup {lookup.name or 'anonymous'}"
+        if lookup.source: message += " of features.fea :\n" + lookup.source
+        super().__init__(message)
+
+
+class ValueRecord(NamedTuple):
+    """Position adjustment, in the order of the feature file's <xPla yPla xAdv yAdv>."""
+    x_placement: int = 0
+    y_placement: int = 0
+    x_advance: int = 0
+    y_advance: int = 0
+
+
+class ChainRule(NamedTuple):
+    backtrack: List[GlyphSet]  # In reading order, the glyph right before the input comes last
+    input: List[GlyphSet]
+    lookahead: List[GlyphSet]
+    actions: List[Tuple[int, "Lookup"]]  # (input position, lookup applied there)
+
+
+class Lookup:
+    """
+    A lookup and its rules, keyed by glyph name.
+
+    mapping depends on the lookup type :
+        SINGLE_SUB   glyph -> glyph
+        MULTIPLE_SUB glyph -> (glyph, ...)
+        LIGATURE_SUB (component, ...) -> glyph
+        SINGLE_POS   glyph -> ValueRecord
+        PAIR_POS     (first, second) -> ValueRecord of the first glyph
+    CHAIN_SUB lookups keep an ordered list of ChainRule instead, the first one matching wins.
+
+    Parameters:
+        table (str): GSUB or GPOS.
+        lookup_type (int): One of the lookup types above.
+        flag (int): Lookup flags, such as IGNORE_MARKS.
+        name (str): Name of the lookup block, None for the lookups chained rules create.
+    """
+
+    def __init__(self, table: str, lookup_type: int, flag: int = 0, name: Optional[str] = None):
+        self.table = table
+        self.type = lookup_type
+        self.flag = flag
+        self.name = name
+        self.mapping: dict = {}
+        self.rules: List[ChainRule] = []
+        self.nested: List[Lookup] = []  # Anonymous lookups called by the rules, in creation order
+        self.source = ""  # Text of the lookup block, shown in errors
+        self.glyphs: Set[str] = set()  # Every glyph name the block mentions
+
+    def __repr__(self) -> str:
+        return f"<Lookup {self.name or 'anonymous'} {self.table} type {self.type}>"
+
+    def add(self, key, value) -> None:
+        """Add key -> value to mapping. Conflicting rules are an error, except for pairs where the first one defined wins."""
+        if key in self.mapping:
+            if self.mapping[key] != value and not (self.table == GPOS and self.type == PAIR_POS):
+                raise LayoutError(f"Conflicting rules for {key!r} in lookup {self.name or 'anonymous'}")
+            return
+        self.mapping[key] = value
+
+    def add_chain_rule(self, rule: ChainRule) -> None:
+        self.rules.append(rule)
+
+    def can_take(self, key, value) -> bool:
+        """True if key -> value can be added to this lookup without changing what its other rules do."""
+        if key in self.mapping: return self.mapping[key] == value
+        if self.type == LIGATURE_SUB:
+            # A longer ligature starting the same way would be tried first and shadow the shorter one
+            return not any(other[:len(key)] == key or key[:len(other)] == other for other in self.mapping)
+        return True
+
+    def nested_lookup(self, lookup_type: int, entries: dict) -> "Lookup":
+        """
+        The anonymous lookup a chained rule of this lookup applies, sharing an existing one
+        whenever the rule's substitutions (entries) do not contradict it.
+        """
+        for lookup in self.nested:
+            if lookup.type == lookup_type and all(lookup.can_take(key, value) for key, value in entries.items()): break
+        else:
+            lookup = Lookup(self.table, lookup_type, self.flag)
+            self.nested.append(lookup)
+        for key, value in entries.items(): lookup.add(key, value)
+        return lookup
+
+    def footprint(self) -> Tuple[Set[str], Set[str]]:
+        """
+        Glyphs the rules look at, and glyphs they change : the glyphs substituted and what they
+        become for GSUB, the glyphs positioned for GPOS. Nested lookups included.
+        """
+        if self.table == GPOS:
+            seen = {glyph for key in self.mapping for glyph in ((key,) if isinstance(key, str) else key)}
+            return seen, {key if isinstance(key, str) else key[0] for key in self.mapping}
+        if self.type == CHAIN_SUB:
+            seen = {glyph for rule in self.rules for sets in (rule.backtrack, rule.input, rule.lookahead) for glyphs in sets for glyph in glyphs}
+            changed = {glyph for rule in self.rules for glyphs in rule.input for glyph in glyphs}
+            for nested in self.nested: changed |= nested.footprint()[1]
+            return seen, changed
+        seen = {glyph for key in self.mapping for glyph in ((key,) if isinstance(key, str) else key)}
+        outputs = {glyph for value in self.mapping.values() for glyph in ((value,) if isinstance(value, str) else value)}
+        return seen, seen | outputs
+
+    @property
+    def max_context(self) -> int:
+        """Longest glyph sequence the lookup looks at, for OS/2 usMaxContext."""
+        if self.type == CHAIN_SUB and self.table == GSUB:
+            return max((len(rule.backtrack) + len(rule.input) + len(rule.lookahead) for rule in self.rules), default=0)
+        if self.type == LIGATURE_SUB and self.table == GSUB:
+            return max((len(components) for components in self.mapping), default=0)
+        if self.type == PAIR_POS and self.table == GPOS: return 2
+        return 1 if self.mapping else 0
+
+
+class Layout:
+    """
+    Everything a feature file defines.
+
+    Parameters:
+        glyph_classes (dict): GDEF glyph class (BASE_GLYPH...) of the glyphs the file classifies.
+        lookups (list): Named lookups in definition order, their nested lookups hang off them.
+        features (dict): (table, feature tag) to {(script, language): [lookup, ...]}.
+    """
+
+    def __init__(self):
+        self.glyph_classes: Dict[str, int] = {}
+        self.lookups: List[Lookup] = []
+        self.features: Dict[Tuple[str, str], Dict[Tuple[str, str], List[Lookup]]] = {}
+
+    def table_lookups(self, table: str) -> List[Lookup]:
+        """Lookups of a table in LookupList order : the named ones, then the nested ones."""
+        named = [lookup for lookup in self.lookups if lookup.table == table]
+        return named + [nested for lookup in named for nested in lookup.nested]
+
+    @property
+    def max_context(self) -> int:
+        return max((lookup.max_context for lookup in self.lookups), default=0)
+
+    def skipped_glyphs(self, flag: int) -> Set[str]:
+        """Glyphs lookups with this flag pass over, according to their GDEF class."""
+        ignored = {glyph_class for bit, glyph_class in ((IGNORE_BASE_GLYPHS, BASE_GLYPH), (IGNORE_LIGATURES, LIGATURE_GLYPH), (IGNORE_MARKS, MARK_GLYPH)) if flag & bit}
+        return {glyph for glyph, glyph_class in self.glyph_classes.items() if glyph_class in ignored}
+
+    def merge_lookups(self) -> "Layout":
+        """
+        A copy of the layout where adjacent named lookups of a table are merged into one
+        wherever a single pass does what the two passes did : same type, flag and features,
+        and neither one looks at a glyph the other one changes (GSUB) or both position
+        different glyphs (GPOS). The glyphs they change must not be ones the flag skips either,
+        since whether a glyph is skipped would then depend on which pass came first.
+
+        Rules keep their order, the rules of the first lookup are tried first. Lookups left
+        alone are shared with this layout, merged ones are new and named "<first>+<second>".
+        """
+        def memberships(lookup: Lookup):
+            return frozenset((feature, system) for feature, languages in self.features.items() for system, lookups in languages.items() if lookup in lookups)
+
+        groups: List[list] = []  # [lookups, features, seen, changed]
+        last: Dict[str, Optional[list]] = {}  # Per table, the group the next lookup could join
+        for lookup in self.lookups:
+            seen, changed = lookup.footprint()
+            membership = memberships(lookup)
+            mergeable = lookup.table == GPOS or not changed & self.skipped_glyphs(lookup.flag)
+            group = last.get(lookup.table)
+            if mergeable and group is not None and (group[0][0].type, group[0][0].flag, group[1]) == (lookup.type, lookup.flag, membership) and (
+                not changed & group[3] if lookup.table == GPOS else not (seen & group[3] or changed & group[2])
+            ):
+                group[0].append(lookup)
+                group[2] |= seen
+                group[3] |= changed
+                continue
+            group = [[lookup], membership, seen, changed]
+            groups.append(group)
+            last[lookup.table] = group if mergeable else None
+
+        layout = Layout()
+        layout.glyph_classes = self.glyph_classes
+        replacements: Dict[int, Lookup] = {}
+        for lookups, *_ in groups:
+            merged = lookups[0] if len(lookups) == 1 else _merge(lookups)
+            layout.lookups.append(merged)
+            for lookup in lookups: replacements[id(lookup)] = merged
+        for feature, languages in self.features.items():
+            layout.features[feature] = {
+                system: list({id(replacements[id(lookup)]): replacements[id(lookup)] for lookup in lookups}.values())
+                for system, lookups in languages.items()
+            }
+        return layout
+
+
+def _merge(lookups: List[Lookup]) -> Lookup:
+    """One lookup applying the rules of lookups, in order. (see Layout.merge_lookups)"""
+    first = lookups[0]
+    merged = Lookup(first.table, first.type, first.flag, "+".join(lookup.name or "anonymous" for lookup in lookups))
+    for lookup in lookups:
+        for key, value in lookup.mapping.items(): merged.mapping.setdefault(key, value)
+        merged.rules += lookup.rules
+        merged.nested += lookup.nested
+        merged.glyphs |= lookup.glyphs
+    merged.source = "\n".join(lookup.source for lookup in lookups)
+    return merged
@@ -0,0 +1,338 @@
+"""
+Build the tables of a CFF flavoured OpenType font from parsed glyphs, without FontForge.
+Defaults follow what FontForge writes for a new font, so both backends agree.
+
+The cmap and metrics of a built font can be read back (read_cmap, read_advances,
+read_vertical_metrics) for the shaper and the rasterizer.
+"""
+
+import os
+import math
+import struct
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple # type: ignore
+
+from . import config
+from .cff import build_cff
+from .eps import BoundingBox, Contour
+from .glyphs import advance_width
+
+NOTDEF = ".notdef"
+SPACE = "space"
+NOTDEF_WIDTH = config.UNITS_PER_EM // 2  # The .notdef FontForge adds, a hollow box
+NOTDEF_STEM = config.UNITS_PER_EM // 20
+NOTDEF_HEIGHT = 2 * config.ASCENT // 3
+MAC_EPOCH = -2082844800  # 1904-01-01 in unix time, origin of the head timestamps
+
+# Names with a codepoint besides single characters and uniXXXX / uXXXX[XX] (Adobe Glyph List)
+AGL_NAMES = {SPACE: 0x20}
+
+
+class OutlineGlyph(NamedTuple):
+    name: str
+    contours: List[Contour]
+    bbox: BoundingBox
+    width: int
+
+
+def unicode_for(name: str) -> Optional[int]:
+    """Codepoint FontForge gives a glyph from its name, None for the unencoded ones (a_, _ao_, uR...)."""
+    if len(name) == 1: return ord(name)
+    if name in AGL_NAMES: return AGL_NAMES[name]
+    for prefix, lengths in (("uni", (4,)), ("u", (4, 5, 6))):
+        digits = name[len(prefix):]
+        if name.startswith(prefix) and len(digits) in lengths:
+            try: return int(digits, 16)
+            except ValueError: return None
+    return None
+
+def read_glyph_order(path=None) -> List[str]:
+    """
+    Glyph names of an order file (config.glyph_order_path by default), one per line, # starting
+    a comment. Empty if there is no such file.
+    """
+    path = config.glyph_order_path if path is None else path
+    if not os.path.isfile(path): return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.split("#", 1)[0].strip() for line in f if line.split("#", 1)[0].strip()]
+
+def glyph_order(names, order: Sequence[str] = ()) -> List[str]:
+    """
+    Glyph order of the font, whatever order names come in : .notdef, space, the glyphs of
+    order (see read_glyph_order) in that order, then the others as FontForge orders them,
+    encoded glyphs by codepoint then the others by name. Names of order that are not glyphs
+    are left out.
+    """
+    names = set(names) - {NOTDEF}
+    first = list(dict.fromkeys(name for name in [SPACE, *order] if name in names))
+    rest = names - set(first)
+    encoded = sorted((name for name in rest if unicode_for(name) is not None), key=lambda name: (unicode_for(name), name))
+    return [NOTDEF] + first + encoded + sorted(name for name in rest if unicode_for(name) is None)
+
+def character_map(names) -> Dict[int, str]:
+    """Codepoint to glyph name, like FontForge's UnicodeFull encoding."""
+    cmap = {}
+    for name in names:
+        codepoint = unicode_for(name)
+        if codepoint is not None and codepoint not in cmap: cmap[codepoint] = name
+    return cmap
+
+def notdef_glyph() -> OutlineGlyph:
+    """The .notdef FontForge gives a font without one : a box NOTDEF_STEM thick, NOTDEF_STEM from either side."""
+    left, right, top, stem = NOTDEF_STEM, NOTDEF_WIDTH - NOTDEF_STEM, NOTDEF_HEIGHT, NOTDEF_STEM
+    outer = [(left, 0, True), (right, 0, True), (right, top, True), (left, top, True)]  # Counter-clockwise, the counter inside it runs clockwise
+    counter = [(left + stem, stem, True), (left + stem, top - stem, True), (right - stem, top - stem, True), (right - stem, stem, True)]
+    return OutlineGlyph(NOTDEF, [outer, counter], (left, 0, right, top), NOTDEF_WIDTH)
+
+def outline_glyphs(entries: Dict[str, dict], padding: Dict[str, float], order: Optional[Sequence[str]] = None) -> List[OutlineGlyph]:
+    """
+    Every glyph of the font in glyph order, .notdef first.
+
+    Parameters:
+        entries (dict): Glyph name to {"contours", "bbox"}, as returned by glyphs.load_glyphs.
+        padding (dict): Content of padding.json.
+        order (list): Glyphs placed first (see glyph_order), defaults to the order file.
+    """
+    glyphs = [notdef_glyph()]
+    for glyph_name in glyph_order(entries, read_glyph_order() if order is None else order)[1:]:
+        entry = entries[glyph_name]
+        width = advance_width(entry["bbox"], padding.get(glyph_name, config.default_padding))
+        glyphs.append(OutlineGlyph(glyph_name, entry["contours"], tuple(entry["bbox"]), width))
+    return glyphs
+
+
+# TABLES ========================================
+
+def _bbox(glyphs: List[OutlineGlyph]):
+    boxes = [glyph.bbox for glyph in glyphs if glyph.contours]
+    if not boxes: return (0, 0, 0, 0)
+    return (
+        math.floor(min(box[0] for box in boxes)), math.floor(min(box[1] for box in boxes)),
+        math.ceil(max(box[2] for box in boxes)), math.ceil(max(box[3] for box in boxes)),
+    )
+
+def build_head(glyphs: List[OutlineGlyph], timestamp: Optional[int] = None) -> bytes:
+    """timestamp (unix time) defaults to config.timestamp."""
+    seconds = int(config.timestamp if timestamp is None else timestamp) - MAC_EPOCH
+    x_min, y_min, x_max, y_max = _bbox(glyphs)
+    return struct.pack(
+        ">HHiIIHHqqhhhhHHhhh",
+        1, 0, 0x00010000, 0, 0x5F0F3CF5,  # version, fontRevision 1.0, checkSumAdjustment, magic
+        0x000B, config.UNITS_PER_EM,        # flags : baseline at 0, lsb at 0, integer scaling
+        seconds, seconds,
+        x_min, y_min, x_max, y_max,
+        0, 8, 2, 0, 0,                      # macStyle, lowestRecPPEM, fontDirectionHint, indexToLocFormat, glyphDataFormat
+    )
+
+# FontForge rounds the extremes of a glyph to the nearest unit (half to even) for its metrics
+
+def _left_side_bearing(glyph: OutlineGlyph) -> int:
+    return round(glyph.bbox[0]) if glyph.contours else 0
+
+def min_right_side_bearing(glyphs: List[OutlineGlyph]) -> int:
+    return min((glyph.width - round(glyph.bbox[2]) for glyph in glyphs if glyph.contours), default=0)
+
+def average_width(widths: List[int]) -> int:
+    """OS/2 xAvgCharWidth : average of the non zero advance widths."""
+    widths = [width for width in widths if width > 0]
+    return sum(widths) // len(widths) if widths else 0
+
+def build_hhea(glyphs: List[OutlineGlyph], number_of_hmetrics: int) -> bytes:
+    inked = [glyph for glyph in glyphs if glyph.contours]
+    _, y_min, _, y_max = _bbox(glyphs)
+    return struct.pack(
+        ">HHhhhHhhhhhhhhhhhH",
+        1, 0, y_max, y_min, 90,             # ascender, descender and line gap, from the font bbox like FontForge
+        max((glyph.width for glyph in glyphs), default=0),
+        min((_left_side_bearing(glyph) for glyph in inked), default=0),
+        min_right_side_bearing(glyphs),
+        max((round(glyph.bbox[2]) for glyph in inked), default=0),
+        1, 0, 0,                            # caretSlopeRise, caretSlopeRun, caretOffset
+        0, 0, 0, 0, 0,                      # reserved, metricDataFormat
+        number_of_hmetrics,
+    )
+
+def build_hmtx(glyphs: List[OutlineGlyph]):
+    """Returns the table and numberOfHMetrics (the trailing run of equal widths is stored once)."""
+    return pack_hmtx([glyph.width for glyph in glyphs], [_left_side_bearing(glyph) for glyph in glyphs])
+
+def pack_hmtx(widths: List[int], side_bearings: List[int]):
+    """hmtx of the advance width and left side bearing of every glyph, and numberOfHMetrics."""
+    count = len(widths)
+    while count > 1 and widths[count - 2] == widths[-1]: count -= 1
+    data = b"".join(struct.pack(">Hh", width, side_bearing) for width, side_bearing in zip(widths[:count], side_bearings))
+    data += b"".join(struct.pack(">h", side_bearing) for side_bearing in side_bearings[count:])
+    return data, count
+
+def build_maxp(glyphs: List[OutlineGlyph]) -> bytes:
+    return struct.pack(">IH", 0x00005000, len(glyphs))  # Version 0.5, CFF fonts only store numGlyphs
+
+def build_name(names: Dict[int, str]) -> bytes:
+    """names: name id to string, written for Windows (platform 3, Unicode BMP, English US)."""
+    records = []
+    storage = b""
+    for name_id in sorted(names):
+        encoded = names[name_id].encode("utf-16-be")
+        records.append(struct.pack(">HHHHHH", 3, 1, 0x409, name_id, len(encoded), len(storage)))
+        storage += encoded
+    return struct.pack(">HHH", 0, len(records), 6 + 12 * len(records)) + b"".join(records) + storage
+
+def build_os2(glyphs: List[OutlineGlyph], cmap: Dict[int, str], max_context: int = 0) -> bytes:
+    x_min, y_min, x_max, y_max = _bbox(glyphs)
+    codepoints = sorted(cmap) or [0]
+    return struct.pack(
+        ">HhHHHhhhhhhhhhhh10sIIII4sHHHhhhHHIIhhHHH",
+        4, average_width([glyph.width for glyph in glyphs]),
+        400, 5, 0,                          # usWeightClass, usWidthClass, fsType (installable)
+        650, 699, 0, 140,                   # subscript size and offset
+        650, 699, 0, 479,                   # superscript size and offset
+        49, 258,                            # strikeout size and position
+        0, bytes(10),                       # sFamilyClass, panose
+        1, 0, 0, 0,                         # ulUnicodeRange : Basic Latin
+        b"PfEd",                            # FontForge's vendor id
+        0x0040,                             # fsSelection : regular
+        min(codepoints[0], 0xFFFF), min(codepoints[-1], 0xFFFF),
+        config.ASCENT, -config.DESCENT, 90, # typo ascender, descender, line gap
+        y_max, -y_min,                      # usWinAscent, usWinDescent
+        1, 0,                               # ulCodePageRange : Latin 1
+        0, 0,                               # sxHeight, sCapHeight
+        0, 0x20, max_context,               # usDefaultChar, usBreakChar, usMaxContext
+    )
+
+def build_post() -> bytes:
+    # Format 3, glyph names live in the CFF table
+    return struct.pack(">IihhIIIII", 0x00030000, 0, -75, 50, 0, 0, 0, 0, 0)
+
+def _cmap_format_12(cmap: Dict[int, str], glyph_ids: Dict[str, int]) -> bytes:
+    """Format 12 subtable, every codepoint, as runs of consecutive codepoints and glyph ids."""
+    groups = []  # start, end, start glyph id
+    for codepoint in sorted(cmap):
+        glyph_id = glyph_ids[cmap[codepoint]]
+        if groups and groups[-1][1] == codepoint - 1 and groups[-1][2] + codepoint - groups[-1][0] == glyph_id: groups[-1][1] = codepoint
+        else: groups.append([codepoint, codepoint, glyph_id])
+    return struct.pack(">HHIII", 12, 0, 16 + 12 * len(groups), 0, len(groups)) + b"".join(struct.pack(">III", *group) for group in groups)
+
+def build_cmap(cmap: Dict[int, str], glyph_ids: Dict[str, int]) -> bytes:
+    """
+    Format 4 subtable (BMP), shared by the Unicode and Windows encoding records, and a format
+    12 subtable for the full repertoire when a glyph is beyond the BMP, as FontForge does.
+    """
+    codepoints = sorted(codepoint for codepoint in cmap if codepoint < 0xFFFF)
+    segments = []  # start, end, delta
+    for codepoint in codepoints:
+        delta = (glyph_ids[cmap[codepoint]] - codepoint) % 0x10000
+        if segments and segments[-1][1] == codepoint - 1 and segments[-1][2] == delta: segments[-1][1] = codepoint
+        else: segments.append([codepoint, codepoint, delta])
+    segments.append([0xFFFF, 0xFFFF, 1])
+
+    count = len(segments)
+    entry_selector = max(count.bit_length() - 1, 0)
+    search_range = 2 * (1 << entry_selector)
+    arrays = (
+        struct.pack(f">{count}H", *(end for _, end, _ in segments)) + b"\0\0"
+        + struct.pack(f">{count}H", *(start for start, _, _ in segments))
+        + struct.pack(f">{count}H", *(delta for _, _, delta in segments))
+        + bytes(2 * count)  # idRangeOffset, unused
+    )
+    subtable = struct.pack(">HHHHHHH", 4, 14 + len(arrays), 0, count * 2, search_range, entry_selector, 2 * count - search_range) + arrays
+    if max(cmap, default=0) < 0xFFFF: return struct.pack(">HHHHIHHI", 0, 2, 0, 3, 20, 3, 1, 20) + subtable
+
+    # Unicode BMP and full repertoire, Windows BMP and full repertoire, sorted by platform and encoding
+    full_offset = 4 + 8 * 4 + len(subtable)
+    records = ((0, 3, 36), (0, 4, full_offset), (3, 1, 36), (3, 10, full_offset))
+    return struct.pack(">HH", 0, 4) + b"".join(struct.pack(">HHI", *record) for record in records) + subtable + _cmap_format_12(cmap, glyph_ids)
+
+
+def build_outlines(glyphs: List[OutlineGlyph]) -> bytes:
+    """CFF table of glyphs, in glyph order, their advance widths in the charstrings."""
+    names = config.FONT_NAMES
+    return build_cff(
+        names["fontname"], [(glyph.name, glyph.contours, glyph.width) for glyph in glyphs], _bbox(glyphs),
+        full_name=names["fullname"], family_name=names["familyname"],
+    )
+
+
+def build_tables(glyphs: List[OutlineGlyph], timestamp: Optional[int] = None, max_context: int = 0) -> Dict[str, bytes]:
+    """
+    Every table of the font but the layout ones (GDEF, GSUB, GPOS, see otl.py).
+
+    Parameters:
+        glyphs (list): In glyph order, .notdef first.
+        timestamp (int): Creation time written in head, defaults to config.timestamp.
+        max_context (int): Longest sequence the layout lookups look at. (OS/2 usMaxContext)
+    """
+    glyph_ids = {glyph.name: gid for gid, glyph in enumerate(glyphs)}
+    cmap = character_map(glyph.name for glyph in glyphs)
+    hmtx, number_of_hmetrics = build_hmtx(glyphs)
+    names = config.FONT_NAMES
+    return {
+        "head": build_head(glyphs, timestamp),
+        "hhea": build_hhea(glyphs, number_of_hmetrics),
+        "maxp": build_maxp(glyphs),
+        "OS/2": build_os2(glyphs, cmap, max_context),
+        "name": build_name({
+            1: names["familyname"], 2: "Regular", 3: f"{names['fullname']} : {names['fontname']}",
+            4: names["fullname"], 5: "Version 1.0", 6: names["fontname"],
+        }),
+        "cmap": build_cmap(cmap, glyph_ids),
+        "post": build_post(),
+        "hmtx": hmtx,
+        "CFF ": build_outlines(glyphs),
+    }
+
+
+# READING =======================================
+
+def read_cmap(data: bytes) -> Dict[int, int]:
+    """Codepoint to glyph id, from the best Unicode subtable (format 12, else format 4)."""
+    _, count = struct.unpack_from(">HH", data, 0)
+    subtables = {}
+    for i in range(count):
+        platform, encoding, offset = struct.unpack_from(">HHI", data, 4 + 8 * i)
+        if platform == 0 or (platform == 3 and encoding in (1, 10)):
+            subtables.setdefault(struct.unpack_from(">H", data, offset)[0], offset)
+
+    cmap = {}
+    if 12 in subtables:
+        offset = subtables[12]
+        groups, = struct.unpack_from(">I", data, offset + 12)
+        for i in range(groups):
+            start, end, glyph_id = struct.unpack_from(">III", data, offset + 16 + 12 * i)
+            for codepoint in range(start, end + 1): cmap[codepoint] = glyph_id + codepoint - start
+    elif 4 in subtables:
+        offset = subtables[4]
+        count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+        ends = struct.unpack_from(f">{count}H", data, offset + 14)
+        starts = struct.unpack_from(f">{count}H", data, offset + 16 + 2 * count)
+        deltas = struct.unpack_from(f">{count}H", data, offset + 16 + 4 * count)
+        range_offsets_position = offset + 16 + 6 * count
+        range_offsets = struct.unpack_from(f">{count}H", data, range_offsets_position)
+        for i in range(count):
+            for codepoint in range(starts[i], ends[i] + 1):
+                if codepoint == 0xFFFF: continue
+                if range_offsets[i] == 0:
+                    glyph_id = (codepoint + deltas[i]) & 0xFFFF
+                else:
+                    position = range_offsets_position + 2 * i + range_offsets[i] + 2 * (codepoint - starts[i])
+                    glyph_id = struct.unpack_from(">H", data, position)[0]
+                    if glyph_id: glyph_id = (glyph_id + deltas[i]) & 0xFFFF
+                if glyph_id: cmap[codepoint] = glyph_id
+    return cmap
+
+def read_advances(hhea: bytes, hmtx: bytes, glyph_count: int) -> List[int]:
+    """Advance width of every glyph, the last metric repeating over the trailing glyphs."""
+    number_of_hmetrics, = struct.unpack_from(">H", hhea, 34)
+    widths = [struct.unpack_from(">H", hmtx, 4 * i)[0] for i in range(number_of_hmetrics)]
+    return widths + [widths[-1]] * (glyph_count - number_of_hmetrics)
+
+def read_side_bearings(hhea: bytes, hmtx: bytes, glyph_count: int) -> List[int]:
+    """Left side bearing of every glyph."""
+    number_of_hmetrics, = struct.unpack_from(">H", hhea, 34)
+    side_bearings = [struct.unpack_from(">h", hmtx, 4 * i + 2)[0] for i in range(number_of_hmetrics)]
+    extra = glyph_count - number_of_hmetrics
+    return side_bearings + list(struct.unpack_from(f">{extra}h", hmtx, 4 * number_of_hmetrics))
+
+def read_vertical_metrics(head: bytes, hhea: bytes) -> Tuple[int, int, int]:
+    """unitsPerEm, ascender and descender (positive, below the baseline)."""
+    units_per_em, = struct.unpack_from(">H", head, 18)
+    ascender, descender = struct.unpack_from(">hh", hhea, 4)
+    return units_per_em, ascender, -descender
@@ -0,0 +1,902 @@
+"""
+Write the OpenType layout tables (GDEF, GSUB, GPOS) of a layout.Layout, and read them
+back from a built font (read_layout) for the shaper.
+
+Every lookup is compiled on its own into a position independent block of bytes (the
+lookup table followed by its subtables), which the build cache keeps under a hash of the
+lookup's rules (with their glyph classes expanded) and of the glyph ids they use. Editing
+one lookup of features.fea, or a class it uses, only recompiles that lookup, the others
+are copied from the cache into the LookupList.
+
+The anonymous lookups chained rules call are compiled along with the lookup that owns
+them and placed after every named lookup. Their index is only known once the whole
+LookupList is laid out, so cached blocks store them relative to their owner and the
+positions where they are written ("patches").
+
+Rules are written in the smallest form that keeps their order : chained rules sharing
+class definitions become one class based subtable (format 2) and pairs are kerned by class
+(PairPos format 2) when that is smaller than listing them.
+
+Nothing has to be split by hand when the feature file grows past what 16 bit offsets
+reach : subtables too large for their own offsets are split, the subtables of a lookup
+are packed in groups of at most 64K, and lookups too large for the LookupList are made
+Extension lookups (GSUB type 7, GPOS type 9) whose subtables go after the LookupList.
+"""
+
+import heapq
+import struct
+from collections import deque
+from typing import Dict, List, Optional, Tuple # type: ignore
+
+from .cache import BuildCache, hash_json
+from .layout import (
+    CHAIN_SUB, GPOS, GSUB, LIGATURE_SUB, MULTIPLE_SUB, PAIR_POS, SINGLE_POS, SINGLE_SUB,
+    ChainRule, Layout, LayoutError, Lookup, UnsupportedLookup, ValueRecord,
+)
+
+LAYOUT_VERSION = 3  # Bump when the compiled output of a lookup changes, to invalidate the cache
+
+EXTENSION_TYPES = {GSUB: 7, GPOS: 9}
+USE_MARK_FILTERING_SET = 0x0010
+MAX_OFFSET = 0xFFFF
+
+
+class OffsetOverflow(ValueError):
+    """A table is too large for its 16 bit offsets."""
+
+
+# PACKING =======================================
+
+class LookupIndex(int):
+    """A LookupList index relative to the first nested lookup of the lookup being compiled."""
+
+
+class Table:
+    """
+    A table made of 16 bit fields : ints (negative ones are written as int16), None for a
+    null offset, Table for an Offset16 to a child table and LookupIndex for a patched index.
+    """
+
+    def __init__(self, *fields, data: Optional[bytes] = None):
+        self.fields = list(fields)
+        self.data = data  # Already packed table, without children
+
+    def key(self, memo: dict):
+        if id(self) not in memo:
+            if self.data is not None: memo[id(self)] = ("data", self.data)
+            else: memo[id(self)] = tuple(self._field_key(field, memo) for field in self.fields)
+        return memo[id(self)]
+
+    @staticmethod
+    def _field_key(field, memo: dict):
+        if isinstance(field, Table): return field.key(memo)
+        if isinstance(field, LookupIndex): return ("lookup", int(field))  # Never shared with a plain number
+        return field
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else 2 * len(self.fields)
+
+
+def pack_tables(roots: List[Table], max_offset: int = MAX_OFFSET) -> Tuple[bytes, List[int], List[int]]:
+    """
+    Lay out tables and their children in one block, sharing identical subtables. Every
+    table is placed after all the tables pointing at it, since Offset16 fields cannot be
+    negative. Raises OffsetOverflow if an offset is larger than max_offset.
+
+    Returns:
+        data (bytes)
+        positions (list): Position of each root.
+        patches (list): Positions of the LookupIndex fields.
+    """
+    memo: dict = {}
+    unique: Dict[object, Table] = {}
+    children: Dict[object, List[object]] = {}
+    order: List[object] = []  # Breadth first discovery order
+    queue = deque(roots)
+    while queue:
+        table = queue.popleft()
+        key = table.key(memo)
+        if key in unique: continue
+        unique[key] = table
+        order.append(key)
+        children[key] = [field.key(memo) for field in table.fields if isinstance(field, Table)]
+        queue += [field for field in table.fields if isinstance(field, Table)]
+
+    # Topological placement (Kahn), keeping the breadth first order among the ready tables
+    parents = {key: 0 for key in order}
+    for key in order:
+        for child in set(children[key]): parents[child] += 1
+    rank = {key: index for index, key in enumerate(order)}
+    ready = [rank[key] for key in dict.fromkeys(root.key(memo) for root in roots) if not parents[key]]
+    heapq.heapify(ready)
+    positions: Dict[object, int] = {}
+    offset = 0
+    while ready:
+        key = order[heapq.heappop(ready)]
+        positions[key] = offset
+        offset += unique[key].size
+        for child in set(children[key]):
+            parents[child] -= 1
+            if parents[child] == 0: heapq.heappush(ready, rank[child])
+
+    data = bytearray(offset)
+    patches = []
+    for key in order:
+        table, start = unique[key], positions[key]
+        if table.data is not None:
+            data[start:start + len(table.data)] = table.data
+            continue
+        values = []
+        for index, field in enumerate(table.fields):
+            if isinstance(field, Table):
+                distance = positions[field.key(memo)] - start
+                if distance > max_offset: raise OffsetOverflow(f"Offset of {distance} bytes is larger than {max_offset}")
+                values.append(distance)
+            elif field is None:
+                values.append(0)
+            else:
+                if isinstance(field, LookupIndex): patches.append(start + 2 * index)
+                values.append(field & 0xFFFF)
+        data[start:start + table.size] = struct.pack(f">{len(values)}H", *values)
+    return bytes(data), [positions[root.key(memo)] for root in roots], sorted(patches)
+
+def pack(root: Table) -> Tuple[bytes, List[int]]:
+    """A table and its children, and the positions of the LookupIndex fields. (see pack_tables)"""
+    data, _, patches = pack_tables([root])
+    return data, patches
+
+def tree_size(table: Table) -> int:
+    """Size of a table and of its children without sharing any, what it packs to at most."""
+    return table.size + sum(tree_size(field) for field in table.fields if isinstance(field, Table))
+
+
+# COMMON TABLES =================================
+
+def coverage(glyph_ids) -> Table:
+    """Format 1 (glyph list) or 2 (ranges), whichever is smaller."""
+    glyph_ids = sorted(set(glyph_ids))
+    ranges: List[List[int]] = []
+    for index, glyph_id in enumerate(glyph_ids):
+        if ranges and ranges[-1][1] == glyph_id - 1: ranges[-1][1] = glyph_id
+        else: ranges.append([glyph_id, glyph_id, index])
+    if 3 * len(ranges) < len(glyph_ids):
+        return Table(2, len(ranges), *(value for glyph_range in ranges for value in glyph_range))
+    return Table(1, len(glyph_ids), *glyph_ids)
+
+def class_definition(classes: Dict[int, int]) -> Table:
+    """Format 1 (class array) or 2 (ranges) of glyph id -> class, whichever is smaller."""
+    glyph_ids = sorted(glyph_id for glyph_id, glyph_class in classes.items() if glyph_class)
+    if not glyph_ids: return Table(2, 0)
+    ranges: List[List[int]] = []
+    for glyph_id in glyph_ids:
+        if ranges and ranges[-1][1] == glyph_id - 1 and ranges[-1][2] == classes[glyph_id]: ranges[-1][1] = glyph_id
+        else: ranges.append([glyph_id, glyph_id, classes[glyph_id]])
+    start, end = glyph_ids[0], glyph_ids[-1]
+    if 3 * len(ranges) < end - start + 1:
+        return Table(2, len(ranges), *(value for glyph_range in ranges for value in glyph_range))
+    return Table(1, start, end - start + 1, *(classes.get(glyph_id, 0) for glyph_id in range(start, end + 1)))
+
+def _tag(tag: str) -> Tuple[int, int]:
+    return struct.unpack(">HH", tag.ljust(4).encode("latin-1"))
+
+def value_format(values) -> int:
+    """ValueFormat covering every non zero field of values."""
+    value_format = 0
+    for value in values:
+        for bit, field in enumerate(value):
+            if field: value_format |= 1 << bit
+    return value_format
+
+def value_fields(value: ValueRecord, value_format: int) -> List[int]:
+    return [field for bit, field in enumerate(value) if value_format & (1 << bit)]
+
+
+# LOOKUPS =======================================
+
+def _mapping_subtable(lookup: Lookup, glyph_ids: Dict[str, int], mapping: dict) -> Table:
+    if lookup.table == GSUB and lookup.type == SINGLE_SUB:
+        pairs = sorted((glyph_ids[glyph], glyph_ids[target]) for glyph, target in mapping.items())
+        deltas = {(target - glyph) % 0x10000 for glyph, target in pairs}
+        cover = coverage(glyph for glyph, _ in pairs)
+        if len(deltas) == 1: return Table(1, cover, deltas.pop())
+        return Table(2, cover, len(pairs), *(target for _, target in pairs))
+
+    if lookup.table == GSUB and lookup.type == MULTIPLE_SUB:
+        sequences = sorted((glyph_ids[glyph], [glyph_ids[target] for target in targets]) for glyph, targets in mapping.items())
+        return Table(
+            1, coverage(glyph for glyph, _ in sequences), len(sequences),
+            *(Table(len(targets), *targets) for _, targets in sequences),
+        )
+
+    if lookup.table == GSUB and lookup.type == LIGATURE_SUB:
+        ligature_sets: Dict[int, List[Tuple[List[int], int]]] = {}
+        for components, ligature in mapping.items():
+            ids = [glyph_ids[component] for component in components]
+            ligature_sets.setdefault(ids[0], []).append((ids, glyph_ids[ligature]))
+        firsts = sorted(ligature_sets)
+        tables = []
+        for first in firsts:
+            # The longest ligatures are tried first
+            ligatures = sorted(ligature_sets[first], key=lambda entry: (-len(entry[0]), entry[0]))
+            tables.append(Table(len(ligatures), *(Table(ligature, len(ids), *ids[1:]) for ids, ligature in ligatures)))
+        return Table(1, coverage(firsts), len(firsts), *tables)
+
+    if lookup.table == GPOS and lookup.type == SINGLE_POS:
+        values = sorted((glyph_ids[glyph], value) for glyph, value in mapping.items())
+        fmt = value_format(value for _, value in values)
+        cover = coverage(glyph for glyph, _ in values)
+        if len({value for _, value in values}) == 1: return Table(1, cover, fmt, *value_fields(values[0][1], fmt))
+        return Table(2, cover, fmt, len(values), *(field for _, value in values for field in value_fields(value, fmt)))
+
+    if lookup.table == GPOS and lookup.type == PAIR_POS:
+        pair_sets: Dict[int, List[Tuple[int, ValueRecord]]] = {}
+        for (first, second), value in mapping.items():
+            pair_sets.setdefault(glyph_ids[first], []).append((glyph_ids[second], value))
+        fmt = value_format(mapping.values())
+        firsts = sorted(pair_sets)
+        tables = []
+        for first in firsts:
+            pairs = sorted(pair_sets[first])
+            tables.append(Table(len(pairs), *(field for second, value in pairs for field in [second] + value_fields(value, fmt))))
+        subtable = Table(1, coverage(firsts), fmt, 0, len(firsts), *tables)
+        return _class_pair_subtable(pair_sets, fmt, subtable) or subtable
+
+    raise UnsupportedLookup(lookup, "write")
+
+def packed_size(table: Table) -> int:
+    """Size of a table once packed, children shared."""
+    try: return len(pack(table)[0])
+    except OffsetOverflow: return tree_size(table)
+
+def _class_pair_subtable(pair_sets: Dict[int, List[Tuple[int, ValueRecord]]], fmt: int, pair_subtable: Table) -> Optional[Table]:
+    """
+    PairPos format 2 of the same pairs if it is smaller than pair_subtable (format 1), None
+    otherwise. Second glyphs adjusted the same way after every first glyph share a class,
+    first glyphs with the same row of adjustments too. Pairs the rules leave out get a zero
+    record, which adjusts nothing.
+    """
+    rows = {first: dict(pairs) for first, pairs in pair_sets.items()}
+    seconds = sorted({second for row in rows.values() for second in row})
+    firsts = sorted(rows)
+    columns: Dict[tuple, int] = {}  # Class 0 is every glyph that is never a second glyph
+    classes2 = {second: columns.setdefault(tuple(rows[first].get(second) for first in firsts), len(columns) + 1) for second in seconds}
+    by_row: Dict[tuple, List[int]] = {}
+    for first in firsts:
+        values = [ValueRecord()] * (len(columns) + 1)
+        for second, value in rows[first].items(): values[classes2[second]] = value
+        by_row.setdefault(tuple(values), []).append(first)
+    # Coverage already restricts the subtable to the first glyphs, the largest group can be class 0
+    row_values = sorted(by_row, key=lambda values: -len(by_row[values]))
+    classes1 = {first: class1 for class1, values in enumerate(row_values) for first in by_row[values]}
+
+    record_count = len(row_values) * (len(columns) + 1)
+    records_size = 16 + 2 * record_count * len(value_fields(ValueRecord(), fmt))  # What format 2 takes at least
+    if records_size >= tree_size(pair_subtable) or records_size >= packed_size(pair_subtable): return None
+    subtable = Table(
+        2, coverage(firsts), fmt, 0, class_definition(classes1), class_definition(classes2), len(row_values), len(columns) + 1,
+        *(field for values in row_values for value in values for field in value_fields(value, fmt)),
+    )
+    return subtable if packed_size(subtable) < packed_size(pair_subtable) else None
+
+def _first_glyph(key) -> str:
+    return key if isinstance(key, str) else key[0]
+
+def _mapping_subtables(lookup: Lookup, glyph_ids: Dict[str, int], mapping: dict, max_offset: int = MAX_OFFSET) -> List[Table]:
+    """
+    Subtables of a mapping, halved until each one fits its 16 bit offsets. The rules of a
+    glyph stay in the same subtable, so the longest ligature still comes first.
+    """
+    subtable = _mapping_subtable(lookup, glyph_ids, mapping)
+    firsts = sorted({_first_glyph(key) for key in mapping}, key=glyph_ids.__getitem__)
+    if len(firsts) < 2 or tree_size(subtable) <= max_offset: return [subtable]
+    half = set(firsts[:len(firsts) // 2])
+    return (
+        _mapping_subtables(lookup, glyph_ids, {key: value for key, value in mapping.items() if _first_glyph(key) in half}, max_offset)
+        + _mapping_subtables(lookup, glyph_ids, {key: value for key, value in mapping.items() if _first_glyph(key) not in half}, max_offset)
+    )
+
+def _class_runs(rules: List[ChainRule]) -> List[List[ChainRule]]:
+    """
+    Consecutive rules split into runs that can share class definitions : within a run, the
+    glyph sets of the backtrack, of the input and of the lookahead are each either identical
+    or disjoint.
+    """
+    runs: List[List[ChainRule]] = []
+    owners: List[Dict[str, frozenset]] = []
+    for rule in rules:
+        roles = (rule.backtrack, rule.input, rule.lookahead)
+        if not runs or any(glyph in owner and owner[glyph] != glyphs for owner, sets in zip(owners, roles) for glyphs in sets for glyph in glyphs):
+            runs.append([])
+            owners = [{}, {}, {}]
+        runs[-1].append(rule)
+        for owner, sets in zip(owners, roles):
+            for glyphs in sets: owner.update(dict.fromkeys(glyphs, glyphs))
+    return runs
+
+def _chain_class_subtable(rules: List[ChainRule], glyph_ids: Dict[str, int], nested_index: Dict[int, int]) -> Table:
+    """Chained context format 2 of a run of rules (see _class_runs), in the order they are tried."""
+    numbering: List[Dict[frozenset, int]] = [{}, {}, {}]
+    backtrack_classes, input_classes, lookahead_classes = numbering
+    for rule in rules: input_classes.setdefault(rule.input[0], len(input_classes) + 1)  # Class set indices, kept low
+    for rule in rules:
+        for classes, sets in zip(numbering, (rule.backtrack, rule.input[1:], rule.lookahead)):
+            for glyphs in sets: classes.setdefault(glyphs, len(classes) + 1)
+
+    class_sets: Dict[int, List[Table]] = {}
+    for rule in rules:
+        records = []
+        for sequence_index, action in rule.actions:
+            records += [sequence_index, LookupIndex(nested_index[id(action)])]
+        class_sets.setdefault(input_classes[rule.input[0]], []).append(Table(
+            len(rule.backtrack), *(backtrack_classes[glyphs] for glyphs in reversed(rule.backtrack)),  # Closest glyph first
+            len(rule.input), *(input_classes[glyphs] for glyphs in rule.input[1:]),
+            len(rule.lookahead), *(lookahead_classes[glyphs] for glyphs in rule.lookahead),
+            len(rule.actions), *records,
+        ))
+
+    def definition(classes: Dict[frozenset, int]) -> Optional[Table]:
+        if not classes: return None  # Every glyph is in class 0
+        return class_definition({glyph_ids[glyph]: glyph_class for glyphs, glyph_class in classes.items() for glyph in glyphs})
+
+    count = max(class_sets) + 1
+    return Table(
+        2, coverage(glyph_ids[glyph] for rule in rules for glyph in rule.input[0]), *(definition(classes) for classes in numbering),
+        count, *(Table(len(class_sets[index]), *class_sets[index]) if index in class_sets else None for index in range(count)),
+    )
+
+def _chain_subtables(rules: List[ChainRule], glyph_ids: Dict[str, int], nested_index: Dict[int, int], max_offset: int = MAX_OFFSET) -> List[Table]:
+    """
+    Subtables of chained rules, tried in order : a format 2 subtable for each run of rules
+    sharing class definitions where it is smaller, one format 3 subtable per rule otherwise.
+    """
+    def coverages(sets) -> List[Table]:
+        return [coverage(glyph_ids[glyph] for glyph in glyphs) for glyphs in sets]
+
+    def rule_subtable(rule: ChainRule) -> Table:
+        records = []
+        for sequence_index, action in rule.actions:
+            records += [sequence_index, LookupIndex(nested_index[id(action)])]
+        return Table(
+            3,
+            len(rule.backtrack), *coverages(reversed(rule.backtrack)),  # Closest glyph first
+            len(rule.input), *coverages(rule.input),
+            len(rule.lookahead), *coverages(rule.lookahead),
+            len(rule.actions), *records,
+        )
+
+    def lookup_size(subtables: List[Table]) -> int:
+        return len(pack_subtables(subtables, max_offset)[0]) + 2 * len(subtables)  # Each one takes an offset in the lookup
+
+    def run_subtables(run: List[ChainRule], per_rule: List[Table]) -> List[Table]:
+        if len(run) < 2: return per_rule
+        subtable = _chain_class_subtable(run, glyph_ids, nested_index)
+        if tree_size(subtable) > max_offset:
+            half = len(run) // 2
+            return run_subtables(run[:half], per_rule[:half]) + run_subtables(run[half:], per_rule[half:])
+        if tree_size(subtable) + 2 < sum(table.size + 2 for table in per_rule): return [subtable]  # Smaller than their headers alone
+        return [subtable] if packed_size(subtable) + 2 < lookup_size(per_rule) else per_rule
+
+    per_rule = [rule_subtable(rule) for rule in rules]
+    subtables: List[Table] = []
+    start = 0
+    for run in _class_runs(rules):
+        subtables += run_subtables(run, per_rule[start:start + len(run)])
+        start += len(run)
+    # Format 3 subtables of different runs can share coverages, which the runs alone do not see
+    if len(subtables) < len(per_rule) and lookup_size(per_rule) <= lookup_size(subtables): return per_rule
+    return subtables
+
+def _subtables(lookup: Lookup, glyph_ids: Dict[str, int], nested_index: Dict[int, int], max_offset: int = MAX_OFFSET) -> List[Table]:
+    if lookup.table == GSUB and lookup.type == CHAIN_SUB: return _chain_subtables(lookup.rules, glyph_ids, nested_index, max_offset)
+    return _mapping_subtables(lookup, glyph_ids, lookup.mapping, max_offset)
+
+def lookup_table(lookup: Lookup, glyph_ids: Dict[str, int], nested_index: Optional[Dict[int, int]] = None) -> Table:
+    subtables = _subtables(lookup, glyph_ids, nested_index or {})
+    return Table(lookup.type, lookup.flag, len(subtables), *subtables)
+
+def _lookup_content(lookup: Lookup) -> list:
+    """Everything a lookup is compiled from, in order : its mapping or rules and the lookups they call."""
+    def glyph_sets(sets): return [sorted(glyphs) for glyphs in sets]
+    nested = {id(action): index for index, action in enumerate(lookup.nested)}
+    rules = [[glyph_sets(rule.backtrack), glyph_sets(rule.input), glyph_sets(rule.lookahead), [[position, nested[id(action)]] for position, action in rule.actions]]
+             for rule in lookup.rules]
+    return [lookup.table, lookup.type, lookup.flag, list(lookup.mapping.items()), rules, [_lookup_content(action) for action in lookup.nested]]
+
+def lookup_key(lookup: Lookup, glyph_ids: Dict[str, int], max_offset: int = MAX_OFFSET) -> str:
+    """
+    Cache key of a compiled lookup : its rules as the glyph classes expand them (not the text
+    of its block, which a class redefined elsewhere changes the meaning of) and the ids of
+    the glyphs it mentions.
+    """
+    used_ids = sorted((glyph, glyph_ids.get(glyph)) for glyph in lookup.glyphs)
+    limit = [] if max_offset == MAX_OFFSET else [max_offset]  # Only lowered to check the splitting paths
+    return hash_json([LAYOUT_VERSION, _lookup_content(lookup), used_ids] + limit)
+
+def pack_subtables(subtables: List[Table], max_offset: int = MAX_OFFSET) -> Tuple[bytes, List[int], List[int]]:
+    """
+    Subtables and their children in one block (see pack_tables). When their offsets do not
+    fit, they are packed in consecutive groups of at most max_offset bytes (64K) instead,
+    children only being shared within a group.
+    """
+    try: return pack_tables(subtables, max_offset)
+    except OffsetOverflow: pass
+    groups: List[List[Table]] = [[]]
+    size = 0
+    for subtable in subtables:
+        subtable_size = tree_size(subtable)
+        if groups[-1] and size + subtable_size > max_offset:
+            groups.append([])
+            size = 0
+        groups[-1].append(subtable)
+        size += subtable_size
+    data = bytearray()
+    positions: List[int] = []
+    patches: List[int] = []
+    for group in groups:
+        block, group_positions, group_patches = pack_tables(group, max_offset)
+        positions += [len(data) + position for position in group_positions]
+        patches += [len(data) + position for position in group_patches]
+        data += block
+    return bytes(data), positions, patches
+
+def _compile(lookup: Lookup, glyph_ids: Dict[str, int], nested_index: Dict[int, int], max_offset: int = MAX_OFFSET) -> dict:
+    data, positions, patches = pack_subtables(_subtables(lookup, glyph_ids, nested_index, max_offset), max_offset)
+    return {"type": lookup.type, "flag": lookup.flag, "data": data.hex(), "subtables": positions, "patches": patches}
+
+def compile_lookup(lookup: Lookup, glyph_ids: Dict[str, int], max_offset: int = MAX_OFFSET) -> dict:
+    """
+    Parameters:
+        max_offset (int): Largest offset written, subtables are split and grouped to stay
+            within it. Only lowered to exercise the splitting on small feature files.
+
+    Returns:
+        dict: {"lookups": [the lookup, then each nested lookup]}, each one being {"type", "flag",
+            "data": hex of its subtables and their children, "subtables": [position of each
+            subtable in data], "patches": [positions of the LookupIndex fields in data]}.
+    """
+    nested_index = {id(nested): index for index, nested in enumerate(lookup.nested)}
+    return {"lookups": [_compile(lookup, glyph_ids, nested_index, max_offset)] + [_compile(nested, glyph_ids, {}, max_offset) for nested in lookup.nested]}
+
+
+# LOOKUP LIST ===================================
+
+class _LookupBlock:
+    """
+    A compiled lookup laid out in the LookupList : the lookup table followed by its subtables,
+    or for an Extension lookup, the lookup table and its extension subtables, the actual
+    subtables (tail) being placed after the whole table and reached with 32 bit offsets.
+    """
+
+    def __init__(self, compiled: dict, data: bytes):
+        self.type = compiled["type"]
+        self.flag = compiled["flag"]
+        self.data = data
+        self.subtables = compiled["subtables"]
+        self.extension = False
+
+    @property
+    def header_size(self) -> int:
+        return 6 + 2 * len(self.subtables)
+
+    @property
+    def size(self) -> int:
+        """Bytes taken in the LookupList."""
+        return self.header_size + (8 * len(self.subtables) if self.extension else len(self.data))
+
+    def fits(self, max_offset: int = MAX_OFFSET) -> bool:
+        """True if the offsets from the lookup table to its (extension) subtables fit in 16 bits. (or max_offset)"""
+        if self.extension: return self.header_size + 8 * (len(self.subtables) - 1) <= max_offset
+        return not self.subtables or self.header_size + max(self.subtables) <= max_offset
+
+    def head(self, extension_type: int, tail_distance: int) -> bytes:
+        """
+        The part written in the LookupList.
+
+        Parameters:
+            tail_distance (int): From the start of this block to the start of its tail.
+        """
+        if not self.extension:
+            offsets = [self.header_size + position for position in self.subtables]
+            return struct.pack(f">3H{len(offsets)}H", self.type, self.flag, len(offsets), *offsets) + self.data
+        count = len(self.subtables)
+        offsets = [self.header_size + 8 * index for index in range(count)]
+        records = b"".join(
+            struct.pack(">HHI", 1, self.type, tail_distance + position - offset)
+            for offset, position in zip(offsets, self.subtables)
+        )
+        return struct.pack(f">3H{count}H", extension_type, self.flag, count, *offsets) + records
+
+
+def _lookup_list(table: str, blocks: List[_LookupBlock], max_offset: int = MAX_OFFSET) -> Tuple[bytes, bytes]:
+    """
+    The LookupList of blocks and what comes right after it : the tails of the Extension
+    lookups.
+
+    Lookups that are too large for their own offsets are made Extension lookups, then the
+    largest ones are until every lookup is within 16 bits (max_offset) of the LookupList.
+    """
+    for block in blocks:
+        if not block.fits(max_offset): block.extension = True
+        if not block.fits(max_offset): raise OffsetOverflow(f"{table} lookup has too many subtables ({len(block.subtables)}) even as an Extension lookup")
+
+    def positions() -> List[int]:
+        offsets = []
+        position = 2 + 2 * len(blocks)
+        for block in blocks:
+            offsets.append(position)
+            position += block.size
+        return offsets
+
+    offsets = positions()
+    while offsets and offsets[-1] > max_offset:
+        candidates = [block for block in blocks[:-1] if not block.extension]
+        if not candidates: raise OffsetOverflow(f"{table} LookupList is too large for 16 bit offsets")
+        max(candidates, key=lambda block: block.size).extension = True
+        offsets = positions()
+
+    size = 2 + 2 * len(blocks) + sum(block.size for block in blocks)
+    heads = []
+    tails = bytearray()
+    for block, offset in zip(blocks, offsets):
+        heads.append(block.head(EXTENSION_TYPES[table], size + len(tails) - offset))
+        if block.extension: tails += block.data
+    return struct.pack(f">{len(blocks) + 1}H", len(blocks), *offsets) + b"".join(heads), bytes(tails)
+
+
+# TABLES ========================================
+
+def _script_and_feature_lists(layout: Layout, table: str, lookup_indices: Dict[int, int]) -> Tuple[Table, Table]:
+    features: List[Tuple[str, Tuple[int, ...]]] = []
+    systems: Dict[Tuple[str, str], List[Tuple[str, Tuple[int, ...]]]] = {}
+    for (feature_table, tag), languages in layout.features.items():
+        if feature_table != table: continue
+        for system, lookups in languages.items():
+            feature = (tag, tuple(sorted(lookup_indices[id(lookup)] for lookup in lookups)))
+            if feature not in features: features.append(feature)
+            systems.setdefault(system, []).append(feature)
+
+    features.sort(key=lambda feature: feature[0])  # Stable, features sharing a tag keep their order
+    feature_list = Table(len(features), *(field for tag, indices in features for field in (*_tag(tag), Table(None, len(indices), *indices))))
+
+    scripts: Dict[str, Dict[str, Table]] = {}
+    for (script, language), system_features in sorted(systems.items()):
+        indices = sorted(features.index(feature) for feature in system_features)
+        scripts.setdefault(script, {})[language] = Table(None, 0xFFFF, len(indices), *indices)
+    script_records = []
+    for script, languages in sorted(scripts.items()):
+        others = sorted(language for language in languages if language != "dflt")
+        script_records += [*_tag(script), Table(
+            languages.get("dflt"), len(others), *(field for language in others for field in (*_tag(language), languages[language])),
+        )]
+    return Table(len(scripts), *script_records), feature_list
+
+def build_gdef(layout: Layout, glyph_ids: Dict[str, int]) -> bytes:
+    classes = {glyph_ids[glyph]: glyph_class for glyph, glyph_class in layout.glyph_classes.items() if glyph in glyph_ids}
+    return pack(Table(1, 0, class_definition(classes), None, None, None))[0]
+
+def build_layout_tables(layout: Layout, glyph_ids: Dict[str, int], cache: Optional[BuildCache] = None, use_cache: bool = True,
+                        max_offset: int = MAX_OFFSET):
+    """
+    Compile a layout into GDEF, GSUB and GPOS (the ones it needs). Adjacent lookups that can
+    be applied in one pass are merged first. (see Layout.merge_lookups)
+
+    Parameters:
+        glyph_ids (dict): Glyph name to glyph id, in the font's glyph order.
+        cache (BuildCache): Where compiled lookups are stored, and read from if use_cache.
+        max_offset (int): Largest offset written, 16 bits. A lower one splits subtables and
+            makes Extension lookups of a feature file that does not need it, which is how
+            these paths are checked on features.fea. (see compile_lookup)
+
+    Returns:
+        tables (dict): Table tag to table data.
+        compiled (list): Names of the lookups that had to be compiled.
+    """
+    layout = layout.merge_lookups()
+    tables = {}
+    compiled = []
+    if layout.glyph_classes: tables["GDEF"] = build_gdef(layout, glyph_ids)
+
+    for table in (GSUB, GPOS):
+        named = [lookup for lookup in layout.lookups if lookup.table == table]
+        if not named: continue
+
+        entries = []
+        for index, lookup in enumerate(named):
+            key = lookup_key(lookup, glyph_ids, max_offset)
+            entry = cache.load_lookup(key) if cache is not None and use_cache else None
+            if entry is None:
+                entry = compile_lookup(lookup, glyph_ids, max_offset)
+                if cache is not None: cache.store_lookup(key, entry)
+                compiled.append(lookup.name or f"{table}:{index}")
+            entries.append(entry)
+
+        # Named lookups first, then the nested ones of each in turn
+        blocks = [_LookupBlock(entry["lookups"][0], b"") for entry in entries]
+        lookup_indices = {id(lookup): index for index, lookup in enumerate(named)}
+        for index, (lookup, entry) in enumerate(zip(named, entries)):
+            base = len(blocks)
+            data = bytearray.fromhex(entry["lookups"][0]["data"])
+            for position in entry["lookups"][0]["patches"]:
+                struct.pack_into(">H", data, position, base + struct.unpack_from(">H", data, position)[0])
+            blocks[index].data = bytes(data)
+            for nested, nested_entry in zip(lookup.nested, entry["lookups"][1:]):
+                lookup_indices[id(nested)] = len(blocks)
+                blocks.append(_LookupBlock(nested_entry, bytes.fromhex(nested_entry["data"])))
+
+        # Header, then the script and feature lists, then the LookupList, then the Extension subtables
+        script_list, feature_list = _script_and_feature_lists(layout, table, lookup_indices)
+        lists, (script_position, feature_position), _ = pack_tables([script_list, feature_list])
+        header_size = 10
+        lookup_list, tails = _lookup_list(table, blocks, max_offset)
+        if header_size + len(lists) > max_offset: raise OffsetOverflow(f"{table} ScriptList and FeatureList are too large for 16 bit offsets")
+        header = struct.pack(">5H", 1, 0, header_size + script_position, header_size + feature_position, header_size + len(lists))
+        tables[table] = header + lists + lookup_list + tails
+
+    return tables, compiled
+
+
+# READING =======================================
+
+def _uint16s(data: bytes, position: int, count: int) -> Tuple[int, ...]:
+    return struct.unpack_from(f">{count}H", data, position)
+
+def read_coverage_ids(data: bytes, offset: int) -> List[int]:
+    """Covered glyph ids in coverage index order."""
+    coverage_format, count = _uint16s(data, offset, 2)
+    if coverage_format == 1: return list(_uint16s(data, offset + 4, count))
+    glyph_ids: List[int] = []
+    for i in range(count):
+        start, end, _ = _uint16s(data, offset + 4 + 6 * i, 3)
+        glyph_ids += range(start, end + 1)
+    return glyph_ids
+
+def read_coverage(data: bytes, offset: int, names: List[str]) -> List[str]:
+    return [names[glyph_id] for glyph_id in read_coverage_ids(data, offset)]
+
+def read_class_definition(data: bytes, offset: int, names: List[str]) -> Dict[str, int]:
+    """Glyph name to class, for the glyphs of a class other than 0."""
+    classes = {}
+    class_format, = _uint16s(data, offset, 1)
+    if class_format == 1:
+        start, count = _uint16s(data, offset + 2, 2)
+        for i, glyph_class in enumerate(_uint16s(data, offset + 6, count)):
+            if glyph_class: classes[names[start + i]] = glyph_class
+    else:
+        count, = _uint16s(data, offset + 2, 1)
+        for i in range(count):
+            start, end, glyph_class = _uint16s(data, offset + 4 + 6 * i, 3)
+            if glyph_class: classes.update((name, glyph_class) for name in names[start:end + 1])
+    return classes
+
+def _class_sets(classes: Dict[str, int], names: List[str]) -> Dict[int, frozenset]:
+    """Glyphs of each class, class 0 being every glyph left out of the class definition."""
+    sets: Dict[int, set] = {0: set(names) - set(classes)}
+    for name, glyph_class in classes.items(): sets.setdefault(glyph_class, set()).add(name)
+    return {glyph_class: frozenset(glyphs) for glyph_class, glyphs in sets.items()}
+
+def read_value(data: bytes, position: int, value_format: int) -> Tuple[ValueRecord, int]:
+    """Returns the value record at position and its size. Device tables are ignored."""
+    fields = []
+    for bit in range(8):
+        if value_format & (1 << bit):
+            if bit < 4: fields.append(struct.unpack_from(">h", data, position)[0])
+            position += 2
+        elif bit < 4:
+            fields.append(0)
+    return ValueRecord(*fields), 2 * bin(value_format & 0xFF).count("1")
+
+def _read_actions(data: bytes, position: int, count: int, lookups: List[Lookup]):
+    records = _uint16s(data, position, 2 * count)
+    return [(records[2 * i], lookups[records[2 * i + 1]]) for i in range(count)]
+
+def _read_subtable(lookup: Lookup, data: bytes, offset: int, names: List[str], lookups: List[Lookup]) -> None:
+    """Add the rules of a subtable to lookup, earlier subtables taking precedence."""
+    mapping = lookup.mapping
+    subtable_format, = _uint16s(data, offset, 1)
+
+    if lookup.table == GSUB and lookup.type == SINGLE_SUB:
+        coverage_offset, = _uint16s(data, offset + 2, 1)
+        glyph_ids = read_coverage_ids(data, offset + coverage_offset)
+        glyphs = [names[glyph_id] for glyph_id in glyph_ids]
+        if subtable_format == 1:
+            delta, = _uint16s(data, offset + 4, 1)
+            targets = [names[(glyph_id + delta) & 0xFFFF] for glyph_id in glyph_ids]
+        else:
+            targets = [names[glyph_id] for glyph_id in _uint16s(data, offset + 6, len(glyphs))]
+        for glyph, target in zip(glyphs, targets): mapping.setdefault(glyph, target)
+
+    elif lookup.table == GSUB and lookup.type == MULTIPLE_SUB:
+        coverage_offset, count = _uint16s(data, offset + 2, 2)
+        glyphs = read_coverage(data, offset + coverage_offset, names)
+        for glyph, sequence_offset in zip(glyphs, _uint16s(data, offset + 6, count)):
+            length, = _uint16s(data, offset + sequence_offset, 1)
+            mapping.setdefault(glyph, tuple(names[glyph_id] for glyph_id in _uint16s(data, offset + sequence_offset + 2, length)))
+
+    elif lookup.table == GSUB and lookup.type == LIGATURE_SUB:
+        coverage_offset, count = _uint16s(data, offset + 2, 2)
+        glyphs = read_coverage(data, offset + coverage_offset, names)
+        for first, set_offset in zip(glyphs, _uint16s(data, offset + 6, count)):
+            set_position = offset + set_offset
+            ligature_count, = _uint16s(data, set_position, 1)
+            for ligature_offset in _uint16s(data, set_position + 2, ligature_count):
+                ligature, component_count = _uint16s(data, set_position + ligature_offset, 2)
+                components = _uint16s(data, set_position + ligature_offset + 4, component_count - 1)
+                mapping.setdefault((first,) + tuple(names[glyph_id] for glyph_id in components), names[ligature])
+
+    elif lookup.table == GSUB and lookup.type == CHAIN_SUB and subtable_format in (1, 2):
+        coverage_offset, = _uint16s(data, offset + 2, 1)
+        covered = read_coverage(data, offset + coverage_offset, names)
+        if subtable_format == 1:
+            count, = _uint16s(data, offset + 4, 1)
+            set_offsets = _uint16s(data, offset + 6, count)
+            first_sets = [frozenset([glyph]) for glyph in covered]
+            backtrack_sets = input_sets = lookahead_sets = None
+        else:
+            backtrack_offset, input_offset, lookahead_offset, count = _uint16s(data, offset + 4, 4)
+            set_offsets = _uint16s(data, offset + 12, count)
+            sets = [
+                _class_sets(read_class_definition(data, offset + class_offset, names) if class_offset else {}, names)
+                for class_offset in (backtrack_offset, input_offset, lookahead_offset)
+            ]
+            backtrack_sets, input_sets, lookahead_sets = sets
+            first_sets = [input_sets.get(glyph_class, frozenset()) & frozenset(covered) for glyph_class in range(count)]
+
+        def glyph_sets(values, class_sets):
+            if class_sets is None: return [frozenset([names[value]]) for value in values]
+            return [class_sets.get(value, frozenset()) for value in values]
+
+        for first, set_offset in zip(first_sets, set_offsets):
+            if not set_offset or not first: continue
+            set_position = offset + set_offset
+            rule_count, = _uint16s(data, set_position, 1)
+            for rule_offset in _uint16s(data, set_position + 2, rule_count):
+                position = set_position + rule_offset
+                backtrack_count, = _uint16s(data, position, 1)
+                backtrack = _uint16s(data, position + 2, backtrack_count)
+                position += 2 + 2 * backtrack_count
+                input_count, = _uint16s(data, position, 1)
+                inputs = _uint16s(data, position + 2, input_count - 1)
+                position += 2 * input_count
+                lookahead_count, = _uint16s(data, position, 1)
+                lookahead = _uint16s(data, position + 2, lookahead_count)
+                position += 2 + 2 * lookahead_count
+                action_count, = _uint16s(data, position, 1)
+                lookup.add_chain_rule(ChainRule(
+                    glyph_sets(reversed(backtrack), backtrack_sets),  # Stored closest glyph first
+                    [first] + glyph_sets(inputs, input_sets),
+                    glyph_sets(lookahead, lookahead_sets),
+                    _read_actions(data, position + 2, action_count, lookups),
+                ))
+
+    elif lookup.table == GSUB and lookup.type == CHAIN_SUB and subtable_format == 3:
+        position = offset + 2
+        coverages = []
+        for _ in range(3):
+            count, = _uint16s(data, position, 1)
+            coverages.append([frozenset(read_coverage(data, offset + coverage_offset, names)) for coverage_offset in _uint16s(data, position + 2, count)])
+            position += 2 + 2 * count
+        action_count, = _uint16s(data, position, 1)
+        backtrack, inputs, lookahead = coverages
+        lookup.add_chain_rule(ChainRule(backtrack[::-1], inputs, lookahead, _read_actions(data, position + 2, action_count, lookups)))
+
+    elif lookup.table == GPOS and lookup.type == SINGLE_POS:
+        coverage_offset, value_format = _uint16s(data, offset + 2, 2)
+        glyphs = read_coverage(data, offset + coverage_offset, names)
+        if subtable_format == 1:
+            value, _ = read_value(data, offset + 6, value_format)
+            for glyph in glyphs: mapping.setdefault(glyph, value)
+        else:
+            position = offset + 8
+            for glyph in glyphs:
+                value, size = read_value(data, position, value_format)
+                mapping.setdefault(glyph, value)
+                position += size
+
+    elif lookup.table == GPOS and lookup.type == PAIR_POS:
+        coverage_offset, value_format1, value_format2 = _uint16s(data, offset + 2, 3)
+        if value_format2 & 0x0F: raise LayoutError("Pair adjustments of the second glyph are not supported")
+        glyphs = read_coverage(data, offset + coverage_offset, names)
+        size2 = 2 * bin(value_format2 & 0xFF).count("1")
+        if subtable_format == 1:
+            count, = _uint16s(data, offset + 8, 1)
+            for first, set_offset in zip(glyphs, _uint16s(data, offset + 10, count)):
+                position = offset + set_offset
+                pair_count, = _uint16s(data, position, 1)
+                position += 2
+                for _ in range(pair_count):
+                    second, = _uint16s(data, position, 1)
+                    value, size = read_value(data, position + 2, value_format1)
+                    mapping.setdefault((first, names[second]), value)
+                    position += 2 + size + size2
+        else:
+            class_offset1, class_offset2, class1_count, class2_count = _uint16s(data, offset + 8, 4)
+            classes1 = read_class_definition(data, offset + class_offset1, names)
+            classes2 = _class_sets(read_class_definition(data, offset + class_offset2, names), names)
+            _, record_size = read_value(data, 0, value_format1)
+            record_size += size2
+            for first in glyphs:
+                row = offset + 16 + classes1.get(first, 0) * class2_count * record_size
+                for class2 in range(class2_count):
+                    value, _ = read_value(data, row + class2 * record_size, value_format1)
+                    if not any(value): continue  # Nothing to adjust, whatever comes after
+                    for second in classes2.get(class2, ()): mapping.setdefault((first, second), value)
+
+    else:
+        raise LayoutError(f"Cannot read {lookup.table} lookups of type {lookup.type} (format {subtable_format})")
+
+def _read_lookups(table: str, data: bytes, names: List[str]) -> List[Lookup]:
+    lookup_list, = _uint16s(data, 8, 1)
+    count, = _uint16s(data, lookup_list, 1)
+    lookups = []
+    subtables = []
+    for lookup_offset in _uint16s(data, lookup_list + 2, count):
+        position = lookup_list + lookup_offset
+        lookup_type, flag, subtable_count = _uint16s(data, position, 3)
+        offsets = [position + subtable_offset for subtable_offset in _uint16s(data, position + 6, subtable_count)]
+        if lookup_type == EXTENSION_TYPES[table]:
+            resolved = []
+            for offset in offsets:
+                _, lookup_type, extension_offset = struct.unpack_from(">HHI", data, offset)
+                resolved.append(offset + extension_offset)
+            offsets = resolved
+        lookups.append(Lookup(table, lookup_type, flag & ~USE_MARK_FILTERING_SET))
+        subtables.append(offsets)
+
+    # Chained rules point at other lookups, which must all exist first
+    for lookup, offsets in zip(lookups, subtables):
+        for offset in offsets: _read_subtable(lookup, data, offset, names, lookups)
+    return lookups
+
+def read_layout(tables: Dict[str, bytes], names: List[str]) -> Layout:
+    """
+    Read the GDEF, GSUB and GPOS tables of a font back into a Layout. Lookups are unnamed
+    and listed in LookupList order, GSUB first.
+
+    Parameters:
+        tables (dict): Table tag to data, such as returned by sfnt.read_font.
+        names (list): Glyph names in glyph order.
+    """
+    layout = Layout()
+    if "GDEF" in tables:
+        class_offset, = _uint16s(tables["GDEF"], 4, 1)
+        if class_offset: layout.glyph_classes = read_class_definition(tables["GDEF"], class_offset, names)
+
+    for table in (GSUB, GPOS):
+        if table not in tables: continue
+        data = tables[table]
+        lookups = _read_lookups(table, data, names)
+        layout.lookups += lookups
+
+        script_list, feature_list = _uint16s(data, 4, 2)
+        feature_count, = _uint16s(data, feature_list, 1)
+        features = []
+        for i in range(feature_count):
+            tag = data[feature_list + 2 + 6 * i:feature_list + 6 + 6 * i].decode("latin-1").rstrip()
+            feature_offset, = _uint16s(data, feature_list + 6 + 6 * i, 1)
+            position = feature_list + feature_offset
+            count, = _uint16s(data, position + 2, 1)
+            features.append((tag, _uint16s(data, position + 4, count)))
+
+        def language_system(script: str, language: str, position: int) -> None:
+            required, count = _uint16s(data, position + 2, 2)
+            indices = list(_uint16s(data, position + 6, count))
+            if required != 0xFFFF: indices.insert(0, required)
+            for feature_index in indices:
+                tag, lookup_indices = features[feature_index]
+                system = layout.features.setdefault((table, tag), {}).setdefault((script, language), [])
+                system += [lookups[index] for index in sorted(lookup_indices) if lookups[index] not in system]
+
+        script_count, = _uint16s(data, script_list, 1)
+        for i in range(script_count):
+            script = data[script_list + 2 + 6 * i:script_list + 6 + 6 * i].decode("latin-1").rstrip()
+            script_offset, = _uint16s(data, script_list + 6 + 6 * i, 1)
+            position = script_list + script_offset
+            default_offset, language_count = _uint16s(data, position, 2)
+            if default_offset: language_system(script, "dflt", position + default_offset)
+            for j in range(language_count):
+                language = data[position + 4 + 6 * j:position + 8 + 6 * j].decode("latin-1").rstrip()
+                language_offset, = _uint16s(data, position + 8 + 6 * j, 1)
+                language_system(script, language, position + language_offset)
+
+    return layout
@@ -0,0 +1,140 @@
+"""
+Bring a built font up to date by editing its binary instead of building it again, when
+the inputs changed in a way that only affects a few of its tables :
+
+- padding (input/padding.json, which the notebook writes) : the advance widths change,
+  hmtx and the CFF table (whose charstrings carry the widths too) are written again from
+  the cached glyphs, and the fields of hhea and OS/2 derived from the advances are patched.
+  Only for fonts of the python backend, whose CFF table cff.py writes : FontForge picks its
+  own width defaults and hints, a padding change builds its fonts again.
+- features (input/features.fea) : GDEF, GSUB and GPOS are compiled again (only the lookups
+  whose block changed, see otl.py) and spliced into the font, with OS/2 usMaxContext.
+
+Both can be applied at once. Only a font the build cache recorded for that output,
+untouched since, is patched. The table directory, the table checksums and
+head.checkSumAdjustment are recomputed (see sfnt.replace_tables), the WOFF and the hashed
+copies are written again from the patched font. (see publish.py) A font of the python
+backend comes out of a patch the same, byte for byte, as a build of the same inputs from
+scratch.
+"""
+
+import os
+import json
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Set # type: ignore
+
+from . import config
+from .cache import BuildCache, collect_inputs, hash_bytes, hash_json
+from .cff import read_glyph_names
+from .fea import parse_feature_file
+from .otf import NOTDEF, average_width, build_outlines, min_right_side_bearing, outline_glyphs, pack_hmtx, read_advances, read_side_bearings
+from .otl import build_layout_tables
+from .publish import publish_font
+from .sfnt import read_tables, replace_tables, write_woff
+
+PADDING_PREFIX = "padding:"  # Inputs coming from padding.json, see cache.collect_inputs
+FEATURES = "features"
+OUTLINES_BACKEND = "python"  # Backend whose CFF table patch_padding can write again
+LAYOUT_TABLES = ("GDEF", "GSUB", "GPOS")
+OS2_MAX_CONTEXT_OFFSET = 94  # usMaxContext, OS/2 version 2 and later
+
+
+def changed_inputs(previous: Dict[str, str], current: Dict[str, str]) -> Set[str]:
+    """Names of the inputs added, removed or modified between two builds."""
+    return {name for name in set(previous) | set(current) if previous.get(name) != current.get(name)}
+
+def can_patch(changed: Set[str]) -> bool:
+    """True if every change is one patching handles."""
+    return all(name == FEATURES or name.startswith(PADDING_PREFIX) for name in changed)
+
+
+def patch_padding(tables: Dict[str, bytes], names: List[str], entries: Dict[str, dict], padding: Dict[str, float]) -> Optional[Dict[str, bytes]]:
+    """
+    hmtx, hhea, OS/2 and CFF with the advance widths the padding gives, None if the font
+    does not have the glyphs of entries.
+
+    Parameters:
+        names (list): Glyph names of the font, in glyph order.
+        entries (dict): Glyph name to {"contours", "bbox"}, as returned by glyphs.load_glyphs.
+        padding (dict): Content of padding.json.
+    """
+    glyphs = {glyph.name: glyph for glyph in outline_glyphs(entries, padding)}
+    if set(names) != set(glyphs): return None
+
+    count = len(names)
+    advances = read_advances(tables["hhea"], tables["hmtx"], count)
+    widths = [advances[gid] if name == NOTDEF else glyphs[name].width for gid, name in enumerate(names)]
+    hmtx, number_of_hmetrics = pack_hmtx(widths, read_side_bearings(tables["hhea"], tables["hmtx"], count))
+
+    hhea = bytearray(tables["hhea"])
+    struct.pack_into(">H", hhea, 10, max(widths))  # advanceWidthMax
+    struct.pack_into(">h", hhea, 14, min_right_side_bearing([glyphs[name]._replace(width=width) for name, width in zip(names, widths)]))
+    struct.pack_into(">H", hhea, 34, number_of_hmetrics)
+    os2 = bytearray(tables["OS/2"])
+    struct.pack_into(">h", os2, 2, average_width(widths))  # xAvgCharWidth
+    outlines = build_outlines([glyphs[name]._replace(width=width) for name, width in zip(names, widths)])
+    return {"hmtx": hmtx, "hhea": bytes(hhea), "OS/2": bytes(os2), "CFF ": outlines}
+
+def patch_layout(tables: Dict[str, bytes], names: List[str], cache: BuildCache) -> Dict[str, Optional[bytes]]:
+    """GDEF, GSUB and GPOS compiled from the feature file (None for the ones it does not need) and OS/2."""
+    glyph_ids = {name: gid for gid, name in enumerate(names)}
+    layout = parse_feature_file(config.feature_path, glyph_ids)
+    layout_tables, compiled = build_layout_tables(layout, glyph_ids, cache)
+    print("Compiled", len(compiled), "lookups:", " ".join(compiled))
+
+    replacements: Dict[str, Optional[bytes]] = {tag: layout_tables.get(tag) for tag in LAYOUT_TABLES}
+    os2 = bytearray(tables["OS/2"])
+    if len(os2) >= OS2_MAX_CONTEXT_OFFSET + 2: struct.pack_into(">H", os2, OS2_MAX_CONTEXT_OFFSET, layout.max_context)
+    replacements["OS/2"] = bytes(os2)
+    return replacements
+
+
+def patch_font(output_path: Path, backend_name: str, cache: Optional[BuildCache] = None) -> bool:
+    """
+    Patch the font a previous build wrote to output_path if the inputs changed since in a
+    way patching can handle.
+
+    Parameters:
+        backend_name (str): Backend the font is built with, part of the build key.
+
+    Returns:
+        bool: True if the font was patched and is now up to date.
+    """
+    cache = cache or BuildCache()
+    entry = cache.manifest["outputs"].get(str(output_path))
+    if entry is None or not Path(output_path).is_file(): return False
+    with open(output_path, 'rb') as f: data = f.read()
+    if hash_bytes(data) != entry["hash"]: return False  # Modified since, cannot be trusted
+
+    sources, inputs = collect_inputs(config.glyph_dir, config.padding_path, config.feature_path, config=[config.config_key(), backend_name], order_path=config.glyph_order_path)
+    changed = changed_inputs(entry["inputs"], inputs)
+    if not changed or not can_patch(changed): return False
+
+    _, tables = read_tables(data)
+    names = read_glyph_names(tables["CFF "])
+    replacements: Dict[str, Optional[bytes]] = {}
+
+    if any(name.startswith(PADDING_PREFIX) for name in changed):
+        if backend_name != OUTLINES_BACKEND: return False
+        entries = {name: cache.load_glyph(key) for name, (_, key) in sources.items()}
+        if any(glyph_entry is None for glyph_entry in entries.values()): return False
+        with open(config.padding_path, 'r') as f: padding = json.load(f)
+        patched = patch_padding(tables, names, entries, padding)
+        if patched is None: return False
+        replacements.update(patched)
+        tables.update(patched)
+
+    if FEATURES in changed:
+        replacements.update(patch_layout(tables, names, cache))
+
+    patched = replace_tables(data, replacements)
+    tmp_path = Path(str(output_path) + '.tmp')
+    with open(tmp_path, 'wb') as f: f.write(patched)
+    os.replace(tmp_path, output_path)
+    write_woff(output_path, patched)
+    publish_font(output_path, patched)
+    cache.record_output(output_path, hash_json(inputs), inputs)
+    cache.save()
+    print("Patched", ", ".join(sorted(tag.strip() for tag, table in replacements.items() if table is not None)), "into", output_path)
+    return True
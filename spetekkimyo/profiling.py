@@ -0,0 +1,111 @@
+"""
+Timings of the phases of a build (parsing the EPS files, drawing the outlines, merging the
+features, writing the font...) and of each glyph within them.
+
+A BuildProfile is what generate_font returns. It can be written as a Chrome trace (open it
+in chrome://tracing or https://ui.perfetto.dev) or printed as a summary table. Timings
+taken in other processes (glyph import pool, ffpython worker) are merged into it, start
+times use the wall clock so that they line up.
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional # type: ignore
+
+PHASE = "phase"
+GLYPH = "glyph"  # Per glyph timings, their name is the phase and their "glyph" argument the glyph
+
+
+class PhaseSummary(NamedTuple):
+    name: str
+    count: int
+    total: float  # Seconds
+    mean: float
+    max: float
+
+
+class BuildProfile:
+    """
+    Timed events of a build.
+
+    Each event is a dict : name, category (PHASE or GLYPH), start (unix time, seconds),
+    seconds, pid, tid and args.
+    """
+
+    def __init__(self, events: Optional[List[dict]] = None):
+        self.events: List[dict] = events or []
+
+    def add(self, name: str, start: float, seconds: float, category: str = PHASE, pid: Optional[int] = None,
+            tid: Optional[int] = None, **args) -> None:
+        self.events.append({
+            "name": name, "category": category, "start": start, "seconds": seconds,
+            "pid": os.getpid() if pid is None else pid,
+            "tid": threading.get_ident() if tid is None else tid,
+            "args": args,
+        })
+
+    @contextmanager
+    def phase(self, name: str, category: str = PHASE, **args) -> Iterator[None]:
+        """Time the body of the with block."""
+        start = time.time()
+        started = time.perf_counter()
+        try: yield
+        finally: self.add(name, start, time.perf_counter() - started, category, **args)
+
+    def merge(self, other: "BuildProfile") -> None:
+        self.events.extend(other.events)
+
+    # EXPORT ====================================
+
+    def to_dict(self) -> dict:
+        """Json serializable form, to send a profile across processes."""
+        return {"events": self.events}
+
+    @classmethod
+    def from_dict(cls, value: dict) -> "BuildProfile":
+        return cls(list(value.get("events", [])))
+
+    def chrome_trace(self) -> dict:
+        """Trace Event Format, complete events in microseconds."""
+        return {
+            "traceEvents": [{
+                "name": event["name"], "cat": event["category"], "ph": "X",
+                "ts": round(event["start"] * 1e6, 1), "dur": round(event["seconds"] * 1e6, 1),
+                "pid": event["pid"], "tid": event["tid"], "args": event["args"],
+            } for event in sorted(self.events, key=lambda event: event["start"])],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_trace(self, path) -> None:
+        with open(path, 'w') as f: json.dump(self.chrome_trace(), f)
+
+    # SUMMARY ===================================
+
+    def summary(self, category: str = PHASE) -> List[PhaseSummary]:
+        """Events of a category grouped by name, in the order they first happened."""
+        groups: Dict[str, List[float]] = {}
+        for event in sorted(self.events, key=lambda event: event["start"]):
+            if event["category"] == category: groups.setdefault(event["name"], []).append(event["seconds"])
+        return [PhaseSummary(name, len(times), sum(times), sum(times) / len(times), max(times)) for name, times in groups.items()]
+
+    def slowest_glyphs(self, count: int = 5) -> List[dict]:
+        """The glyph events that took the longest."""
+        return sorted((event for event in self.events if event["category"] == GLYPH), key=lambda event: -event["seconds"])[:count]
+
+    def format_summary(self, slowest: int = 5) -> str:
+        """Table of the phases, of the per glyph steps and of the slowest glyphs."""
+        lines = []
+        for title, category in (("Phase", PHASE), ("Per glyph", GLYPH)):
+            rows = self.summary(category)
+            if not rows: continue
+            lines.append(f"{title:<24} {'count':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9}")
+            for row in rows:
+                lines.append(f"{row.name:<24} {row.count:>6} {row.total * 1000:>10.1f} {row.mean * 1000:>9.2f} {row.max * 1000:>9.2f}")
+            lines.append("")
+        glyphs = self.slowest_glyphs(slowest)
+        if glyphs:
+            lines.append("Slowest glyphs : " + ", ".join(f"{event['args'].get('glyph')} ({event['name']}, {event['seconds'] * 1000:.1f} ms)" for event in glyphs))
+        return "\n".join(lines).rstrip()
@@ -0,0 +1,101 @@
+"""
+Content-addressed copies of the built fonts, for pages that want to cache them for good.
+
+Every build leaves, next to the font it writes (output/test.otf), copies named after the
+hash of the font (output/test.<hash>.otf, and the WOFF, output/test.<hash>.woff) and a
+manifest, output/fonts.json, mapping the name of the font to its current copies :
+
+    {"version": 1, "fonts": {"test": {"hash": "<hash>", "files": {"otf": "test.<hash>.otf",
+                                                                 "woff": "test.<hash>.woff"},
+                                      "history": ["<hash>", "<previous hash>", ...]}}}
+
+A hashed file never changes, so it can be served with a long-lived cache, and a page only
+has to fetch the manifest again (or hear from spetekkimyo watch) to learn about a new font.
+The last KEPT_VERSIONS copies of a font are kept, for the pages still showing them.
+"""
+
+import os
+import re
+import json
+from pathlib import Path
+from typing import Dict, Optional # type: ignore
+
+from .cache import hash_bytes
+from .sfnt import woff_path
+
+MANIFEST_NAME = "fonts.json"
+MANIFEST_VERSION = 1
+HASH_LENGTH = 12
+KEPT_VERSIONS = 3
+
+
+def manifest_path(font_path) -> Path:
+    return Path(font_path).parent / MANIFEST_NAME
+
+def hashed_name(path, digest: str) -> str:
+    """test.otf -> test.<digest>.otf"""
+    path = Path(path)
+    return f"{path.stem}.{digest}{path.suffix}"
+
+def is_hashed(name: str) -> bool:
+    """True for the name of a content-addressed copy, which never changes once written."""
+    return re.fullmatch(r"[^/]+\.[0-9a-f]{%d}\.[A-Za-z0-9]+" % HASH_LENGTH, name) is not None
+
+def read_manifest(directory) -> dict:
+    """Manifest of the fonts built in directory, empty if there is none yet (or an outdated one)."""
+    path = Path(directory) / MANIFEST_NAME
+    try:
+        with open(path, 'r', encoding='utf-8') as f: manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get("version") != MANIFEST_VERSION: manifest = {"version": MANIFEST_VERSION, "fonts": {}}
+    return manifest
+
+def _write(path: Path, data: bytes) -> None:
+    tmp_path = Path(str(path) + '.tmp')
+    with open(tmp_path, 'wb') as f: f.write(data)
+    os.replace(tmp_path, path)
+
+
+def publish_font(font_path, data: Optional[bytes] = None) -> Dict[str, str]:
+    """
+    Copy the font at font_path (and its WOFF, if there is one) under content-hashed names and
+    point the manifest at them. Nothing is written when they are current already.
+
+    Parameters:
+        data (bytes): Content of the font, read from font_path if not given.
+
+    Returns:
+        dict: Format ("otf", "woff") to the name of the hashed copy, in the folder of the font.
+    """
+    font_path = Path(font_path)
+    if data is None:
+        with open(font_path, 'rb') as f: data = f.read()
+    digest = hash_bytes(data)[:HASH_LENGTH]  # The WOFF is made from the font, it shares its hash
+
+    sources = {font_path.suffix.lstrip(".").lower(): (font_path, data)}
+    woff = woff_path(font_path)
+    if woff is not None and woff.is_file(): sources["woff"] = (woff, None)
+    files = {}
+    for kind, (path, content) in sources.items():
+        files[kind] = hashed_name(path, digest)
+        target = font_path.parent / files[kind]
+        if target.is_file(): continue
+        if content is None:
+            with open(path, 'rb') as f: content = f.read()
+        _write(target, content)
+
+    manifest = read_manifest(font_path.parent)
+    previous = manifest["fonts"].get(font_path.stem, {})
+    if previous.get("hash") == digest and previous.get("files") == files: return files
+
+    history = [digest] + [old for old in previous.get("history", []) if old != digest][:KEPT_VERSIONS - 1]
+    manifest["fonts"][font_path.stem] = {"hash": digest, "files": files, "history": history}
+    _write(manifest_path(font_path), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    # Copies of versions no page should be showing anymore
+    pattern = re.compile(re.escape(font_path.stem) + r"\.([0-9a-f]{%d})\.[A-Za-z0-9]+" % HASH_LENGTH)
+    for entry in os.scandir(font_path.parent):
+        match = pattern.fullmatch(entry.name)
+        if match and match.group(1) not in history: os.unlink(entry.path)
+    return files
@@ -0,0 +1,239 @@
+"""
+Anti-aliased grayscale rendering of glyphs and shaped runs with NumPy, to look at what
+the font draws without a browser nor FreeType.
+
+Outlines are flattened into line segments (cubic curves included), then every segment
+adds its signed crossings of the sample rows to an accumulation buffer in one vectorized
+pass. A running sum along each row turns the crossings into coverage, with exact coverage
+across a row and a few sample rows per pixel vertically. A whole shaped word is flattened
+and accumulated at once, not glyph by glyph.
+
+Bitmaps are uint8 arrays of (rows, columns), 0 for paper and 255 for full ink, filled
+with the nonzero winding rule like CFF outlines.
+
+NOTE : needs NumPy, unlike the rest of the package. (pip install spetekkimyo[raster])
+"""
+
+import math
+import zlib
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple # type: ignore
+
+import numpy as np
+
+from . import config
+from .cache import hash_json
+from .cff import read_glyph_names, read_outlines
+from .eps import Contour, segments
+from .otf import OutlineGlyph, read_vertical_metrics
+from .shape import ShapedGlyph
+from .sfnt import read_font
+
+RENDER_VERSION = 1  # Bump when the same run would render differently, it is part of run_key
+SUBSAMPLES = 4  # Sample rows per pixel row
+TOLERANCE = 0.2  # Largest distance in pixels between a curve and its flattening
+MAX_CURVE_STEPS = 64
+
+
+def flatten(contours: List[Contour], scale: float, tolerance: float = TOLERANCE) -> np.ndarray:
+    """
+    Line segments (x0, y0, x1, y1) drawing contours, in pixels with y going down and the
+    origin of the glyph at (0, 0).
+    """
+    lines: List[Tuple[float, float, float, float]] = []
+    curves: List[Tuple[float, ...]] = []
+    for contour in contours:
+        for segment in segments(contour):
+            points = [coordinate for x, y in segment for coordinate in (x * scale, -y * scale)]
+            if len(segment) == 2: lines.append(tuple(points))
+            else: curves.append(tuple(points))
+    edges = np.array(lines, dtype=np.float64).reshape(-1, 4)
+    if not curves: return edges
+
+    p0, p1, p2, p3 = np.array(curves, dtype=np.float64).reshape(-1, 4, 2).transpose(1, 0, 2)
+    # Second differences bound how far the curve strays from its chords
+    bend = np.maximum(np.hypot(*(p0 - 2 * p1 + p2).T), np.hypot(*(p1 - 2 * p2 + p3).T))
+    steps = np.clip(np.ceil(np.sqrt(0.75 * bend / tolerance)), 1, MAX_CURVE_STEPS).astype(np.int64)
+
+    curve = np.repeat(np.arange(len(steps)), steps)
+    step = np.arange(len(curve)) - np.repeat(np.cumsum(steps) - steps, steps)
+    def point(t: np.ndarray) -> np.ndarray:
+        t = t[:, None]
+        mt = 1 - t
+        return mt ** 3 * p0[curve] + 3 * mt * mt * t * p1[curve] + 3 * mt * t * t * p2[curve] + t ** 3 * p3[curve]
+    start = point(step / steps[curve])
+    end = point((step + 1) / steps[curve])
+    return np.concatenate([edges, np.hstack([start, end])])
+
+def rasterize(edges: np.ndarray, width: int, height: int, subsamples: int = SUBSAMPLES) -> np.ndarray:
+    """
+    Coverage bitmap of the shape the edges enclose, (0, 0) being the top left corner of
+    the bitmap. Whatever falls outside of it is clipped.
+    """
+    buffer_width = width + 2
+    x0, y0, x1, y1 = (edges * [1, subsamples, 1, subsamples]).T
+    winding = np.where(y1 > y0, 1.0, -1.0)
+    top = np.minimum(y0, y1)
+    bottom = np.maximum(y0, y1)
+
+    # Sample rows whose center (row + 0.5) lies within [top, bottom) of each edge
+    first = np.clip(np.ceil(top - 0.5), 0, height * subsamples).astype(np.int64)
+    last = np.clip(np.ceil(bottom - 0.5), 0, height * subsamples).astype(np.int64)
+    counts = last - first
+    edge = np.repeat(np.arange(len(counts)), counts)
+    row = first[edge] + np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    center = row + 0.5
+    x = x0[edge] + (center - y0[edge]) * (x1[edge] - x0[edge]) / (y1[edge] - y0[edge])
+    x = np.clip(x, 0, width)
+    column = np.floor(x).astype(np.int64)
+    fraction = x - column
+
+    # Each crossing covers the rest of its row, split between the pixel it falls in and the next
+    index = row * buffer_width + column
+    weights = winding[edge]
+    size = height * subsamples * buffer_width
+    accumulation = (
+        np.bincount(index, weights * (1 - fraction), minlength=size)
+        + np.bincount(index + 1, weights * fraction, minlength=size)
+    ).reshape(height * subsamples, buffer_width)
+
+    coverage = np.minimum(np.abs(np.cumsum(accumulation, axis=1)[:, :width]), 1.0)
+    coverage = coverage.reshape(height, subsamples, width).mean(axis=1)
+    return np.round(coverage * 255).astype(np.uint8)
+
+
+class Rasterizer:
+    """
+    Render glyphs and shaped runs at a given size.
+
+    Parameters:
+        outlines (dict): Glyph name to contours, in font units.
+        size (float): Pixels per em.
+        units_per_em (int), ascent (int), descent (int): Vertical metrics of the font, the
+            bitmaps span from ascent to descent around the baseline at least.
+        subsamples (int): Sample rows per pixel row.
+    """
+
+    def __init__(self, outlines: Dict[str, List[Contour]], size: float = 64, units_per_em: int = config.UNITS_PER_EM,
+                 ascent: int = config.ASCENT, descent: int = config.DESCENT, subsamples: int = SUBSAMPLES):
+        self.outlines = outlines
+        self.size = size
+        self.units_per_em = units_per_em
+        self.scale = size / units_per_em
+        self.ascent = ascent
+        self.descent = descent
+        self.subsamples = subsamples
+        self._edges: Dict[str, np.ndarray] = {}
+        self._outline_keys: Dict[str, str] = {}
+
+    @classmethod
+    def from_font(cls, path, **options) -> "Rasterizer":
+        """Rasterizer for the outlines of a built font file (.otf)."""
+        _, tables = read_font(path)
+        names = read_glyph_names(tables["CFF "])
+        units_per_em, ascent, descent = read_vertical_metrics(tables["head"], tables["hhea"])
+        outlines = dict(zip(names, read_outlines(tables["CFF "])))
+        return cls(outlines, units_per_em=units_per_em, ascent=ascent, descent=descent, **options)
+
+    @classmethod
+    def from_glyphs(cls, glyphs: List[OutlineGlyph], **options) -> "Rasterizer":
+        """Rasterizer for the glyphs the font would be built from. (see otf.outline_glyphs)"""
+        return cls({glyph.name: glyph.contours for glyph in glyphs}, **options)
+
+    def edges(self, name: str) -> np.ndarray:
+        """Flattened outline of a glyph, in pixels from its origin. (computed once per glyph)"""
+        if name not in self._edges: self._edges[name] = flatten(self.outlines.get(name, []), self.scale)
+        return self._edges[name]
+
+    def run_key(self, run: Sequence) -> str:
+        """Hash of everything the bitmap of a run depends on : outlines, positions and settings."""
+        for glyph in run:
+            if glyph.name not in self._outline_keys: self._outline_keys[glyph.name] = hash_json(self.outlines.get(glyph.name, []))
+        return hash_json([
+            RENDER_VERSION, self.size, self.units_per_em, self.ascent, self.descent, self.subsamples,
+            [[self._outline_keys[glyph.name], glyph.x_advance, glyph.x_offset, glyph.y_offset] for glyph in run],
+        ])
+
+    def render_run(self, run: Sequence) -> np.ndarray:
+        """
+        Bitmap of shaped glyphs (ShapedGlyph, or anything with name, x_advance, x_offset and
+        y_offset) drawn one after the other, in a single rasterization pass.
+
+        The bitmap spans the advances of the run and the ascent and descent of the font, widened
+        to fit the ink that goes past them. The origin of the run is at the left, on the baseline.
+        """
+        scale = self.scale
+        parts = []
+        pen = 0.0
+        for glyph in run:
+            edges = self.edges(glyph.name)
+            if len(edges):
+                dx = (pen + glyph.x_offset) * scale
+                dy = -glyph.y_offset * scale
+                parts.append(edges + [dx, dy, dx, dy])
+            pen += glyph.x_advance
+        edges = np.concatenate(parts) if parts else np.zeros((0, 4))
+
+        left, right = 0.0, pen * scale
+        top, bottom = -self.ascent * scale, self.descent * scale
+        if len(edges):
+            xs, ys = edges[:, 0::2], edges[:, 1::2]
+            left, right = min(left, xs.min()), max(right, xs.max())
+            top, bottom = min(top, ys.min()), max(bottom, ys.max())
+        left, top = math.floor(left), math.floor(top)
+        width, height = max(1, math.ceil(right) - left), max(1, math.ceil(bottom) - top)
+        return rasterize(edges - [left, top, left, top], width, height, self.subsamples)
+
+    def render_glyph(self, name: str, advance: Optional[int] = None) -> np.ndarray:
+        """Bitmap of a single glyph, advance defaults to the right edge of its outline."""
+        if advance is None:
+            edges = self.edges(name)
+            advance = math.ceil(edges[:, 0::2].max() / self.scale) if len(edges) else 0
+        return self.render_run([ShapedGlyph(name, 0, advance, 0, 0, 0)])
+
+
+def _png(rows: np.ndarray, width: int, height: int, color_type: int) -> bytes:
+    rows = np.hstack([np.zeros((height, 1), np.uint8), rows])  # Filter type 0 before each row
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+def encode_png(bitmap: np.ndarray) -> bytes:
+    """8 bits grayscale PNG of a bitmap, ink in black on white paper."""
+    height, width = bitmap.shape
+    return _png(255 - bitmap, width, height, 0)
+
+def encode_rgb_png(image: np.ndarray) -> bytes:
+    """8 bits RGB PNG of a (rows, columns, 3) image."""
+    height, width, _ = image.shape
+    return _png(image.reshape(height, width * 3), width, height, 2)
+
+def decode_png(data: bytes) -> np.ndarray:
+    """Bitmap of a PNG written by encode_png. (other PNGs are not supported)"""
+    if data[:8] != b"\x89PNG\r\n\x1a\n": raise ValueError("Not a PNG file")
+    position = 8
+    header = b""
+    compressed = bytearray()
+    while position < len(data):
+        length, = struct.unpack_from(">I", data, position)
+        kind = data[position + 4:position + 8]
+        if kind == b"IHDR": header = data[position + 8:position + 8 + length]
+        elif kind == b"IDAT": compressed += data[position + 8:position + 8 + length]
+        position += 12 + length
+    width, height, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", header)
+    if (depth, color, interlace) != (8, 0, 0): raise ValueError("Only 8 bits grayscale PNGs are supported")
+    rows = np.frombuffer(zlib.decompress(bytes(compressed)), np.uint8).reshape(height, width + 1)
+    if rows[:, 0].any(): raise ValueError("Only unfiltered PNGs are supported")
+    return 255 - rows[:, 1:]
+
+def write_png(path, bitmap: np.ndarray) -> None:
+    with open(path, 'wb') as f: f.write(encode_png(bitmap))
+
+def read_png(path) -> np.ndarray:
+    with open(path, 'rb') as f: return decode_png(f.read())
@@ -0,0 +1,226 @@
+"""
+Golden image regression suite : render a curated list of Seiso words with a built font and
+compare them with reference bitmaps, to see every word a change of features.fea or of a
+glyph affected.
+
+Words come from the data-sample buttons of index.html, the <span class="ss"> examples of
+the notebook and the lexicon (input/lexicon.txt, one word per line) when there is one.
+
+References live in regression/references at the project root : references.json maps each
+word to the hash of its glyph run (Rasterizer.run_key), the bitmap being <hash>.png. A word
+whose run hash did not change is identical without being rendered at all, and the words
+that are rendered are cached in the build cache under the same hash, so only the words
+whose shaped output actually changed go through the rasterizer. Words are shaped through
+the shaping cache, a font checked before shapes nothing again. (see shapecache.py)
+
+NOTE : needs NumPy, through raster.py.
+"""
+
+import re
+import html
+import json
+import base64
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional # type: ignore
+
+import numpy as np
+
+from .cache import BuildCache, write_json
+from .raster import Rasterizer, decode_png, encode_png, encode_rgb_png, read_png
+from .shape import Shaper
+from .shapecache import ShapeCache
+
+root_dir = Path(__file__).parent.resolve()
+project_dir = root_dir.parent
+index_path = project_dir / 'index.html'
+notebook_path = project_dir / 'config.ipynb'
+lexicon_path = root_dir / 'input' / 'lexicon.txt'
+regression_dir = project_dir / 'regression'
+reference_dir = regression_dir / 'references'
+report_path = regression_dir / 'report.html'
+
+# Unchanged, changed (score above the threshold), new (no reference yet)
+UNCHANGED = "unchanged"
+CHANGED = "changed"
+NEW = "new"
+
+
+class WordResult(NamedTuple):
+    word: str
+    status: str
+    score: float  # Mean absolute pixel difference, from 0 (identical) to 1
+    pixels: int  # Number of pixels that differ
+    run_key: str
+
+
+# WORDS =========================================
+
+def sample_words(index: Path = index_path, notebook: Path = notebook_path, lexicon: Path = lexicon_path) -> List[str]:
+    """Words of the suite, without duplicates, in the order they are found."""
+    words: List[str] = []
+    if index.is_file():
+        with open(index, 'r', encoding='utf-8') as f:
+            words += [html.unescape(sample) for sample in re.findall(r'data-sample="([^"]*)"', f.read())]
+    if notebook.is_file():
+        with open(notebook, 'r', encoding='utf-8') as f: cells = json.load(f)["cells"]
+        for cell in cells:
+            source = "".join(cell["source"])
+            words += [html.unescape(sample).strip() for sample in re.findall(r'<span class=[\'"]ss[\'"]>(.*?)</span>', source, re.S)]
+    if lexicon.is_file():
+        with open(lexicon, 'r', encoding='utf-8') as f: words += [line.strip() for line in f]
+    return list(dict.fromkeys(word for word in words if word))
+
+
+# REFERENCES ====================================
+
+def load_references(directory: Path = reference_dir) -> Dict[str, str]:
+    """Word to the run hash of its reference bitmap."""
+    try:
+        with open(directory / 'references.json', 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_references(references: Dict[str, str], bitmaps: Dict[str, bytes], directory: Path = reference_dir) -> None:
+    """
+    Replace the references, removing the bitmaps no word uses anymore.
+
+    Parameters:
+        references (dict): Word to run hash.
+        bitmaps (dict): Run hash to PNG, for the runs that have no bitmap in directory yet.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    used = set(references.values())
+    for key in used:
+        path = directory / (key + '.png')
+        if not path.is_file():
+            with open(path, 'wb') as f: f.write(bitmaps[key])
+    for path in directory.glob('*.png'):
+        if path.stem not in used: path.unlink()
+    write_json(directory / 'references.json', references)
+
+
+# COMPARISON ====================================
+
+def compare(bitmap: np.ndarray, reference: np.ndarray):
+    """Mean absolute difference (0 to 1) and number of differing pixels, the smaller bitmap padded with paper."""
+    height, width = max(bitmap.shape[0], reference.shape[0]), max(bitmap.shape[1], reference.shape[1])
+    def padded(image):
+        return np.pad(image, ((0, height - image.shape[0]), (0, width - image.shape[1])))
+    difference = np.abs(padded(bitmap).astype(np.int16) - padded(reference))
+    return float(difference.mean() / 255), int(np.count_nonzero(difference))
+
+def diff_image(bitmap: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    """RGB overlay of the two bitmaps : ink only in the reference in red, only in the new one in blue."""
+    height, width = max(bitmap.shape[0], reference.shape[0]), max(bitmap.shape[1], reference.shape[1])
+    new = np.pad(bitmap, ((0, height - bitmap.shape[0]), (0, width - bitmap.shape[1]))).astype(np.int16)
+    old = np.pad(reference, ((0, height - reference.shape[0]), (0, width - reference.shape[1]))).astype(np.int16)
+    return np.stack([255 - new, 255 - np.maximum(new, old), 255 - old], axis=2).astype(np.uint8)
+
+
+class RegressionSuite:
+    """
+    Render the words with a font and compare them with the references.
+
+    Parameters:
+        font_path (Path): Built font to check.
+        size (float): Pixels per em of the bitmaps.
+        threshold (float): Largest score of a word still reported as unchanged.
+        cache (BuildCache): Where rendered runs (and shaped words, see shapecache.py) are kept
+            between runs of the suite.
+    """
+
+    def __init__(self, font_path, size: float = 64, threshold: float = 0.0, cache: Optional[BuildCache] = None):
+        self.shaper = Shaper.from_font(font_path)
+        self.rasterizer = Rasterizer.from_font(font_path, size=size)
+        self.threshold = threshold
+        self.cache = cache or BuildCache()
+        self.shapes = ShapeCache.for_shaper(self.shaper, directory=self.cache.directory / 'shaping')
+        self.rendered = 0  # Runs that went through the rasterizer, the others came from the cache
+        self._runs: Dict[str, list] = {}  # Run hash to the glyphs of the run, for the words checked
+
+    def render(self, key: str) -> bytes:
+        """PNG of a run checked before, from the cache when a run with the same hash was rendered already."""
+        png = self.cache.load_render(key)
+        if png is None:
+            png = encode_png(self.rasterizer.render_run(self._runs[key]))
+            self.cache.store_render(key, png)
+            self.rendered += 1
+        return png
+
+    def run(self, words: List[str], references: Dict[str, str], directory: Path = reference_dir) -> List[WordResult]:
+        """Shape every word and compare the ones whose run hash differs from their reference."""
+        results = []
+        for word, run in zip(words, self.shapes.shape_many(self.shaper, words)):
+            key = self.rasterizer.run_key(run)
+            self._runs[key] = run
+            reference = references.get(word)
+            if reference == key:
+                results.append(WordResult(word, UNCHANGED, 0.0, 0, key))
+                continue
+            bitmap = decode_png(self.render(key))
+            if reference is None or not (directory / (reference + '.png')).is_file():
+                results.append(WordResult(word, NEW, 1.0, int(np.count_nonzero(bitmap)), key))
+                continue
+            score, pixels = compare(bitmap, read_png(directory / (reference + '.png')))
+            results.append(WordResult(word, CHANGED if score > self.threshold else UNCHANGED, score, pixels, key))
+        return results
+
+    def update(self, results: List[WordResult], directory: Path = reference_dir) -> None:
+        """Make the current renders the references of the words of results."""
+        references = {result.word: result.run_key for result in results}
+        bitmaps = {key: self.render(key) for key in set(references.values()) if not (directory / (key + '.png')).is_file()}
+        save_references(references, bitmaps, directory)
+
+
+# REPORT ========================================
+
+def _data_url(png: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(png).decode()
+
+def write_report(results: List[WordResult], suite: RegressionSuite, references: Dict[str, str],
+                 path: Path = report_path, directory: Path = reference_dir) -> None:
+    """HTML page of the changed and new words, worst first, with their reference, new render and difference."""
+    rows = []
+    for result in sorted((result for result in results if result.status != UNCHANGED), key=lambda result: (result.status != CHANGED, -result.score)):
+        png = suite.render(result.run_key)
+        cells = [f"<td>{html.escape(result.word)}</td>", f"<td>{result.status}</td>", f"<td>{result.score:.4f}<br>{result.pixels} px</td>"]
+        if result.status == CHANGED:
+            with open(directory / (references[result.word] + '.png'), 'rb') as f: reference_png = f.read()
+            difference = diff_image(decode_png(png), decode_png(reference_png))
+            cells += [f'<td><img src="{_data_url(reference_png)}"></td>', f'<td><img src="{_data_url(png)}"></td>', f'<td><img src="{_data_url(encode_rgb_png(difference))}"></td>']
+        else:
+            cells += ["<td></td>", f'<td><img src="{_data_url(png)}"></td>', "<td></td>"]
+        rows.append("<tr>" + "".join(cells) + "</tr>")
+
+    counts = {status: sum(result.status == status for result in results) for status in (UNCHANGED, CHANGED, NEW)}
+    page = (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Seiso regression report</title>"
+        "<style>body{font-family:system-ui,sans-serif}td{padding:4px 8px;border-bottom:1px solid #ddd;vertical-align:middle}"
+        "img{image-rendering:pixelated}</style></head><body>"
+        f"<h1>Seiso regression report</h1><p>{len(results)} words : {counts[CHANGED]} changed, {counts[NEW]} new, "
+        f"{counts[UNCHANGED]} unchanged. Differences show the reference's ink in red and the new ink in blue.</p>"
+        "<table><tr><th>Word</th><th>Status</th><th>Score</th><th>Reference</th><th>New</th><th>Difference</th></tr>"
+        + "".join(rows) + "</table></body></html>\n"
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f: f.write(page)
+
+
+def run_regression(font_path, update: bool = False, size: float = 64, threshold: float = 0.0,
+                   words: Optional[List[str]] = None) -> List[WordResult]:
+    """
+    Check every word of the suite against its reference and write the report.
+
+    Parameters:
+        font_path (Path): Built font to check.
+        update (bool): Accept the current renders as the new references.
+        size (float): Pixels per em of the bitmaps.
+        threshold (float): Largest score of a word still reported as unchanged.
+        words (list): Words to check, defaults to sample_words().
+    """
+    suite = RegressionSuite(font_path, size=size, threshold=threshold)
+    references = load_references()
+    results = suite.run(words if words is not None else sample_words(), references)
+    write_report(results, suite, references)
+    if update: suite.update(results)
+    return results
@@ -0,0 +1,294 @@
+"""
+Local preview server, on asyncio : serves the page (index.html) and the fonts of output/,
+shapes text on request and pushes reload events to the open pages.
+
+- GET /<file> serves a file with an ETag, answering 304 when the page has it already.
+  Nothing else of the project folder is served, the repository and the caches stay out.
+  Content-hashed fonts (see publish.py) are cached for good, everything else revalidated.
+  File bodies go out with sendfile, straight from the file to the socket.
+- POST /shape shapes a batch of strings with the current font of the manifest :
+      {"texts": ["kasu", ...], "format": "glyphs" | "svg"}
+  and answers, in the same order :
+      {"font": "<hash>", "results": [{"text": "kasu", "width": 1830, "glyphs": [...]}, ...]}
+  where "glyphs" lists [name, cluster, x advance, y advance, x offset, y offset] like
+  corpus.py, and "svg" replaces it with a drawing of the run (see svg.py).
+  Runs come from the shaping cache (see shapecache.py), shared with the shape command and
+  the regression suite, a word already shaped with the font is not shaped again. Shaping
+  runs off the event loop.
+- GET /events is a Server-Sent Events stream, spetekkimyo watch publishes on it.
+"""
+
+import os
+import re
+import json
+import asyncio
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple # type: ignore
+from urllib.parse import unquote, urlsplit
+
+from .cache import hash_file
+from .publish import is_hashed, manifest_path, read_manifest
+from .shape import Shaper
+from .shapecache import MEMORY_SIZE, ShapeCache
+from .svg import SVGRenderer
+
+root_dir = Path(__file__).parent.resolve()
+project_dir = root_dir.parent  # index.html and output/ live there
+DEFAULT_FONT = "output/test.otf"  # Relative to the project folder
+PAGE = "index.html"
+
+GLYPHS = "glyphs"
+SVG = "svg"
+FORMATS = (GLYPHS, SVG)
+MAX_BATCH = 5000  # Strings per /shape request
+MAX_BODY = 4 * 1024 * 1024
+KEEPALIVE_SECONDS = 15  # Between two comments on an idle event stream
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class EventBroadcaster:
+    """Fan out events to every page listening on /events. publish can be called from any thread."""
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None  # Set by the server once it runs
+        self._clients: List[asyncio.Queue] = []
+
+    def subscribe(self) -> asyncio.Queue:
+        client = asyncio.Queue()
+        self._clients.append(client)
+        return client
+
+    def unsubscribe(self, client: asyncio.Queue) -> None:
+        self._clients.remove(client)
+
+    def publish(self, event: str, data: dict) -> None:
+        if self.loop is None: return  # Nobody can be listening yet
+        message = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+        self.loop.call_soon_threadsafe(lambda: [client.put_nowait(message) for client in self._clients])
+
+
+class PreviewServer:
+    """
+    Parameters:
+        directory (Path): Folder served, the project folder by default.
+        font_path (Path): Font the /shape requests use, the current content-hashed copy of it
+            when the manifest of its folder lists one.
+        broadcaster (EventBroadcaster): Where the /events streams take their events from.
+        cache_size (int): Shaped runs kept in memory. (see shapecache.ShapeCache)
+    """
+
+    def __init__(self, directory: Path = project_dir, font_path: Optional[Path] = None,
+                 broadcaster: Optional[EventBroadcaster] = None, cache_size: int = MEMORY_SIZE):
+        self.directory = Path(directory).resolve()
+        self.font_path = Path(font_path) if font_path else project_dir / DEFAULT_FONT
+        self.output_dir = self.font_path.parent.resolve()  # Served along with the page
+        self.broadcaster = broadcaster or EventBroadcaster()
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(max_workers=1)  # Shaping, one batch at a time
+        self._font: Tuple[Optional[tuple], str, Path] = (None, "", self.font_path)  # (stat it was read at, hash, path)
+        self._renderers: Dict[str, Tuple[Shaper, SVGRenderer, ShapeCache]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # FONT ======================================
+
+    def current_font(self) -> Tuple[str, Path]:
+        """Hash and path of the font /shape uses, read again whenever the manifest (or the font) changes."""
+        manifest = manifest_path(self.font_path)
+        watched = manifest if manifest.is_file() else self.font_path
+        try: stat = os.stat(watched)
+        except FileNotFoundError: raise HTTPError(404, f"No font at {self.font_path}, build it first")
+        key = (str(watched), stat.st_mtime_ns, stat.st_size)
+        if self._font[0] != key:
+            font = read_manifest(self.font_path.parent)["fonts"].get(self.font_path.stem)
+            kind = self.font_path.suffix.lstrip(".").lower()
+            if font and kind in font["files"]: self._font = (key, font["hash"], self.font_path.parent / font["files"][kind])
+            else: self._font = (key, hash_file(self.font_path)[:12], self.font_path)
+        return self._font[1], self._font[2]
+
+    def _renderers_for(self, digest: str, path: Path) -> Tuple[Shaper, SVGRenderer, ShapeCache]:
+        if digest not in self._renderers:
+            for _, _, cache in self._renderers.values(): cache.close()  # Older fonts are not asked for anymore
+            shaper = Shaper.from_font(path)
+            self._renderers = {digest: (shaper, SVGRenderer.from_font(path), ShapeCache.for_shaper(shaper, memory_size=self.cache_size))}
+        return self._renderers[digest]
+
+    def _shape_batch(self, digest: str, path: Path, texts: List[str], kind: str) -> List[dict]:
+        shaper, renderer, cache = self._renderers_for(digest, path)
+        results = []
+        for text, glyphs in zip(texts, cache.shape_many(shaper, texts)):
+            result = {"text": text, "width": sum(glyph.x_advance for glyph in glyphs)}
+            if kind == SVG: result[SVG] = renderer.render_run(glyphs)
+            else: result[GLYPHS] = [list(glyph) for glyph in glyphs]
+            results.append(result)
+        return results
+
+    async def shape(self, texts: List[str], kind: str = GLYPHS) -> dict:
+        """Results of a /shape request, worked out off the event loop."""
+        digest, path = self.current_font()
+        results = await asyncio.get_running_loop().run_in_executor(self._executor, self._shape_batch, digest, path, texts, kind)
+        return {"font": digest, "results": results}
+
+    # HTTP ======================================
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, headers: Dict[str, str], body: bytes = b"") -> None:
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Date: {formatdate(usegmt=True)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, value, head: bool = False) -> None:
+        body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json; charset=utf-8", "Content-Length": str(len(body)), "Cache-Control": "no-store"}
+        await self._send(writer, status, headers, b"" if head else body)
+
+    def _resolve(self, target: str) -> Path:
+        """The page or a file of the output folder, 404 for anything else. (hidden files included)"""
+        relative = unquote(urlsplit(target).path).lstrip("/") or PAGE
+        if any(part.startswith(".") for part in re.split(r"[/\\]", relative)): raise HTTPError(404, "Not found")
+        path = (self.directory / relative).resolve()
+        if path.is_dir(): path = path / PAGE
+        if path != self.directory / PAGE and self.output_dir not in path.parents: raise HTTPError(404, "Not found")
+        if not path.is_file(): raise HTTPError(404, "Not found")
+        return path
+
+    async def _send_file(self, writer: asyncio.StreamWriter, target: str, headers: Dict[str, str], head: bool) -> None:
+        path = self._resolve(target)
+        stat = path.stat()
+        immutable = is_hashed(path.name)
+        etag = f'"{path.name.split(".")[-2]}"' if immutable else f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        response = {
+            "ETag": etag,
+            "Cache-Control": "public, max-age=31536000, immutable" if immutable else "no-cache",
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        }
+        if etag in (tag.strip() for tag in headers.get("if-none-match", "").split(",")):
+            await self._send(writer, 304, response)
+            return
+        response["Content-Type"] = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        response["Content-Length"] = str(stat.st_size)
+        await self._send(writer, 200, response)
+        if head or not stat.st_size: return
+        with open(path, 'rb') as f:
+            await asyncio.get_running_loop().sendfile(writer.transport, f, 0, stat.st_size)  # Falls back to reads where sendfile is not available
+
+    async def _stream_events(self, writer: asyncio.StreamWriter) -> None:
+        await self._send(writer, 200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache", "Connection": "keep-alive"})
+        client = self.broadcaster.subscribe()
+        try:
+            while True:
+                try: message = await asyncio.wait_for(client.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError: message = b": keepalive\n\n"
+                writer.write(message)
+                await writer.drain()
+        finally:
+            self.broadcaster.unsubscribe(client)
+
+    async def _respond(self, writer: asyncio.StreamWriter, method: str, target: str, headers: Dict[str, str], body: bytes) -> None:
+        path = urlsplit(target).path
+        if path == "/events" and method == "GET":
+            await self._stream_events(writer)
+        elif path == "/shape":
+            if method != "POST": raise HTTPError(405, "POST a json body to /shape")
+            try: request = json.loads(body)
+            except ValueError: raise HTTPError(400, "The body is not json")
+            texts, kind = request.get("texts"), request.get("format", GLYPHS)
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts): raise HTTPError(400, "texts must be a list of strings")
+            if len(texts) > MAX_BATCH: raise HTTPError(413, f"At most {MAX_BATCH} texts per request")
+            if kind not in FORMATS: raise HTTPError(400, f"format must be one of {', '.join(FORMATS)}")
+            await self._send_json(writer, 200, await self.shape(texts, kind))
+        elif method in ("GET", "HEAD"):
+            await self._send_file(writer, target, headers, head=method == "HEAD")
+        else:
+            raise HTTPError(405, f"{method} is not supported")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer the requests of a connection, kept alive until the client closes it."""
+        try:
+            while True:
+                try: head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError): break
+                request_line, *lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                try: method, target, version = request_line.split(" ", 2)
+                except ValueError: break
+                headers = {name.strip().lower(): value.strip() for name, _, value in (line.partition(":") for line in lines)}
+                try: length = int(headers.get("content-length") or 0)
+                except ValueError: length = -1
+                if length < 0:
+                    await self._send_json(writer, 400, {"error": "Invalid Content-Length"})
+                    break  # Where the body ends is unknown, the connection cannot be reused
+                if length > MAX_BODY:
+                    await self._send_json(writer, 413, {"error": "Request body too large"})
+                    break
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    await self._respond(writer, method, target, headers, body)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, head=method == "HEAD")
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    await self._send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"}, head=method == "HEAD")
+                if version == "HTTP/1.0" or headers.get("connection", "").lower() == "close": break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # The page went away
+        finally:
+            writer.close()
+
+    # RUNNING ===================================
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> None:
+        self.broadcaster.loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self.handle, host, port)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000) -> None:
+        """Serve until cancelled."""
+        await self.start(host, port)
+        async with self._server: await self._server.serve_forever()
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 8000) -> asyncio.AbstractEventLoop:
+        """Serve from a daemon thread running its own event loop, once listening. (see watch.py)"""
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        failure: List[BaseException] = []
+
+        def run():
+            asyncio.set_event_loop(loop)
+            try: loop.run_until_complete(self.start(host, port))
+            except BaseException as e:
+                failure.append(e)
+                return
+            finally:
+                started.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        started.wait()
+        if failure: raise failure[0]
+        return loop
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1] if self._server else 0
+
+
+def serve(font_path: str = DEFAULT_FONT, host: str = "127.0.0.1", port: int = 8000) -> None:
+    """
+    Serve the preview page and shape text with the font at font_path, relative to the
+    project folder, until interrupted. (spetekkimyo watch also rebuilds the font)
+    """
+    server = PreviewServer(font_path=project_dir / font_path)
+    print(f"Preview at http://{host}:{port}/index.html")
+    try: asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt: pass
@@ -0,0 +1,213 @@
+"""
+Read and write the SFNT container of OpenType fonts : the table directory, table
+checksums and head.checkSumAdjustment.
+
+Every build also writes the font as WOFF 1.0 next to it (font.otf -> font.woff), the same
+tables each compressed with zlib, or stored as is where compressing does not make them
+smaller. read_tables reads both.
+"""
+
+import zlib
+import struct
+from pathlib import Path
+from typing import Dict, Optional, Tuple # type: ignore
+
+CFF_VERSION = b"OTTO"
+TRUETYPE_VERSION = b"\x00\x01\x00\x00"
+WOFF_SIGNATURE = b"wOFF"
+WOFF_SUFFIX = ".woff"
+WOFF_HEADER = ">4s4sIHHIHHIIIII"  # Up to privLength, 44 bytes
+WOFF_ENTRY = ">4sIIII"  # tag, offset, compLength, origLength, origChecksum
+# zlib strategies tried on every table, the smallest output wins
+ZLIB_STRATEGIES = (zlib.Z_DEFAULT_STRATEGY, zlib.Z_FILTERED)
+
+HEAD_CHECKSUM_OFFSET = 8  # checkSumAdjustment inside the head table
+CHECKSUM_MAGIC = 0xB1B0AFBA
+
+# Order recommended by the OpenType spec for CFF fonts, other tables follow by tag
+TABLE_ORDER = ["head", "hhea", "maxp", "OS/2", "name", "cmap", "post", "CFF "]
+
+
+class SFNTError(ValueError):
+    """The data is not an OpenType font this module can read."""
+
+
+def table_checksum(data: bytes) -> int:
+    if len(data) % 4: data += b"\0" * (4 - len(data) % 4)
+    return sum(struct.unpack(f">{len(data) // 4}I", data)) & 0xFFFFFFFF
+
+def read_tables(data: bytes) -> Tuple[bytes, Dict[str, bytes]]:
+    """
+    Split a font into its tables.
+
+    Returns:
+        sfnt_version (bytes): b"OTTO" for CFF fonts, the flavor of a WOFF file.
+        tables (dict): Table tag to table data, in file order.
+    """
+    if data[:4] == WOFF_SIGNATURE: return read_woff(data)
+    if len(data) < 12: raise SFNTError("File too short for an OpenType font")
+    sfnt_version = data[:4]
+    if sfnt_version not in (CFF_VERSION, TRUETYPE_VERSION, b"true"): raise SFNTError(f"Unknown sfnt version {sfnt_version!r}")
+    num_tables, = struct.unpack_from(">H", data, 4)
+    records = []
+    for i in range(num_tables):
+        tag, _, offset, length = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+        if offset + length > len(data): raise SFNTError(f"Table {tag.decode('latin-1')!r} runs past the end of the file")
+        records.append((offset, tag.decode("latin-1"), length))
+    return sfnt_version, {tag: data[offset:offset + length] for offset, tag, length in sorted(records)}
+
+def read_font(path) -> Tuple[bytes, Dict[str, bytes]]:
+    with open(path, 'rb') as f: return read_tables(f.read())
+
+def build_sfnt(tables: Dict[str, bytes], sfnt_version: bytes = CFF_VERSION) -> bytes:
+    """
+    Assemble tables into a font file, computing every checksum.
+    The head table's checkSumAdjustment is (re)computed, whatever it holds.
+    """
+    tags = sorted(tables, key=lambda tag: (TABLE_ORDER.index(tag) if tag in TABLE_ORDER else len(TABLE_ORDER), tag))
+    if "head" in tables:
+        head = tables["head"]
+        tables = {**tables, "head": head[:HEAD_CHECKSUM_OFFSET] + b"\0\0\0\0" + head[HEAD_CHECKSUM_OFFSET + 4:]}
+
+    num_tables = len(tags)
+    entry_selector = max(num_tables.bit_length() - 1, 0)
+    search_range = (1 << entry_selector) * 16
+    header = struct.pack(">4sHHHH", sfnt_version, num_tables, search_range, entry_selector, num_tables * 16 - search_range)
+
+    # The directory is sorted by tag, the data itself keeps the recommended order
+    directory = []
+    body = []
+    offset = 12 + 16 * num_tables
+    offsets = {}
+    for tag in tags:
+        data = tables[tag]
+        offsets[tag] = offset
+        padded = data + b"\0" * (-len(data) % 4)
+        body.append(padded)
+        offset += len(padded)
+    for tag in sorted(tags):
+        directory.append(struct.pack(">4sIII", tag.encode("latin-1"), table_checksum(tables[tag]), offsets[tag], len(tables[tag])))
+
+    font = bytearray(header + b"".join(directory) + b"".join(body))
+    if "head" in tables:
+        adjustment = (CHECKSUM_MAGIC - table_checksum(bytes(font))) & 0xFFFFFFFF
+        position = offsets["head"] + HEAD_CHECKSUM_OFFSET
+        font[position:position + 4] = struct.pack(">I", adjustment)
+    return bytes(font)
+
+def replace_tables(data: bytes, replacements: Dict[str, Optional[bytes]]) -> bytes:
+    """
+    Font data with some of its tables replaced, added or removed (replaced by None), every
+    checksum updated.
+
+    When every replaced table keeps its size, the new tables are written over the old ones
+    and only the directory entries and head.checkSumAdjustment change, the rest of the file
+    staying byte for byte. Otherwise the font is assembled again with build_sfnt.
+    """
+    sfnt_version, tables = read_tables(data)
+    num_tables, = struct.unpack_from(">H", data, 4)
+    records = {}
+    for i in range(num_tables):
+        tag, _, offset, length = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+        records[tag.decode("latin-1")] = (12 + 16 * i, offset, length)
+
+    if any(tag not in records or table is None or len(table) != records[tag][2] for tag, table in replacements.items()):
+        tables = {**tables, **replacements}
+        return build_sfnt({tag: table for tag, table in tables.items() if table is not None}, sfnt_version)
+
+    font = bytearray(data)
+    for tag, table in replacements.items():
+        record, offset, length = records[tag]
+        if tag == "head": table = table[:HEAD_CHECKSUM_OFFSET] + b"\0\0\0\0" + table[HEAD_CHECKSUM_OFFSET + 4:]
+        font[offset:offset + length] = table
+        font[record + 4:record + 8] = struct.pack(">I", table_checksum(table))
+    if "head" in records:
+        position = records["head"][1] + HEAD_CHECKSUM_OFFSET
+        font[position:position + 4] = b"\0\0\0\0"
+        font[position:position + 4] = struct.pack(">I", (CHECKSUM_MAGIC - table_checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
+
+
+
+# WOFF ==========================================
+
+def _compress(table: bytes) -> bytes:
+    """The smallest zlib stream of table over ZLIB_STRATEGIES, table itself if none is smaller."""
+    best = table
+    for strategy in ZLIB_STRATEGIES:
+        compressor = zlib.compressobj(zlib.Z_BEST_COMPRESSION, zlib.DEFLATED, zlib.MAX_WBITS, 9, strategy)
+        compressed = compressor.compress(table) + compressor.flush()
+        if len(compressed) < len(best): best = compressed
+    return best
+
+def build_woff(data: bytes) -> bytes:
+    """
+    WOFF 1.0 file of a font, its tables compressed one by one. The table checksums are the
+    ones of the font's directory, so the font comes out of the WOFF byte for byte.
+    """
+    sfnt_version, tables = read_tables(data)
+    num_tables, = struct.unpack_from(">H", data, 4)
+    checksums = {}
+    for i in range(num_tables):
+        tag, checksum, _, _ = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+        checksums[tag.decode("latin-1")] = checksum
+
+    # Table data keeps the order of the font, the directory is sorted by tag
+    offset = struct.calcsize(WOFF_HEADER) + struct.calcsize(WOFF_ENTRY) * len(tables)
+    entries = {}
+    body = []
+    for tag, table in tables.items():
+        compressed = _compress(table)
+        entries[tag] = struct.pack(WOFF_ENTRY, tag.encode("latin-1"), offset, len(compressed), len(table), checksums[tag])
+        padded = compressed + b"\0" * (-len(compressed) % 4)
+        body.append(padded)
+        offset += len(padded)
+
+    sfnt_size = 12 + 16 * len(tables) + sum(len(table) + -len(table) % 4 for table in tables.values())
+    major, minor = struct.unpack_from(">HH", tables["head"], 4) if "head" in tables else (0, 0)  # fontRevision
+    header = struct.pack(WOFF_HEADER, WOFF_SIGNATURE, sfnt_version, offset, len(tables), 0, sfnt_size, major, minor, 0, 0, 0, 0, 0)
+    return header + b"".join(entries[tag] for tag in sorted(entries)) + b"".join(body)
+
+def read_woff(data: bytes) -> Tuple[bytes, Dict[str, bytes]]:
+    """Split a WOFF 1.0 file into its tables, decompressed. (see read_tables)"""
+    if len(data) < struct.calcsize(WOFF_HEADER): raise SFNTError("File too short for a WOFF font")
+    _, flavor, length, num_tables, *_ = struct.unpack_from(WOFF_HEADER, data)
+    if length != len(data): raise SFNTError(f"WOFF length {length} does not match the file size {len(data)}")
+    records = []
+    for i in range(num_tables):
+        tag, offset, compressed_length, length, _ = struct.unpack_from(WOFF_ENTRY, data, struct.calcsize(WOFF_HEADER) + struct.calcsize(WOFF_ENTRY) * i)
+        if offset + compressed_length > len(data): raise SFNTError(f"Table {tag.decode('latin-1')!r} runs past the end of the file")
+        records.append((offset, tag.decode("latin-1"), compressed_length, length))
+    tables = {}
+    for offset, tag, compressed_length, length in sorted(records):
+        table = data[offset:offset + compressed_length]
+        if compressed_length < length:
+            try: table = zlib.decompress(table)
+            except zlib.error as e: raise SFNTError(f"Table {tag!r} cannot be decompressed: {e}")
+        if len(table) != length: raise SFNTError(f"Table {tag!r} is {len(table)} bytes instead of {length}")
+        tables[tag] = table
+    return flavor, tables
+
+def woff_path(font_path) -> Optional[Path]:
+    """Where the WOFF of a font goes, None if font_path is a WOFF file already."""
+    font_path = Path(font_path)
+    return None if font_path.suffix.lower() == WOFF_SUFFIX else font_path.with_suffix(WOFF_SUFFIX)
+
+def write_woff(font_path, data: Optional[bytes] = None) -> Optional[Path]:
+    """
+    Write the WOFF of the font at font_path next to it. (see woff_path)
+
+    Parameters:
+        data (bytes): Content of the font, read from font_path if not given.
+
+    Returns:
+        Path: The WOFF file written, None if there was none to write.
+    """
+    path = woff_path(font_path)
+    if path is None: return None
+    if data is None:
+        with open(font_path, 'rb') as f: data = f.read()
+    tmp_path = Path(str(path) + '.tmp')
+    with open(tmp_path, 'wb') as f: f.write(build_woff(data))
+    tmp_path.replace(path)
+    return path
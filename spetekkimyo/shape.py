@@ -0,0 +1,418 @@
+"""
+Offline shaper : apply the GSUB and GPOS lookups of the font to a string, the way a
+browser's OpenType engine (HarfBuzz) does for the subset of lookups Seiso uses, so the
+result of features.fea can be checked without building a page and opening it.
+
+The lookups come either from a built font (Shaper.from_font) or straight from the feature
+file and the glyph sources (Shaper.from_features), which needs no build at all.
+
+Behaviour follows HarfBuzz's default shaper :
+    - lookups of the enabled features run in LookupList order, left to right
+    - glyphs the lookup flag ignores (IgnoreMarks against the GDEF classes...) are skipped
+      when matching, and left in place
+    - after a chained rule, shaping resumes after its input sequence
+    - marks (GDEF class 3) get a zero advance once GPOS is applied
+
+Chained rules are compiled (see ChainMatcher) so that adding rules does not slow shaping down.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple # type: ignore
+
+from . import config
+from .cache import BuildCache, collect_inputs, hash_bytes, hash_json
+from .cff import read_glyph_names
+from .fea import parse_feature_file
+from .glyphs import load_glyphs
+from .layout import (
+    BASE_GLYPH, CHAIN_SUB, ChainRule, GPOS, GSUB, IGNORE_BASE_GLYPHS, IGNORE_LIGATURES, IGNORE_MARKS, LIGATURE_GLYPH,
+    LIGATURE_SUB, MARK_GLYPH, MULTIPLE_SUB, PAIR_POS, SINGLE_POS, SINGLE_SUB, Layout, Lookup, UnsupportedLookup,
+)
+from .otf import NOTDEF, character_map, outline_glyphs, read_advances, read_cmap
+from .otl import read_layout
+from .publish import HASH_LENGTH
+from .sfnt import read_tables
+
+# Features HarfBuzz applies by default to horizontal text, whatever the script
+DEFAULT_FEATURES = ("abvm", "blwm", "calt", "ccmp", "clig", "curs", "dist", "kern", "liga", "locl", "mark", "mkmk", "rclt", "rlig", "rvrn")
+
+
+class ShapedGlyph(NamedTuple):
+    name: str
+    cluster: int  # Index of the first character the glyph comes from
+    x_advance: int
+    y_advance: int
+    x_offset: int  # Placement, moves the glyph without moving the next ones
+    y_offset: int
+
+
+class _Automaton:
+    """
+    Deterministic automaton matching the glyph sequences of some rules together, one glyph
+    per step, whatever the number of rules. It is built as it is walked : a state is the
+    depth reached, the rules still matching there and the rules already matched, each
+    (state, glyph) transition is worked out once and then looked up.
+
+    Parameters:
+        sequences (list): Glyph sets to match, in walking order, of every rule.
+    """
+
+    def __init__(self, sequences: List[List[FrozenSet[str]]]):
+        self.sequences = sequences
+        self._states: Dict[Tuple[int, Tuple[int, ...], Tuple[int, ...]], int] = {}
+        self._depths: List[int] = []
+        self._pending: List[Tuple[int, ...]] = []  # Rules needing more glyphs
+        self.accepted: List[Tuple[int, ...]] = []  # Rules whose whole sequence matched, by state
+        self._transitions: List[Dict[str, int]] = []
+
+    def start(self, rules: Tuple[int, ...]) -> int:
+        """State before any glyph is read, for matching rules."""
+        return self._state(0, rules, ())
+
+    def _state(self, depth: int, rules: Tuple[int, ...], accepted: Tuple[int, ...]) -> int:
+        key = (depth, rules, accepted)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = len(self._depths)
+            self._depths.append(depth)
+            self._pending.append(tuple(rule for rule in rules if len(self.sequences[rule]) > depth))
+            self.accepted.append(tuple(sorted(accepted + tuple(rule for rule in rules if len(self.sequences[rule]) == depth))))
+            self._transitions.append({})
+        return state
+
+    def walk(self, state: int, glyphs: List[str], position: int, step: int, skipped: FrozenSet[str]) -> int:
+        """
+        Read the glyphs from position + step onwards, going right (step 1) or left (step -1)
+        and passing over the skipped glyphs, until no rule needs more of them.
+
+        Returns:
+            int: The last state, its accepted rules are the ones that matched.
+        """
+        pending = self._pending
+        transitions = self._transitions
+        count = len(glyphs)
+        index = position
+        while pending[state]:
+            index += step
+            while 0 <= index < count and glyphs[index] in skipped: index += step
+            if not 0 <= index < count: break
+            glyph = glyphs[index]
+            following = transitions[state].get(glyph)
+            if following is None:
+                depth = self._depths[state]
+                alive = tuple(rule for rule in pending[state] if glyph in self.sequences[rule][depth])
+                following = transitions[state][glyph] = self._state(depth + 1, alive, self.accepted[state])
+            state = following
+        return state
+
+
+class ChainMatcher:
+    """
+    The chained rules of a lookup compiled for matching : the rules starting with a glyph
+    come from a dispatch index, then one automaton checks the rest of their input and their
+    lookahead and another one their backtrack. Matching takes a step per glyph of context
+    instead of a try per rule, so shaping stays linear in the length of the text as the
+    rules multiply.
+
+    Parameters:
+        rules (list): ChainRules in lookup order, the first one matching wins.
+    """
+
+    def __init__(self, rules: List[ChainRule]):
+        self.rules = rules
+        dispatch: Dict[str, List[int]] = {}
+        for index, rule in enumerate(rules):
+            for glyph in rule.input[0]: dispatch.setdefault(glyph, []).append(index)
+        self._forward = _Automaton([rule.input[1:] + rule.lookahead for rule in rules])
+        self._backward = _Automaton([rule.backtrack[::-1] for rule in rules])
+        # First glyph to the forward automaton's start state for the rules starting with it
+        self.dispatch: Dict[str, int] = {glyph: self._forward.start(tuple(indices)) for glyph, indices in dispatch.items()}
+        self._backward_starts: Dict[int, int] = {}  # Last forward state to the backward start state
+
+    def match(self, glyphs: List[str], position: int, skipped: FrozenSet[str]) -> Optional[Tuple[ChainRule, List[int]]]:
+        """The first rule matching at position and the positions of its input glyphs, None if no rule matches."""
+        state = self.dispatch.get(glyphs[position])
+        if state is None: return None
+        state = self._forward.walk(state, glyphs, position, 1, skipped)
+        if not self._forward.accepted[state]: return None
+        start = self._backward_starts.get(state)
+        if start is None: start = self._backward_starts[state] = self._backward.start(self._forward.accepted[state])
+        state = self._backward.walk(start, glyphs, position, -1, skipped)
+        if not self._backward.accepted[state]: return None
+        rule = self.rules[self._backward.accepted[state][0]]
+
+        positions = [position]
+        index = position
+        while len(positions) < len(rule.input):
+            index += 1
+            if glyphs[index] not in skipped: positions.append(index)
+        return rule, positions
+
+
+class Shaper:
+    """
+    Shape strings with a font's layout.
+
+    Parameters:
+        layout (Layout): The lookups to apply and the GDEF glyph classes.
+        advances (dict): Glyph name to advance width.
+        cmap (dict): Codepoint to glyph name.
+        features (Iterable[str]): Features to apply, when the font has them.
+        script (str), language (str): Language system to take the features of, falling back to
+            the script's default language, then to DFLT.
+    """
+
+    def __init__(self, layout: Layout, advances: Dict[str, int], cmap: Dict[int, str],
+                 features: Iterable[str] = DEFAULT_FEATURES, script: str = "latn", language: str = "dflt"):
+        self.layout = layout
+        self.advances = advances
+        self.cmap = cmap
+        self.features = tuple(features)
+        self.script = script
+        self.language = language
+        self.font_hash: Optional[str] = None  # Set by from_font and from_features, the key of the shaping cache (see shapecache.py)
+        self.marks = frozenset(glyph for glyph, glyph_class in layout.glyph_classes.items() if glyph_class == MARK_GLYPH)
+
+        systems = [(script, language), (script, "dflt"), ("DFLT", "dflt"), ("dflt", "dflt")]
+        self.lookups: Dict[str, List[Lookup]] = {}
+        for table in (GSUB, GPOS):
+            order = {id(lookup): index for index, lookup in enumerate(layout.table_lookups(table))}
+            selected = {}
+            for tag in self.features:
+                languages = layout.features.get((table, tag), {})
+                system = next((system for system in systems if system in languages), None)
+                if system is not None: selected.update((id(lookup), lookup) for lookup in languages[system])
+            self.lookups[table] = sorted(selected.values(), key=lambda lookup: order[id(lookup)])
+
+        self._skipped: Dict[int, FrozenSet[str]] = {}
+        self._ligatures: Dict[int, Dict[str, List[Tuple[Tuple[str, ...], str]]]] = {}
+        self._coverages: Dict[int, FrozenSet[str]] = {}
+        self._matchers: Dict[int, ChainMatcher] = {}
+
+        # (lookup, coverage, skipped glyphs) of every lookup to apply, worked out once
+        self._plans = {
+            table: [(lookup, self.coverage(lookup), self.skipped(lookup.flag)) for lookup in lookups]
+            for table, lookups in self.lookups.items()
+        }
+
+    # CONSTRUCTION ==============================
+
+    @classmethod
+    def from_font(cls, path, **options) -> "Shaper":
+        """Shaper for a built font file (.otf)."""
+        with open(path, 'rb') as f: data = f.read()
+        _, tables = read_tables(data)
+        names = read_glyph_names(tables["CFF "])
+        advances = read_advances(tables["hhea"], tables["hmtx"], len(names))
+        cmap = {codepoint: names[glyph_id] for codepoint, glyph_id in read_cmap(tables["cmap"]).items()}
+        shaper = cls(read_layout(tables, names), dict(zip(names, advances)), cmap, **options)
+        shaper.font_hash = hash_bytes(data)[:HASH_LENGTH]  # The name publish.py gives the font
+        return shaper
+
+    @classmethod
+    def from_features(cls, feature_path: Optional[Path] = None, use_cache: bool = True, **options) -> "Shaper":
+        """
+        Shaper for the font the inputs would build, without building it. Glyph advances come
+        from the glyph sources through the build cache.
+        """
+        cache = BuildCache()
+        feature_path = feature_path or config.feature_path
+        sources, inputs = collect_inputs(config.glyph_dir, config.padding_path, feature_path)
+        entries, _ = load_glyphs(sources, cache, use_cache)
+        with open(config.padding_path, 'r') as f: padding = json.load(f)
+        glyphs = outline_glyphs(entries, padding)
+        layout = parse_feature_file(feature_path, [glyph.name for glyph in glyphs]).merge_lookups()
+        cmap = character_map(glyph.name for glyph in glyphs)
+        shaper = cls(layout, {glyph.name: glyph.width for glyph in glyphs}, cmap, **options)
+        shaper.font_hash = "inputs-" + hash_json(inputs)[:HASH_LENGTH]  # No font, what it would be built from
+        return shaper
+
+    # HELPERS ===================================
+
+    def skipped(self, flag: int) -> FrozenSet[str]:
+        """Glyphs a lookup with this flag does not see."""
+        if flag not in self._skipped:
+            ignored = set()
+            if flag & IGNORE_BASE_GLYPHS: ignored.add(BASE_GLYPH)
+            if flag & IGNORE_LIGATURES: ignored.add(LIGATURE_GLYPH)
+            if flag & IGNORE_MARKS: ignored.add(MARK_GLYPH)
+            self._skipped[flag] = frozenset(glyph for glyph, glyph_class in self.layout.glyph_classes.items() if glyph_class in ignored)
+        return self._skipped[flag]
+
+    def ligatures(self, lookup: Lookup) -> Dict[str, List[Tuple[Tuple[str, ...], str]]]:
+        """Ligatures of a lookup by first component, longest first."""
+        if id(lookup) not in self._ligatures:
+            by_first: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+            for components, ligature in lookup.mapping.items(): by_first.setdefault(components[0], []).append((components, ligature))
+            for candidates in by_first.values(): candidates.sort(key=lambda candidate: -len(candidate[0]))
+            self._ligatures[id(lookup)] = by_first
+        return self._ligatures[id(lookup)]
+
+    def coverage(self, lookup: Lookup) -> FrozenSet[str]:
+        """Glyphs the lookup can apply at, the others are passed over without trying its rules."""
+        if id(lookup) not in self._coverages:
+            if lookup.type == CHAIN_SUB and lookup.table == GSUB:
+                glyphs = frozenset().union(*(rule.input[0] for rule in lookup.rules))
+            elif (lookup.table, lookup.type) in ((GSUB, LIGATURE_SUB), (GPOS, PAIR_POS)):
+                glyphs = frozenset(key[0] for key in lookup.mapping)
+            else:
+                glyphs = frozenset(lookup.mapping)
+            self._coverages[id(lookup)] = glyphs
+        return self._coverages[id(lookup)]
+
+    def matcher(self, lookup: Lookup) -> "ChainMatcher":
+        """The chained rules of a lookup compiled for matching."""
+        if id(lookup) not in self._matchers: self._matchers[id(lookup)] = ChainMatcher(lookup.rules)
+        return self._matchers[id(lookup)]
+
+    # SUBSTITUTION ==============================
+
+    def _substitute(self, lookup: Lookup, glyphs: List[str], clusters: List[int], position: int) -> Optional[int]:
+        """
+        Apply lookup once at position.
+
+        Returns:
+            int: Where to continue, None if the lookup did not apply.
+        """
+        glyph = glyphs[position]
+        kind = lookup.type
+
+        if kind == SINGLE_SUB:
+            replacement = lookup.mapping.get(glyph)
+            if replacement is None: return None
+            glyphs[position] = replacement
+            return position + 1
+
+        if kind == MULTIPLE_SUB:
+            sequence = lookup.mapping.get(glyph)
+            if sequence is None: return None
+            glyphs[position:position + 1] = sequence
+            clusters[position:position + 1] = [clusters[position]] * len(sequence)
+            return position + len(sequence)
+
+        if kind == LIGATURE_SUB:
+            candidates = self.ligatures(lookup).get(glyph)
+            if not candidates: return None
+            skipped = self.skipped(lookup.flag)
+            count = len(glyphs)
+            for components, ligature in candidates:
+                positions = [position]
+                index = position
+                for component in components[1:]:
+                    index += 1
+                    while index < count and glyphs[index] in skipped: index += 1
+                    if index >= count or glyphs[index] != component: break
+                    positions.append(index)
+                else:
+                    glyphs[position] = ligature
+                    _merge_clusters(clusters, position, positions[-1] + 1)
+                    for index in reversed(positions[1:]):  # Skipped marks stay, after the ligature
+                        del glyphs[index]
+                        del clusters[index]
+                    return position + 1
+            return None
+
+        if kind == CHAIN_SUB:
+            match = self.matcher(lookup).match(glyphs, position, self.skipped(lookup.flag))
+            if match is not None:
+                rule, positions = match
+                end = positions[-1] + 1
+                for sequence_index, action in rule.actions:
+                    if sequence_index >= len(positions): continue
+                    target = positions[sequence_index]
+                    if glyphs[target] in self.skipped(action.flag): continue
+                    before = len(glyphs)
+                    self._substitute(action, glyphs, clusters, target)
+                    delta = len(glyphs) - before
+                    if delta:
+                        end += delta
+                        # Later input positions move with the glyphs, the ones a ligature consumed are gone
+                        positions = positions[:sequence_index + 1] + [index + delta for index in positions[sequence_index + 1:] if index + delta > target]
+                return end
+            return None
+
+        raise UnsupportedLookup(lookup, "apply")
+
+    # POSITIONING ===============================
+
+    def _position(self, lookup: Lookup, glyphs: List[str], positions: List[List[int]], position: int) -> Optional[int]:
+        glyph = glyphs[position]
+
+        if lookup.type == SINGLE_POS:
+            value = lookup.mapping.get(glyph)
+            if value is None: return None
+            _adjust(positions[position], value)
+            return position + 1
+
+        if lookup.type == PAIR_POS:
+            skipped = self.skipped(lookup.flag)
+            index = position + 1
+            while index < len(glyphs) and glyphs[index] in skipped: index += 1
+            if index >= len(glyphs): return None
+            value = lookup.mapping.get((glyph, glyphs[index]))
+            if value is None: return None
+            _adjust(positions[position], value)
+            return index
+
+        raise UnsupportedLookup(lookup, "apply")
+
+    # SHAPING ===================================
+
+    def glyphs(self, text: str) -> List[str]:
+        """Glyph names of the characters of text, before any lookup."""
+        return [self.cmap.get(ord(character), NOTDEF) for character in text]
+
+    def shape(self, text: str) -> List[ShapedGlyph]:
+        glyphs = self.glyphs(text)
+        clusters = list(range(len(text)))
+
+        for lookup, coverage, skipped in self._plans[GSUB]:
+            if coverage.isdisjoint(glyphs): continue
+            if lookup.type == SINGLE_SUB:  # Every covered glyph is replaced in place, no need to walk
+                mapping = lookup.mapping
+                glyphs = [mapping[glyph] if glyph in coverage and glyph not in skipped else glyph for glyph in glyphs]
+                continue
+            position = 0
+            while position < len(glyphs):
+                if glyphs[position] in coverage and glyphs[position] not in skipped:
+                    following = self._substitute(lookup, glyphs, clusters, position)
+                    if following is not None:
+                        position = following
+                        continue
+                position += 1
+
+        # x advance, y advance, x offset, y offset
+        positions = [[self.advances.get(glyph, 0), 0, 0, 0] for glyph in glyphs]
+        for lookup, coverage, skipped in self._plans[GPOS]:
+            if coverage.isdisjoint(glyphs): continue
+            position = 0
+            while position < len(glyphs):
+                if glyphs[position] in coverage and glyphs[position] not in skipped:
+                    following = self._position(lookup, glyphs, positions, position)
+                    if following is not None:
+                        position = following
+                        continue
+                position += 1
+
+        for glyph, glyph_position in zip(glyphs, positions):
+            if glyph in self.marks: glyph_position[0] = glyph_position[1] = 0
+
+        return [
+            ShapedGlyph(glyph, cluster, x_advance, y_advance, x_offset, y_offset)
+            for glyph, cluster, (x_advance, y_advance, x_offset, y_offset) in zip(glyphs, clusters, positions)
+        ]
+
+
+def _merge_clusters(clusters: List[int], start: int, end: int) -> None:
+    """Give clusters[start:end] a single value, widened to the whole clusters at both ends. (like HarfBuzz)"""
+    cluster = min(clusters[start:end])
+    while end < len(clusters) and clusters[end] == clusters[end - 1]: end += 1
+    while start > 0 and clusters[start - 1] == clusters[start]: start -= 1
+    clusters[start:end] = [cluster] * (end - start)
+
+def _adjust(glyph_position: List[int], value) -> None:
+    glyph_position[2] += value.x_placement
+    glyph_position[3] += value.y_placement
+    glyph_position[0] += value.x_advance
+    glyph_position[1] += value.y_advance
@@ -0,0 +1,416 @@
+"""
+Shaping cache : the shaped runs of strings, kept in memory and on disk, so that a word
+shaped once by the shape command, the preview server or the regression suite is not
+shaped again by any of them as long as the font stays the same.
+
+Keys are (font hash, features, text), the features being the feature set, script and
+language of the shaper. Every font hash is a generation of its own, a folder under
+.cache/shaping/<font hash> : a new font never sees the runs of the previous one, and only
+the KEPT_GENERATIONS generations used last are kept on disk.
+
+Lookups go through two tiers :
+    memory  an LRU of the runs used last, per ShapeCache
+    disk    the generation's folder, shared by every process shaping with that font :
+        runs.log              append-only records, key length and value length (u32), then
+                              the key and the value (the run as compact json)
+        runs.<capacity>.idx   open addressing hash table, memory-mapped : a header, then
+                              per slot the 64 bits hash of a key and 1 + the offset of its
+                              record in the log (0 for an empty slot)
+
+Writers append to the log and fill the index under a lock on runs.lock, readers probe the
+mapped index and read the records from the mapped log under a shared one (exclusive on
+Windows). Both take the lock once for a whole batch of keys. The index header
+records how much of the log it covers, what a crash left unindexed is indexed on the next
+write. An index about to be too full is copied into a larger one and marked superseded,
+which tells the other processes to switch.
+"""
+
+import os
+import json
+import mmap
+import shutil
+import struct
+import hashlib
+import threading
+import contextlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple # type: ignore
+
+from . import cache
+from .shape import DEFAULT_FEATURES, ShapedGlyph, Shaper
+
+SHAPE_CACHE_VERSION = 1  # Bump when the shaper or the record layout changes, older generations are dropped
+SHAPING_FOLDER = 'shaping'  # Under the build cache folder
+MEMORY_SIZE = 20000  # Runs kept in memory per ShapeCache
+KEPT_GENERATIONS = 4
+INITIAL_CAPACITY = 1 << 12  # Slots of a new index, always a power of two
+MAX_LOAD = 0.6  # Share of the slots used past which the index grows
+
+MAGIC = b"SPSC"
+HEADER = struct.Struct("<4sHHQQQ")  # magic, version, superseded, capacity, count, covered (log bytes indexed)
+SLOT = struct.Struct("<QQ")  # key hash, 1 + record offset
+RECORD = struct.Struct("<II")  # key length, value length
+
+Run = Tuple[ShapedGlyph, ...]
+
+
+class LRUCache:
+    """The maxsize most recently used entries of a mapping."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        if key not in self._entries: return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize: self._entries.popitem(last=False)
+
+
+def _key_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+ENCODED_GLYPHS = 1 << 16  # Encoded glyphs remembered, a font only positions its glyphs in so many ways
+_encoded_glyphs: Dict[ShapedGlyph, str] = {}
+
+def encode_run(glyphs: Iterable[ShapedGlyph]) -> bytes:
+    """The run as compact json, glyph by glyph : json.dumps of the whole run costs as much as shaping it."""
+    parts = []
+    for glyph in glyphs:
+        part = _encoded_glyphs.get(glyph)
+        if part is None:
+            if len(_encoded_glyphs) >= ENCODED_GLYPHS: _encoded_glyphs.clear()
+            part = _encoded_glyphs[glyph] = json.dumps(list(glyph), ensure_ascii=False, separators=(",", ":"))
+        parts.append(part)
+    return ("[" + ",".join(parts) + "]").encode()
+
+def decode_run(data: bytes) -> Run:
+    return tuple(map(ShapedGlyph._make, json.loads(data)))
+
+
+# DISK ==========================================
+
+class RunLog:
+    """
+    The on-disk tier of a generation : values by key, in an append-only log indexed by a
+    memory-mapped hash table. (see the module docstring)
+
+    Parameters:
+        directory (Path): Folder of the generation, created if needed.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._thread_lock = threading.RLock()  # The file lock does not exclude the threads of a process
+        self._lock_file = open(self.directory / 'runs.lock', 'a+b')
+        self._log = open(self.directory / 'runs.log', 'a+b', buffering=0)  # Appends always go to the end
+        self._index_file = None
+        self._index: Optional[mmap.mmap] = None
+        self._capacity = 0
+        self._log_map: Optional[mmap.mmap] = None
+        with self._locked(): self._open_index()
+
+    @contextlib.contextmanager
+    def _locked(self, shared: bool = False):
+        with self._thread_lock:
+            if os.name == "nt":  # No shared locks there
+                import msvcrt
+                self._lock_file.seek(0)
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try: yield
+                finally:
+                    self._lock_file.seek(0)
+                    msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try: yield
+                finally: fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    # INDEX =====================================
+
+    def _index_path(self, capacity: int) -> Path:
+        return self.directory / f'runs.{capacity}.idx'
+
+    def _map(self, path: Path) -> None:
+        self._unmap()
+        self._index_file = open(path, 'r+b')
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+        self._capacity = self._header()[3]  # Fixed for an index, a larger one is another file
+
+    def _unmap(self) -> None:
+        if self._index is not None: self._index.close()
+        if self._index_file is not None: self._index_file.close()
+        self._index, self._index_file = None, None
+
+    def _header(self) -> Tuple[bytes, int, int, int, int, int]:
+        return HEADER.unpack_from(self._index, 0)
+
+    def _create_index(self, capacity: int, count: int = 0, covered: int = 0) -> Path:
+        path = self._index_path(capacity)
+        with open(path, 'wb') as f:
+            f.truncate(HEADER.size + SLOT.size * capacity)
+            f.write(HEADER.pack(MAGIC, SHAPE_CACHE_VERSION, 0, capacity, count, covered))
+        return path
+
+    def _open_index(self) -> None:
+        """Map the current index, creating it (and dropping a log of another version) if there is none. Under the lock."""
+        candidates = []
+        for path in self.directory.glob('runs.*.idx'):
+            try:
+                with open(path, 'rb') as f: magic, version, superseded, capacity, _, _ = HEADER.unpack(f.read(HEADER.size))
+            except (OSError, struct.error):
+                continue
+            if magic == MAGIC and version == SHAPE_CACHE_VERSION and not superseded: candidates.append((capacity, path))
+        if candidates:
+            path = max(candidates)[1]
+        else:
+            self._truncate_log(0)  # Nothing indexes it, or it is of another version
+            path = self._create_index(INITIAL_CAPACITY)
+        self._map(path)
+        for other in self.directory.glob('runs.*.idx'):
+            if other != path:
+                try: other.unlink()
+                except OSError: pass  # Still mapped by another process, removed by a later open
+
+    def _superseded(self) -> bool:
+        return self._header()[2] != 0
+
+    def _probe(self, key: bytes, key_hash: int) -> Tuple[int, Optional[bytes]]:
+        """Slot of key (or the empty slot where it would go) and its value, None if absent."""
+        capacity = self._capacity
+        slot = key_hash & (capacity - 1)
+        while True:
+            stored_hash, where = SLOT.unpack_from(self._index, HEADER.size + SLOT.size * slot)
+            if where == 0: return slot, None
+            if stored_hash == key_hash:
+                stored_key, value = self._read_record(where - 1)
+                if stored_key == key: return slot, value
+            slot = (slot + 1) & (capacity - 1)
+
+    def _read_record(self, offset: int) -> Tuple[bytes, bytes]:
+        if self._log_map is None or offset + RECORD.size > len(self._log_map): self._map_log()
+        key_length, value_length = RECORD.unpack_from(self._log_map, offset)
+        start = offset + RECORD.size
+        if start + key_length + value_length > len(self._log_map): self._map_log()
+        return self._log_map[start:start + key_length], self._log_map[start + key_length:start + key_length + value_length]
+
+    def _map_log(self) -> None:
+        """Map the log as it is now, records appended later are mapped when first read."""
+        self._unmap_log()
+        size = os.fstat(self._log.fileno()).st_size
+        self._log_map = mmap.mmap(self._log.fileno(), size, access=mmap.ACCESS_READ) if size else None
+
+    def _unmap_log(self) -> None:
+        if self._log_map is not None: self._log_map.close()
+        self._log_map = None
+
+    def _truncate_log(self, size: int) -> None:
+        self._unmap_log()  # A mapped file cannot be truncated on Windows
+        self._log.truncate(size)
+
+    def _insert(self, key: bytes, offset: int) -> bool:
+        """Index the record of key at offset, False if key is indexed already."""
+        key_hash = _key_hash(key)
+        slot, value = self._probe(key, key_hash)
+        if value is not None: return False
+        SLOT.pack_into(self._index, HEADER.size + SLOT.size * slot, key_hash, offset + 1)
+        return True
+
+    def _place(self, slot: int, key_hash: int, offset: int) -> None:
+        """Index a record at slot, or the next empty one when a key of the same batch took it."""
+        capacity = self._capacity
+        while SLOT.unpack_from(self._index, HEADER.size + SLOT.size * slot)[1]: slot = (slot + 1) & (capacity - 1)
+        SLOT.pack_into(self._index, HEADER.size + SLOT.size * slot, key_hash, offset + 1)
+
+    def _set_counts(self, count: int, covered: int) -> None:
+        magic, version, superseded, capacity, _, _ = self._header()
+        HEADER.pack_into(self._index, 0, magic, version, superseded, capacity, count, covered)
+
+    def _catch_up(self) -> None:
+        """Index the records past what the index covers, left by a writer that crashed. Under the lock."""
+        _, _, _, _, count, covered = self._header()
+        size = os.fstat(self._log.fileno()).st_size
+        while covered < size:
+            self._log.seek(covered)
+            head = self._log.read(RECORD.size)
+            if len(head) < RECORD.size: break
+            key_length, value_length = RECORD.unpack(head)
+            end = covered + RECORD.size + key_length + value_length
+            if end > size: break
+            key, _ = self._read_record(covered)
+            self._set_counts(count, covered)
+            self._reserve(1)
+            count += self._insert(key, covered)
+            covered = end
+        if covered < size: self._truncate_log(covered)  # Half written record
+        self._set_counts(count, covered)
+
+    def _reserve(self, extra: int) -> None:
+        """Make room for extra more keys, copying the index into a larger one if needed. Under the lock."""
+        _, _, _, capacity, count, covered = self._header()
+        if count + extra <= capacity * MAX_LOAD: return
+        new_capacity = capacity
+        while count + extra > new_capacity * MAX_LOAD: new_capacity *= 2
+        old_index = self._index
+        path = self._create_index(new_capacity, count, covered)
+        with open(path, 'r+b') as f:
+            new_index = mmap.mmap(f.fileno(), 0)
+            for key_hash, where in SLOT.iter_unpack(old_index[HEADER.size:]):
+                if where == 0: continue
+                position = key_hash & (new_capacity - 1)
+                while SLOT.unpack_from(new_index, HEADER.size + SLOT.size * position)[1]: position = (position + 1) & (new_capacity - 1)
+                SLOT.pack_into(new_index, HEADER.size + SLOT.size * position, key_hash, where)
+            new_index.flush()
+            new_index.close()
+        magic, version, _, _, _, _ = self._header()
+        HEADER.pack_into(old_index, 0, magic, version, 1, capacity, count, covered)
+        old_path = self._index_path(capacity)
+        self._map(path)
+        try: old_path.unlink()
+        except OSError: pass
+
+    # ACCESS ====================================
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, bytes]:
+        """Values of the keys stored, read in one go."""
+        if not keys: return {}
+        while True:
+            with self._locked(shared=True):
+                if not self._superseded():
+                    values = {}
+                    for key in keys:
+                        _, value = self._probe(key, _key_hash(key))
+                        if value is not None: values[key] = value
+                    return values
+            with self._locked():  # Another process moved the index
+                if self._superseded(): self._open_index()
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[bytes, bytes]) -> None:
+        """Append the values of the keys not stored yet and index them."""
+        if not items: return
+        with self._locked():
+            if self._superseded(): self._open_index()
+            self._catch_up()
+            self._reserve(len(items))  # Before probing, growing the index moves every key to another slot
+            _, _, _, _, count, offset = self._header()
+            records = []
+            for key, value in items.items():
+                key_hash = _key_hash(key)
+                slot, stored = self._probe(key, key_hash)
+                if stored is not None: continue
+                data = RECORD.pack(len(key), len(value)) + key + value
+                records.append((slot, key_hash, offset, data))
+                offset += len(data)
+            if not records: return
+            self._log.write(b"".join(data for _, _, _, data in records))  # The records first, a crash leaves no slot pointing past the log
+            for slot, key_hash, position, _ in records: self._place(slot, key_hash, position)
+            self._set_counts(count + len(records), offset)
+
+    def __len__(self) -> int:
+        return self._header()[4]
+
+    def close(self) -> None:
+        self._unmap()
+        self._unmap_log()
+        self._log.close()
+        self._lock_file.close()
+
+
+def open_generation(font_hash: str, directory: Optional[Path] = None) -> RunLog:
+    """The on-disk tier of a font, the folders of all but the KEPT_GENERATIONS fonts used last removed."""
+    directory = Path(directory) if directory else cache.cache_dir / SHAPING_FOLDER
+    path = directory / font_hash
+    path.mkdir(parents=True, exist_ok=True)
+    os.utime(path)  # Marks it as used
+    generations = sorted((entry for entry in os.scandir(directory) if entry.is_dir()), key=lambda entry: -entry.stat().st_mtime_ns)
+    for entry in generations[KEPT_GENERATIONS:]:
+        if entry.name != font_hash: shutil.rmtree(entry.path, ignore_errors=True)  # Files still open elsewhere stay until later
+    return RunLog(path)
+
+
+# CACHE =========================================
+
+class ShapeCache:
+    """
+    Shaped runs of a font with a feature set, in memory and on disk.
+
+    Parameters:
+        font_hash (str): Content hash of the font. (see Shaper.font_hash)
+        features (Iterable[str]), script (str), language (str): What the shaper applies, part of every key.
+        directory (Path): Where the generations live, .cache/shaping by default.
+        memory_size (int): Runs kept in memory.
+        persistent (bool): Use the on-disk tier.
+    """
+
+    def __init__(self, font_hash: str, features: Iterable[str] = DEFAULT_FEATURES, script: str = "latn", language: str = "dflt",
+                 directory: Optional[Path] = None, memory_size: int = MEMORY_SIZE, persistent: bool = True):
+        self.font_hash = font_hash
+        self._prefix = f"{script}/{language}/{','.join(sorted(set(features)))}\0".encode()
+        self.memory = LRUCache(memory_size)
+        self.disk = open_generation(font_hash, directory) if persistent else None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_shaper(cls, shaper: Shaper, **options) -> "ShapeCache":
+        """Cache of the runs of shaper, which must come from Shaper.from_font or Shaper.from_features."""
+        if shaper.font_hash is None: raise ValueError("The shaper does not know the hash of its font")
+        return cls(shaper.font_hash, shaper.features, shaper.script, shaper.language, **options)
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, Run]:
+        """Runs of the texts cached, from memory or else from disk in one read."""
+        with self._lock:
+            runs = {}
+            missing = []
+            for text in texts:
+                run = self.memory.get(text)
+                if run is not None: runs[text] = run
+                else: missing.append(text)
+            self.memory_hits += len(runs)
+            if self.disk is None or not missing: return runs
+            keys = {self._prefix + text.encode(): text for text in missing}
+            for key, data in self.disk.get_many(keys).items():
+                run = runs[keys[key]] = decode_run(data)
+                self.memory.put(keys[key], run)
+                self.disk_hits += 1
+            return runs
+
+    def get(self, text: str) -> Optional[Run]:
+        return self.get_many([text]).get(text)
+
+    def put_many(self, runs: Dict[str, Iterable[ShapedGlyph]]) -> None:
+        with self._lock:
+            runs = {text: tuple(glyphs) for text, glyphs in runs.items()}
+            for text, run in runs.items(): self.memory.put(text, run)
+            if self.disk is not None: self.disk.put_many({self._prefix + text.encode(): encode_run(run) for text, run in runs.items()})
+
+    def shape_many(self, shaper: Shaper, texts: List[str]) -> List[Run]:
+        """Runs of texts, the ones not cached shaped by shaper and stored in one write."""
+        runs = self.get_many(texts)
+        shaped = {text: tuple(shaper.shape(text)) for text in texts if text not in runs}
+        self.misses += len(shaped)
+        self.put_many(shaped)
+        runs.update(shaped)
+        return [runs[text] for text in texts]
+
+    def shape(self, shaper: Shaper, text: str) -> Run:
+        return self.shape_many(shaper, [text])[0]
+
+    def close(self) -> None:
+        if self.disk is not None: self.disk.close()
@@ -0,0 +1,185 @@
+"""
+Subset a built font to what a text needs : the glyphs of its characters, every glyph the
+GSUB lookups can turn them into (their closure), and the rules that can still apply
+among those. A page showing a few sample words loads a font of a few kilobytes instead
+of the whole one.
+
+The closure follows the lookups of the features the browser applies (ccmp among them)
+until no new glyph appears, intermediate glyphs included : components of a
+decomposition (a_, _a), fused forms (_ao_) and contextual forms (uR_before_n, b_ending).
+It errs on the side of keeping a glyph, a chained rule is taken to match as soon as
+every glyph set of its context has a glyph in the subset.
+
+The subset is written with the tables of the python backend (otf.py, otl.py), under the
+same names and timestamp as a full build. Lookups and rules that can no longer apply are
+left out, features other than the ones given are dropped.
+"""
+
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set # type: ignore
+
+from .cff import read_glyph_names, read_outlines
+from .eps import bounding_box
+from .layout import CHAIN_SUB, GPOS, GSUB, LIGATURE_SUB, ChainRule, Layout, Lookup
+from .otf import NOTDEF, OutlineGlyph, build_tables, read_advances, read_cmap
+from .otl import build_layout_tables, read_layout
+from .sfnt import build_sfnt, read_font
+from .shape import DEFAULT_FEATURES
+
+
+def text_glyphs(text: str, cmap: Dict[int, str]) -> Set[str]:
+    """Glyphs the characters of text map to, and .notdef. Characters the font lacks are left out."""
+    return {NOTDEF} | {cmap[ord(character)] for character in set(text) if ord(character) in cmap}
+
+def feature_lookups(layout: Layout, table: str, features: Iterable[str] = DEFAULT_FEATURES) -> List[Lookup]:
+    """Lookups of a table the features apply in any language system, in LookupList order."""
+    features = set(features)
+    selected = {
+        id(lookup) for (feature_table, tag), languages in layout.features.items() if feature_table == table and tag in features
+        for lookups in languages.values() for lookup in lookups
+    }
+    return [lookup for lookup in layout.table_lookups(table) if id(lookup) in selected]
+
+
+# CLOSURE =======================================
+
+def _key_glyphs(value) -> Set[str]:
+    return {value} if isinstance(value, str) else set(value)
+
+def _close(lookup: Lookup, glyphs: Set[str], at: Optional[Set[str]] = None) -> None:
+    """
+    Add to glyphs what lookup can produce from them.
+
+    Parameters:
+        at (set): The glyphs that can be where the lookup is applied, any of glyphs if None.
+    """
+    if lookup.type == CHAIN_SUB:
+        for rule in lookup.rules:
+            if not all(glyph_set & glyphs for glyph_set in (*rule.backtrack, *rule.input, *rule.lookahead)): continue
+            if at is not None and not rule.input[0] & at: continue
+            for sequence_index, action in rule.actions:
+                # Once an earlier action substituted, any glyph may be at the next position
+                _close(action, glyphs, rule.input[sequence_index] & glyphs if len(rule.actions) == 1 else None)
+        return
+
+    starts = glyphs if at is None else at
+    for key, value in list(lookup.mapping.items()):
+        if lookup.type == LIGATURE_SUB:
+            if key[0] in starts and all(component in glyphs for component in key): glyphs.add(value)
+        elif key in starts:
+            glyphs.update(_key_glyphs(value))
+
+def glyph_closure(layout: Layout, glyphs: Iterable[str], features: Iterable[str] = DEFAULT_FEATURES) -> Set[str]:
+    """Every glyph the GSUB lookups of features can make out of glyphs, glyphs included."""
+    closure = set(glyphs)
+    lookups = feature_lookups(layout, GSUB, features)
+    size = -1
+    while size != len(closure):
+        size = len(closure)
+        for lookup in lookups: _close(lookup, closure)
+    return closure
+
+
+# PRUNING =======================================
+
+def prune_layout(layout: Layout, glyphs: Set[str], features: Iterable[str] = DEFAULT_FEATURES) -> Layout:
+    """
+    The part of layout that can apply to glyphs : the lookups of features, keeping the rules
+    whose glyphs are all in the subset, and the glyph sets of chained rules narrowed to it.
+    Lookups of a layout read back from a font (see otl.read_layout) come out named and
+    nested again, as otl.build_layout_tables expects.
+    """
+    features = set(features)
+    pruned = Layout()
+    pruned.glyph_classes = {glyph: glyph_class for glyph, glyph_class in layout.glyph_classes.items() if glyph in glyphs}
+
+    def copy(lookup: Lookup) -> Lookup:
+        result = Lookup(lookup.table, lookup.type, lookup.flag, lookup.name)
+        result.source = lookup.source
+        result.glyphs = lookup.glyphs & glyphs
+        nested: Dict[int, Lookup] = {}
+        for rule in lookup.rules:
+            sets = [[frozenset(glyph_set & glyphs) for glyph_set in sequence] for sequence in (rule.backtrack, rule.input, rule.lookahead)]
+            if not all(glyph_set for sequence in sets for glyph_set in sequence): continue  # Cannot match anymore
+            actions = []
+            for sequence_index, action in rule.actions:
+                if id(action) not in nested:
+                    nested[id(action)] = copy(action)
+                    result.nested.append(nested[id(action)])
+                actions.append((sequence_index, nested[id(action)]))
+            result.add_chain_rule(ChainRule(*sets, actions))
+        for key, value in lookup.mapping.items():
+            if _key_glyphs(key) <= glyphs and (lookup.table == GPOS or _key_glyphs(value) <= glyphs): result.mapping[key] = value
+        return result
+
+    replacements: Dict[int, Lookup] = {}
+    for table in (GSUB, GPOS):
+        for lookup in feature_lookups(layout, table, features):
+            result = copy(lookup)
+            if result.mapping or result.rules:
+                pruned.lookups.append(result)
+                replacements[id(lookup)] = result
+
+    for (table, tag), languages in layout.features.items():
+        if tag not in features: continue
+        systems = {system: [replacements[id(lookup)] for lookup in lookups if id(lookup) in replacements] for system, lookups in languages.items()}
+        systems = {system: lookups for system, lookups in systems.items() if lookups}
+        if systems: pruned.features[(table, tag)] = systems
+    return pruned
+
+
+# SUBSET ========================================
+
+def subset_font(font_path, text: str, features: Iterable[str] = DEFAULT_FEATURES) -> bytes:
+    """
+    A font with the glyphs and rules text needs, from a built font.
+
+    Parameters:
+        font_path (Path): Built font (.otf) to subset.
+        text (str): Every character the subset has to shape.
+        features (Iterable[str]): Features kept, and followed to find the glyphs needed.
+    """
+    features = tuple(features)
+    _, tables = read_font(font_path)
+    names = read_glyph_names(tables["CFF "])
+    cmap = {codepoint: names[glyph_id] for codepoint, glyph_id in read_cmap(tables["cmap"]).items()}
+    layout = read_layout(tables, names)
+    kept = glyph_closure(layout, text_glyphs(text, cmap), features)
+
+    advances = read_advances(tables["hhea"], tables["hmtx"], len(names))
+    glyphs = [
+        OutlineGlyph(name, contours, bounding_box(contours), advance)
+        for name, contours, advance in zip(names, read_outlines(tables["CFF "]), advances) if name in kept
+    ]
+    glyph_ids = {glyph.name: gid for gid, glyph in enumerate(glyphs)}
+    pruned = prune_layout(layout, kept, features)
+    layout_tables, _ = build_layout_tables(pruned, glyph_ids)
+    subset = build_tables(glyphs, max_context=pruned.max_context)
+    subset.update(layout_tables)
+    return build_sfnt(subset)
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self._skipped = 0  # Depth within <script> and <style>
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"): self._skipped += 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self._skipped: self._skipped -= 1
+
+    def handle_data(self, data):
+        if not self._skipped: self.parts.append(data)
+
+def page_text(path) -> str:
+    """Text a page shows : the text of an HTML file (scripts and styles left out), any other file as is."""
+    with open(path, 'r', encoding='utf-8') as f: content = f.read()
+    if Path(path).suffix.lower() not in (".html", ".htm"): return content
+    extractor = _TextExtractor()
+    extractor.feed(content)
+    extractor.close()
+    return "".join(extractor.parts)
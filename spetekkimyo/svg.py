@@ -0,0 +1,86 @@
+"""
+SVG drawings of shaped runs, from the outlines of the font itself : what a page can show
+without loading the font and without relying on the browser's shaping.
+
+A run is drawn as one <path> per glyph, in font units, in an <svg> one em high (the
+ascent and descent of the font) whose width is the advance of the run, so it scales with
+the font-size of the element it sits in, its baseline on the baseline of the text.
+"""
+
+from typing import Dict, List, Sequence # type: ignore
+
+from . import config
+from .cff import read_glyph_names, read_outlines
+from .eps import Contour, segments
+from .otf import OutlineGlyph, read_vertical_metrics
+from .sfnt import read_font
+
+
+def _number(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".") if value != int(value) else str(int(value))
+
+def path_data(contours: List[Contour]) -> str:
+    """SVG path data of contours, in font units with y going up."""
+    commands = []
+    for contour in contours:
+        for index, segment in enumerate(segments(contour)):
+            if index == 0: commands.append("M" + " ".join(_number(value) for value in segment[0]))
+            commands.append(("L" if len(segment) == 2 else "C") + " ".join(_number(value) for point in segment[1:] for value in point))
+        if commands and commands[-1][0] != "Z": commands.append("Z")
+    return "".join(commands)
+
+
+class SVGRenderer:
+    """
+    Draw shaped runs as SVG.
+
+    Parameters:
+        outlines (dict): Glyph name to contours, in font units.
+        units_per_em (int), ascent (int), descent (int): Vertical metrics of the font, the
+            drawings span from ascent to descent around the baseline.
+    """
+
+    def __init__(self, outlines: Dict[str, List[Contour]], units_per_em: int = config.UNITS_PER_EM,
+                 ascent: int = config.ASCENT, descent: int = config.DESCENT):
+        self.outlines = outlines
+        self.units_per_em = units_per_em
+        self.ascent = ascent
+        self.descent = descent
+        self._paths: Dict[str, str] = {}
+
+    @classmethod
+    def from_font(cls, path, **options) -> "SVGRenderer":
+        """Renderer for the outlines of a built font file (.otf)."""
+        _, tables = read_font(path)
+        names = read_glyph_names(tables["CFF "])
+        units_per_em, ascent, descent = read_vertical_metrics(tables["head"], tables["hhea"])
+        return cls(dict(zip(names, read_outlines(tables["CFF "]))), units_per_em=units_per_em, ascent=ascent, descent=descent, **options)
+
+    @classmethod
+    def from_glyphs(cls, glyphs: List[OutlineGlyph], **options) -> "SVGRenderer":
+        """Renderer for the glyphs the font would be built from. (see otf.outline_glyphs)"""
+        return cls({glyph.name: glyph.contours for glyph in glyphs}, **options)
+
+    def path(self, name: str) -> str:
+        """Path data of a glyph. (computed once per glyph)"""
+        if name not in self._paths: self._paths[name] = path_data(self.outlines.get(name, []))
+        return self._paths[name]
+
+    def render_run(self, run: Sequence) -> str:
+        """
+        SVG of shaped glyphs (ShapedGlyph, or anything with name, x_advance, x_offset and
+        y_offset) drawn one after the other, filled with currentColor.
+        """
+        parts = []
+        pen = 0
+        for glyph in run:
+            data = self.path(glyph.name)
+            if data: parts.append(f'<path transform="translate({pen + glyph.x_offset} {glyph.y_offset})" d="{data}"/>')
+            pen += glyph.x_advance
+        height = self.ascent + self.descent
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 {-self.ascent} {max(pen, 0)} {height}" '
+            f'width="{_number(max(pen, 0) / self.units_per_em)}em" height="{_number(height / self.units_per_em)}em" '
+            f'style="vertical-align:{_number(-self.descent / self.units_per_em)}em" overflow="visible">'
+            f'<g transform="scale(1 -1)" fill="currentColor">' + "".join(parts) + "</g></svg>"
+        )
@@ -0,0 +1,225 @@
+"""
+Synthetic glyph sets and feature files, to see how the pipeline scales as the glyph
+inventory grows from a hundred glyphs to thousands of contextual variants.
+
+A synthetic input folder has the layout of spetekkimyo/input (glyphs/*.eps in FontForge's
+EPS format, padding.json, features.fea) and a feature file in the style of the real one :
+the ETAPE_* lookups of the ccmp feature, with rule counts proportional to the glyph count.
+
+- letters (encoded, uniXXXX) decompose into a head and a tail (ETAPE_2_DECOMPOSITION)
+- floating letters become marks between letters (ETAPE_1_FLOTTANTES, GDEF)
+- tails fuse with the head that follows (ETAPE_2_FUSION)
+- tails take a form per following head, heads a low form per preceding tail (ETAPE_3_ESTHETIQUE)
+- tails kern against heads (ETAPE_4_KERNING)
+- the remaining glyphs are alternates no rule reaches
+
+Each scale is built and shaped in its own process, with config.INPUT_VARIABLE and
+cache.CACHE_VARIABLE pointing at its folder, so it never touches the real inputs nor the
+real build cache.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import contextlib
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence # type: ignore
+
+from .cache import CACHE_VARIABLE, root_dir
+from .config import INPUT_VARIABLE
+
+SCALES = (1000, 5000, 20000)
+synthetic_dir = root_dir / '.cache' / 'synthetic'
+
+FIRST_CODEPOINT = 0x0100
+GLYPHS_PER_LETTER = 50  # 20 letters at 1000 glyphs, 400 at 20000
+PREVIEW_ROWS = 72  # FontForge's preview bitmap, skipped by the parser but part of what it reads
+SHAPED_WORDS = 5000
+
+# Share of the glyphs left once the letters are drawn, the rest are alternates
+FUSION_SHARE = 0.15
+TAIL_VARIANT_SHARE = 0.25
+LOW_FORM_SHARE = 0.05
+KERNING_SHARE = 0.05  # Kerning rules, not glyphs
+
+
+def _eps(name: str, width: int, rng: random.Random) -> str:
+    """FontForge glyph EPS drawing a random stroke with a curve, preview bitmap included."""
+    height = rng.randrange(200, 700)
+    thickness = rng.randrange(40, 120)
+    bend = rng.randrange(0, width)
+    preview = "".join("%" + "0" * 62 + "\n" for _ in range(PREVIEW_ROWS))
+    return (
+        "%!PS-Adobe-3.0 EPSF-3.0\n"
+        f"%%BoundingBox: 0 0 {width} {height}\n"
+        "%%Pages: 0\n"
+        f"%%Title: {name} from Seiso\n"
+        "%%Creator: FontForge\n"
+        "%%EndComments\n"
+        "%%BeginPreview: 62 72 4 72\n"
+        + preview +
+        "%%EndPreview\n"
+        "%%EndProlog\n"
+        f"%%Page \"{name}\" 1\n"
+        "gsave newpath\n"
+        f"\t0 {thickness} moveto\n"
+        f"\t {bend} {thickness} {width - thickness} {height // 2} {width - thickness} {height} curveto\n"
+        f"\t {width} {height} lineto\n"
+        f"\t {width} {height // 3} {bend} 0 0 0 curveto\n"
+        f"\t0 {thickness} lineto\n"
+        "\tclosepath\n"
+        "fill grestore\n"
+        "%%EOF\n"
+    )
+
+def _class(names: Sequence[str], rng: random.Random, low: int = 3, high: int = 8) -> str:
+    return "[" + " ".join(rng.sample(list(names), min(len(names), rng.randint(low, high)))) + "]"
+
+
+def write_inputs(directory: Path, glyph_count: int, seed: int = 0) -> Dict[str, int]:
+    """
+    Write a synthetic input folder of about glyph_count glyphs to directory/input, with the
+    words to shape in directory/words.txt.
+
+    Returns:
+        dict: {"glyphs", "rules", "letters"}, also saved in directory/synthetic.json.
+    """
+    rng = random.Random(seed)
+    letters = max(8, glyph_count // GLYPHS_PER_LETTER)
+    floating = max(2, letters // 20)
+    remaining = max(0, glyph_count - 3 * letters - 2 * floating)
+
+    encoded = [f"uni{FIRST_CODEPOINT + index:04X}" for index in range(letters)]
+    heads = [f"l{index}_" for index in range(letters)]
+    tails = [f"_l{index}" for index in range(letters)]
+    floaters = [f"uni{FIRST_CODEPOINT + letters + index:04X}" for index in range(floating)]
+    marks = [f"_f{index}_" for index in range(floating)]
+
+    pairs = rng.sample([(first, second) for first in range(letters) for second in range(letters)], min(letters * letters, int(remaining * FUSION_SHARE)))
+    fusions = {f"_l{first}l{second}_": (first, second) for first, second in pairs}
+    tail_variants = {f"_l{index % letters}_v{index // letters}": index % letters for index in range(int(remaining * TAIL_VARIANT_SHARE))}
+    low_forms = {f"l{index % letters}_low{index // letters}": index % letters for index in range(int(remaining * LOW_FORM_SHARE))}
+    alternates = [f"l{index % letters}.alt{index // letters}" for index in range(remaining - len(fusions) - len(tail_variants) - len(low_forms))]
+
+    names = encoded + heads + tails + floaters + marks + list(fusions) + list(tail_variants) + list(low_forms) + alternates
+    glyph_dir = directory / 'input' / 'glyphs'
+    glyph_dir.mkdir(parents=True, exist_ok=True)
+    for path in glyph_dir.glob('*.eps'): path.unlink()
+    widths = {name: rng.randrange(120, 600) for name in names}
+    for name in names:
+        with open(glyph_dir / (name + '.eps'), 'w', newline='\n') as f: f.write(_eps(name, widths[name], rng))
+
+    # Fused and low forms overlap what precedes them, like ks_ or ta_
+    padding = {name: -rng.randrange(0, widths[name] // 2) for name in list(fusions) + list(low_forms)}
+    padding.update({name: rng.randrange(0, 40) for name in rng.sample(heads, len(heads) // 4)})
+    with open(directory / 'input' / 'padding.json', 'w') as f: json.dump(padding, f)
+
+    rules = 0
+    def lookup(name: str, lines: List[str], flag: bool = True) -> str:
+        nonlocal rules
+        rules += len(lines)
+        body = "".join(f"        {line}\n" for line in lines)
+        return f"    lookup {name} {{\n\n" + ("        lookupflag IgnoreMarks;\n\n" if flag else "") + body + f"\n    }} {name};\n\n"
+
+    floating_rules = []
+    for floater, mark in zip(floaters, marks):
+        floating_rules.append(f"sub {_class(encoded, rng)} {floater}' {_class(encoded, rng)} by {mark};")
+        floating_rules.append(f"sub {floater}' {_class(encoded, rng)} by {mark};")
+    decomposition = [f"sub {letter} by {head} {tail};" for letter, head, tail in zip(encoded, heads, tails)]
+    fusion = [f"sub {tails[first]} {heads[second]} by {name};" for name, (first, second) in fusions.items()]
+    aesthetics = [f"sub {tails[index]}' {_class(heads, rng)} by {name};" for name, index in tail_variants.items()]
+    aesthetics += [f"sub {_class(tails, rng)} {heads[index]}' by {name};" for name, index in low_forms.items()]
+    kerning = [f"pos {_class(tails + list(tail_variants), rng)} {_class(heads + list(low_forms), rng)} {-rng.randrange(5, 120)};"
+               for _ in range(int(remaining * KERNING_SHARE) + 1)]
+
+    features = (
+        "table GDEF {\n    GlyphClassDef\n        [], # Base glyphs\n        [], # Ligature glyphs\n"
+        f"        [{' '.join(marks)}], # Mark glyphs\n        []; # Component glyphs\n}} GDEF;\n\n"
+        "feature ccmp {\n    script DFLT;\n    language dflt required;\n    script latn;\n    language dflt required;\n\n"
+        + lookup("ETAPE_1_FLOTTANTES", floating_rules, flag=False)
+        + lookup("ETAPE_2_DECOMPOSITION", decomposition)
+        + lookup("ETAPE_2_FUSION", fusion)
+        + lookup("ETAPE_3_ESTHETIQUE", aesthetics)
+        + lookup("ETAPE_4_KERNING", kerning)
+        + "} ccmp;\n"
+    )
+    with open(directory / 'input' / 'features.fea', 'w', newline='\n') as f: f.write(features)
+
+    alphabet = [chr(FIRST_CODEPOINT + index) for index in range(letters)]
+    with open(directory / 'words.txt', 'w', encoding='utf-8', newline='\n') as f:
+        for _ in range(SHAPED_WORDS):
+            word = rng.choices(alphabet, k=rng.randint(2, 8))
+            if rng.random() < 0.3: word.insert(rng.randrange(1, len(word)), chr(FIRST_CODEPOINT + letters + rng.randrange(floating)))
+            f.write("".join(word) + "\n")
+
+    counts = {"glyphs": len(names), "rules": rules, "letters": letters}
+    with open(directory / 'synthetic.json', 'w') as f: json.dump(counts, f)
+    return counts
+
+
+def measure(directory: Path, backend: Optional[str] = None) -> dict:
+    """
+    Build and shape the synthetic font of directory, in this process. The environment must
+    point config and cache at directory already. (see run_scale)
+
+    Returns:
+        dict: Counts of synthetic.json, "build_seconds", "phases" (seconds per build phase, see
+            profiling.py), "font_size" and "shaping_words_per_second", or "error" if the build failed.
+    """
+    from .command import generate_font
+    from .shape import Shaper
+
+    with open(directory / 'synthetic.json', 'r') as f: result = json.load(f)
+    output_path = directory / 'font.otf'
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            profile = generate_font(os.path.relpath(output_path, root_dir), use_cache=False, backend=backend)
+            result["build_seconds"] = time.perf_counter() - started
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    result["phases"] = {phase.name: phase.total for phase in profile.summary()}
+    result["font_size"] = output_path.stat().st_size
+
+    with open(directory / 'words.txt', 'r', encoding='utf-8') as f: words = f.read().split()
+    shaper = Shaper.from_font(output_path)
+    started = time.perf_counter()
+    for word in words: shaper.shape(word)
+    result["shaping_words_per_second"] = len(words) / (time.perf_counter() - started)
+    return result
+
+def run_scale(glyph_count: int, backend: Optional[str] = None, seed: int = 0) -> dict:
+    """Write the inputs of a scale and measure them in a new process. (see measure)"""
+    directory = synthetic_dir / str(glyph_count)
+    write_inputs(directory, glyph_count, seed)
+    environment = {**os.environ, INPUT_VARIABLE: str(directory / 'input'), CACHE_VARIABLE: str(directory / 'cache')}
+    arguments = [sys.executable, "-m", "spetekkimyo.synthetic", str(directory)] + ([backend] if backend else [])
+    completed = subprocess.run(arguments, cwd=str(root_dir.parent), env=environment, stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+def run_synthetic_benchmark(scales: Sequence[int] = SCALES, backend: Optional[str] = None, seed: int = 0) -> List[dict]:
+    """Measure the pipeline at every scale, smallest first."""
+    return [run_scale(glyph_count, backend, seed) for glyph_count in sorted(scales)]
+
+
+def format_results(results: List[dict]) -> str:
+    """Table of the results of run_synthetic_benchmark."""
+    phases = list(dict.fromkeys(name for result in results for name in result.get("phases", {})))
+    lines = [f"{'glyphs':>7} {'rules':>7} {'build s':>9} " + " ".join(f"{name[:14]:>14}" for name in phases) + f" {'words/s':>9} {'font KB':>8}"]
+    for result in results:
+        line = f"{result['glyphs']:>7} {result['rules']:>7} "
+        if "error" in result: line += result["error"]
+        else:
+            line += f"{result['build_seconds']:>9.2f} " + " ".join(f"{result['phases'].get(name, 0):>14.3f}" for name in phases)
+            line += f" {result['shaping_words_per_second']:>9.0f} {result['font_size'] / 1024:>8.0f}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":  # One scale, run by run_scale
+    print(json.dumps(measure(Path(sys.argv[1]), sys.argv[2] if len(sys.argv) > 2 else None)))
@@ -0,0 +1,106 @@
+"""
+Watch the input folder, rebuild the font when it changes and tell the preview page to
+reload it through Server-Sent Events. The page is sent the content-hashed copy of the new
+font (see publish.py), which the preview server lets browsers cache for good. (see server.py)
+
+A FontForge export rewrites dozens of EPS files at once, so changes are only built once
+the input folder has been quiet for a short while. Edits arriving while a build runs
+cancel that build, a new one starts as soon as things settle again.
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple # type: ignore
+
+from . import config
+from .backend import get_backend
+from .publish import read_manifest
+from .server import EventBroadcaster, PreviewServer
+from .worker import BuildCancelled
+
+root_dir = Path(__file__).parent.resolve()
+project_dir = root_dir.parent  # index.html and output/ live there
+watched_paths = [config.glyph_dir, config.feature_path, config.padding_path, config.glyph_order_path]
+
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def snapshot(paths: List[Path]) -> Snapshot:
+    """Modification time and size of every watched file. (folders are not walked recursively)"""
+    result = {}
+    for path in paths:
+        entries = [entry.path for entry in os.scandir(path) if entry.is_file()] if path.is_dir() else [str(path)]
+        for entry in entries:
+            try: stat = os.stat(entry)
+            except FileNotFoundError: continue  # Deleted between scandir and stat
+            result[entry] = (stat.st_mtime_ns, stat.st_size)
+    return result
+
+
+def watch(output_path: str = "output/test.otf", host: str = "127.0.0.1", port: int = 8000,
+          debounce: float = 0.3, interval: float = 0.1, backend: Optional[str] = None,
+          stop: Optional[threading.Event] = None) -> None:
+    """
+    Rebuild output_path whenever the inputs change and serve the preview page.
+
+    Parameters:
+        output_path (str): Where to write the font, relative to the project folder.
+        host, port: Address of the preview server. (open http://host:port/index.html)
+        debounce (float): Seconds without any change before a rebuild starts.
+        interval (float): Seconds between two polls of the input folder.
+        backend (str): Build backend, see backend.py.
+        stop (threading.Event): Stops watching once set, instead of on Ctrl+C.
+    """
+    output_path = project_dir / output_path
+    broadcaster = EventBroadcaster()
+    server_loop = PreviewServer(project_dir, output_path, broadcaster).start_in_thread(host, port)
+    print(f"Preview at http://{host}:{port}/index.html")
+
+    builder = get_backend(backend)
+    dirty = threading.Event()  # Set when changes have settled and are not built yet
+    dirty.set()                # Bring the font up to date on start
+    edits = [0]                # Number of changes seen so far, a build is stale if it moved meanwhile
+
+    def build_loop():
+        published = None
+        while True:
+            dirty.wait()
+            dirty.clear()
+            started_at = edits[0]
+            try:
+                builder.build(output_path)
+            except BuildCancelled:
+                continue  # Newer edits arrived, the next round builds them
+            except Exception as e:
+                print(f"Build failed: {e}")
+                continue
+            if edits[0] == started_at:
+                font = read_manifest(output_path.parent)["fonts"].get(output_path.stem)
+                if font is None or font["hash"] == published: continue  # Touched but not changed
+                published = font["hash"]
+                print(f"Font rebuilt ({published})")
+                name = font["files"].get("woff") or next(iter(font["files"].values()))
+                broadcaster.publish("reload", {"path": (output_path.parent / name).relative_to(project_dir).as_posix(), "version": published})
+
+    threading.Thread(target=build_loop, daemon=True).start()
+
+    stop = stop or threading.Event()
+    last = snapshot(watched_paths)
+    changed_at = None
+    try:
+        while not stop.wait(interval):
+            current = snapshot(watched_paths)
+            if current != last:
+                last = current
+                changed_at = time.monotonic()
+                edits[0] += 1
+                builder.cancel()  # No-op if nothing is building
+            elif changed_at is not None and time.monotonic() - changed_at >= debounce:
+                changed_at = None
+                dirty.set()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server_loop.call_soon_threadsafe(server_loop.stop)
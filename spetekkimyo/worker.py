@@ -0,0 +1,220 @@
+"""
+Long-lived font builder, so that consecutive builds do not pay for starting ffpython
+and loading FontForge (and every dll of ffpython/bin) each time.
+
+The worker side (serve) runs inside ffpython and takes build jobs over a local socket.
+The client side (BuildWorker) runs in the regular python environment, it starts the
+worker on demand, deduplicates identical jobs and starts a new worker whenever the
+previous one died (FontForge crashes take the whole interpreter down).
+
+Cancelling a job leaves the worker running : the client sends a cancel message, which the
+build notices between two of its phases. (see generate.build) The font being generated
+is only moved into place once complete, an abandoned build leaves the previous one.
+
+NOTE : the worker side is run by ffpython (3.10).
+"""
+
+import io
+import os
+import sys
+import queue
+import secrets
+import threading
+import traceback
+import subprocess
+import contextlib
+from pathlib import Path
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, List, Optional # type: ignore
+
+root_dir = Path(__file__).parent.resolve()
+if not __package__: sys.path.insert(0, str(root_dir.parent))  # worker.py runs as a script inside ffpython
+from spetekkimyo.cache import collect_inputs, hash_json
+from spetekkimyo.profiling import BuildProfile
+from spetekkimyo import config
+
+ffpython_exe = root_dir / 'ffpython' / 'bin' / 'ffpython.exe'
+path_to_worker_script = root_dir / 'worker.py'
+
+AUTHKEY_VARIABLE = "SPETEKKIMYO_WORKER_KEY"
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process died while running a job."""
+
+class BuildCancelled(RuntimeError):
+    """The running job was abandoned with BuildWorker.cancel."""
+
+CANCEL = {"cancel": True}  # Message abandoning the job the worker is running
+
+def check_cancelled(cancelled: Optional[threading.Event]) -> None:
+    """Abandon the build, between two of its phases, once cancelled is set."""
+    if cancelled is not None and cancelled.is_set(): raise BuildCancelled("Build cancelled")
+
+
+# WORKER SIDE ===================================
+
+def serve(build: Callable) -> None:
+    """
+    Run build jobs until the client disconnects.
+
+    Parameters:
+        build (Callable): generate.build, which loaded FontForge once for every job.
+    """
+    authkey = bytes.fromhex(os.environ[AUTHKEY_VARIABLE])
+    with Listener(('127.0.0.1', 0), authkey=authkey) as listener:
+        print(listener.address[1], flush=True)  # Tell the client which port to connect to
+        os.dup2(os.open(os.devnull, os.O_WRONLY), 1)  # Nobody reads the pipe anymore, FontForge must not fill it
+        with listener.accept() as connection:
+            jobs: queue.Queue = queue.Queue()
+            cancelled = threading.Event()
+
+            def receive():
+                # Reads while a job runs, so that a cancel message reaches the build
+                while True:
+                    try: message = connection.recv()
+                    except (EOFError, OSError): message = None
+                    if message == CANCEL:
+                        cancelled.set()
+                        continue
+                    cancelled.clear()  # Messages come in order, a cancel read before this job was meant for an earlier one
+                    jobs.put(message)
+                    if message is None: return
+
+            threading.Thread(target=receive, daemon=True).start()
+            while True:
+                job = jobs.get()
+                if job is None: return
+
+                stdout = io.StringIO()
+                profile = BuildProfile()
+                try:
+                    with contextlib.redirect_stdout(stdout):
+                        build(Path(job["output_path"]), use_cache=job["use_cache"], profile=profile, cancelled=cancelled)
+                    connection.send({"ok": True, "stdout": stdout.getvalue(), "profile": profile.to_dict()})
+                except BuildCancelled:
+                    connection.send({"ok": False, "cancelled": True, "stdout": stdout.getvalue(), "profile": profile.to_dict(), "error": "Cancelled"})
+                except Exception:
+                    connection.send({"ok": False, "stdout": stdout.getvalue(), "profile": profile.to_dict(), "error": traceback.format_exc()})
+
+
+# CLIENT SIDE ===================================
+
+class _Job:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BuildWorker:
+    """
+    Client of a persistent ffpython build worker.
+
+    Parameters:
+        restarts (int): How many times a job is retried on a new worker if the worker crashes.
+        command (list): Starts the worker side, ffpython running worker.py by default.
+    """
+
+    def __init__(self, restarts: int = 1, command: Optional[List[str]] = None):
+        self.restarts = restarts
+        self.command = command or [str(ffpython_exe), str(path_to_worker_script)]
+        self.process: Optional[subprocess.Popen] = None
+        self.connection = None
+        self._lock = threading.Lock()         # One job at a time on the connection
+        self._send_lock = threading.Lock()    # Jobs and cancel messages are sent from different threads
+        self._jobs_lock = threading.Lock()
+        self._pending: Dict[str, _Job] = {}  # Jobs being built, by input hash
+        self._running = False                # A job was sent and its result is not received yet
+
+    def _start(self) -> None:
+        authkey = secrets.token_bytes(32)
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=str(root_dir),
+            env={**os.environ, AUTHKEY_VARIABLE: authkey.hex()},
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        port = self.process.stdout.readline().strip()
+        if not port:
+            self.process.wait()
+            raise WorkerCrashed(f"Build worker failed to start (exit code {self.process.returncode})")
+        self.connection = Client(('127.0.0.1', int(port)), authkey=authkey)
+
+    def _run(self, job: dict) -> dict:
+        for _ in range(self.restarts + 1):
+            if self.process is None or self.process.poll() is not None:
+                self.close()
+                self._start()
+            try:
+                with self._send_lock:
+                    self.connection.send(job)
+                    self._running = True
+                try: return self.connection.recv()
+                finally:
+                    with self._send_lock: self._running = False
+            except (EOFError, OSError):
+                self.close()  # FontForge took the worker down, the next attempt uses a fresh one
+        raise WorkerCrashed(f"Build worker crashed {self.restarts + 1} times on {job['output_path']}")
+
+    def build(self, output_path: Path, use_cache: bool = True) -> dict:
+        """
+        Build the font to output_path on the worker.
+        Identical jobs (same inputs and output) submitted while one is running wait for its result.
+        Raises BuildCancelled if the job is cancelled before it completes.
+
+        Returns:
+            dict: {"ok": bool, "stdout": str, "profile": dict (see BuildProfile.to_dict), "error": str (if not ok)}
+        """
+        output_path = Path(output_path)
+        _, inputs = collect_inputs(config.glyph_dir, config.padding_path, config.feature_path, config=config.config_key(), order_path=config.glyph_order_path)
+        job_hash = hash_json([inputs, str(output_path), use_cache])
+
+        with self._jobs_lock:
+            job = self._pending.get(job_hash)
+            owner = job is None
+            if owner: job = self._pending[job_hash] = _Job()
+
+        if owner:
+            try:
+                with self._lock: job.result = self._run({"output_path": str(output_path), "use_cache": use_cache})
+            except Exception as e:
+                job.error = e
+            finally:
+                with self._jobs_lock: del self._pending[job_hash]
+                job.done.set()
+        else:
+            job.done.wait()
+
+        if job.error is not None: raise job.error
+        if job.result.get("cancelled"): raise BuildCancelled(str(output_path))
+        return job.result
+
+    def cancel(self) -> None:
+        """
+        Abandon the job currently running (its build call raises BuildCancelled) at the end
+        of the phase it is in. The worker keeps running for the next build.
+        """
+        with self._send_lock:
+            if not self._running: return
+            with contextlib.suppress(OSError): self.connection.send(CANCEL)
+
+    def close(self) -> None:
+        """Stop the worker, the next build starts a new one."""
+        if self.connection is not None:
+            with contextlib.suppress(OSError): self.connection.close()
+            self.connection = None
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.terminate()
+                with contextlib.suppress(subprocess.TimeoutExpired): self.process.wait(timeout=5)
+            if self.process.stdout is not None: self.process.stdout.close()
+            self.process = None
+
+
+if __name__ == "__main__":
+    # Served from the package rather than this __main__ module, so that the BuildCancelled
+    # generate.py raises is the one serve catches
+    from spetekkimyo import generate, worker  # Imports fontforge
+    worker.serve(generate.build)
@@ -0,0 +1,23 @@
+import json
+
+import pytest
+
+from spetekkimyo import cache, config
+from spetekkimyo.glyphs import load_glyphs
+from spetekkimyo.otf import outline_glyphs
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """A build cache of the test's own, the one of the project is left alone."""
+    directory = tmp_path / "cache"
+    monkeypatch.setattr(cache, "cache_dir", directory)
+    return directory
+
+@pytest.fixture
+def glyphs(cache_dir):
+    """Glyphs of the input folder, in glyph order."""
+    sources, _ = cache.collect_inputs(config.glyph_dir, config.padding_path, config.feature_path, order_path=config.glyph_order_path)
+    entries, _ = load_glyphs(sources, cache.BuildCache())
+    with open(config.padding_path, 'r') as f: padding = json.load(f)
+    return outline_glyphs(entries, padding)
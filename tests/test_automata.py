@@ -0,0 +1,61 @@
+"""
+Chained rule matching : the dispatch index and automata find the rule trying every rule
+in lookup order would find.
+"""
+
+import random
+
+from spetekkimyo.layout import ChainRule
+from spetekkimyo.shape import ChainMatcher
+
+ALPHABET = "abcdefm"
+
+
+def _next(glyphs, index, step, skipped):
+    index += step
+    while 0 <= index < len(glyphs) and glyphs[index] in skipped: index += step
+    return index
+
+def match_in_order(rules, glyphs, position, skipped):
+    """Try every rule in turn, the way chained lookups are specified."""
+    for rule in rules:
+        if glyphs[position] not in rule.input[0]: continue
+        positions, index = [position], position
+        for glyph_set in rule.input[1:] + rule.lookahead:
+            index = _next(glyphs, index, 1, skipped)
+            if not (index < len(glyphs) and glyphs[index] in glyph_set): break
+            positions.append(index)
+        else:
+            index = position
+            for glyph_set in rule.backtrack[::-1]:
+                index = _next(glyphs, index, -1, skipped)
+                if not (index >= 0 and glyphs[index] in glyph_set): break
+            else:
+                return rule, positions[:len(rule.input)]
+    return None
+
+def random_rules(rng, count):
+    def glyph_sets(length): return [frozenset(rng.sample(ALPHABET, rng.randint(1, 3))) for _ in range(length)]
+    return [ChainRule(glyph_sets(rng.randint(0, 2)), glyph_sets(rng.randint(1, 3)), glyph_sets(rng.randint(0, 2)), [])
+            for _ in range(count)]
+
+
+def test_matches_like_trying_every_rule():
+    rng = random.Random(0)
+    for _ in range(50):
+        rules = random_rules(rng, rng.randint(1, 40))
+        matcher = ChainMatcher(rules)
+        skipped = frozenset("m") if rng.random() < 0.5 else frozenset()  # A mark, passed over under IgnoreMarks
+        for _ in range(40):
+            glyphs = [rng.choice(ALPHABET) for _ in range(rng.randint(1, 10))]
+            for position in range(len(glyphs)):
+                expected = match_in_order(rules, glyphs, position, skipped)
+                found = matcher.match(glyphs, position, skipped)
+                assert (found[0] is expected[0] and found[1] == expected[1]) if expected else found is None, (glyphs, position)
+
+def test_first_rule_in_lookup_order_wins():
+    broad = ChainRule([frozenset("a")], [frozenset("b")], [], [])
+    narrow = ChainRule([frozenset("a")], [frozenset("b")], [frozenset("c")], [])
+    assert ChainMatcher([broad, narrow]).match(list("abc"), 1, frozenset())[0] is broad
+    assert ChainMatcher([narrow, broad]).match(list("abc"), 1, frozenset())[0] is narrow
+    assert ChainMatcher([narrow, broad]).match(list("abd"), 1, frozenset())[0] is broad
@@ -0,0 +1,51 @@
+"""
+The benchmark history : runs are compared with the last clean run of their backend, and the
+metrics that got worse past the threshold are reported.
+"""
+
+from spetekkimyo import benchmark
+from spetekkimyo.benchmark import compare, find_baseline, format_report, load_history, run_benchmarks
+
+BASELINE = {"cold_build_seconds": 2.0, "shaping_words_per_second": 10000.0, "size:GPOS": 1000, "glyphs": 100}
+
+
+def test_compare():
+    metrics = {"cold_build_seconds": 2.3, "shaping_words_per_second": 7000.0, "size:GPOS": 1400, "glyphs": 200, "new_metric": 1.0}
+    regressions = compare(metrics, BASELINE, threshold=0.2)  # 15% slower builds are within the threshold
+    assert [(regression.metric, round(regression.change, 6)) for regression in regressions] == [("size:GPOS", 0.4), ("shaping_words_per_second", 0.3)]
+    assert compare({"cold_build_seconds": 1.0, "shaping_words_per_second": 20000.0}, BASELINE) == []  # Faster is never a regression
+
+def test_baseline_is_the_last_clean_run_of_the_backend():
+    history = [
+        {"commit": "a", "dirty": False, "backend": "python", "metrics": {}},
+        {"commit": "b", "dirty": False, "backend": "fontforge", "metrics": {}},
+        {"commit": "c", "dirty": True, "backend": "python", "metrics": {}},
+        {"commit": None, "dirty": False, "backend": "python", "metrics": {}},  # Outside of git
+    ]
+    assert find_baseline(history, "python")["commit"] == "a"
+    assert find_baseline(history, "fontforge")["commit"] == "b"
+    assert find_baseline(history, "other") is None
+
+def test_runs_are_recorded_and_compared(tmp_path, monkeypatch):
+    path = tmp_path / "history.jsonl"
+    runs = iter([BASELINE, dict(BASELINE, cold_build_seconds=3.0)])
+    monkeypatch.setattr(benchmark, "measure", lambda backend, repeat: next(runs))
+    monkeypatch.setattr(benchmark, "git_commit", lambda: ("0123456789abcdef", False))
+
+    run, baseline, regressions = run_benchmarks("python", path=path)
+    assert baseline is None and regressions == []
+    assert "No baseline yet" in format_report(run, baseline, regressions)
+
+    run, baseline, regressions = run_benchmarks("python", path=path)
+    assert baseline["metrics"] == BASELINE
+    assert [regression.metric for regression in regressions] == ["cold_build_seconds"]
+    report = format_report(run, baseline, regressions)
+    assert "REGRESSION" in next(line for line in report.splitlines() if line.startswith("cold_build_seconds"))
+    assert "+50.0%" in report and "Baseline : 0123456789ab" in report
+    assert [record["metrics"] for record in load_history(path)] == [BASELINE, dict(BASELINE, cold_build_seconds=3.0)]
+
+def test_unrecorded_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, "measure", lambda backend, repeat: BASELINE)
+    monkeypatch.setattr(benchmark, "git_commit", lambda: (None, False))
+    run_benchmarks("python", record=False, path=tmp_path / "history.jsonl")
+    assert load_history(tmp_path / "history.jsonl") == []
@@ -0,0 +1,37 @@
+"""
+Reproducible builds : the same inputs give the same bytes, however the font was reached.
+"""
+
+import json
+import shutil
+
+from spetekkimyo import config
+from spetekkimyo.backend import get_backend
+
+
+def _build(path, use_cache: bool = True) -> bytes:
+    get_backend("python").build(path, use_cache=use_cache)
+    return path.read_bytes()
+
+def test_clean_builds_are_byte_identical(tmp_path, cache_dir):
+    first = _build(tmp_path / "first" / "test.otf", use_cache=False)
+    second = _build(tmp_path / "second" / "test.otf", use_cache=False)
+    assert first == second
+    assert (tmp_path / "first" / "test.woff").read_bytes() == (tmp_path / "second" / "test.woff").read_bytes()
+
+    cached = _build(tmp_path / "cached" / "test.otf")  # From the glyphs and lookups the clean builds cached
+    assert cached == first
+
+def test_padding_patch_is_byte_identical(tmp_path, cache_dir, monkeypatch):
+    padding_path = tmp_path / "padding.json"
+    shutil.copyfile(config.padding_path, padding_path)
+    monkeypatch.setattr(config, "padding_path", padding_path)
+
+    _build(tmp_path / "patched" / "test.otf")
+    with open(padding_path, 'r') as f: padding = json.load(f)
+    glyph_name = sorted(padding)[0]
+    padding[glyph_name] += 37
+    with open(padding_path, 'w') as f: json.dump(padding, f)
+
+    patched = _build(tmp_path / "patched" / "test.otf")
+    assert patched == _build(tmp_path / "clean" / "test.otf", use_cache=False)
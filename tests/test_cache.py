@@ -0,0 +1,58 @@
+"""
+The build cache : entries are found by the hash of their input, and an output is only fresh
+for the inputs that built it.
+"""
+
+import json
+
+from spetekkimyo.cache import BuildCache, hash_bytes, hash_json
+
+
+def test_glyphs_are_addressed_by_content(tmp_path):
+    cache = BuildCache(tmp_path)
+    source = b"%!PS-Adobe-3.0 EPSF-3.0\n0 0 moveto 10 0 lineto\n"
+    contours = [[[0, 0, True], [10, 0, True], [10, 10, True]]]
+    cache.store_glyph(hash_bytes(source), contours, (0, 0, 10, 10))
+
+    assert BuildCache(tmp_path).load_glyph(hash_bytes(source)) == {"contours": contours, "bbox": [0, 0, 10, 10]}
+    assert cache.load_glyph(hash_bytes(source + b"5 5 lineto\n")) is None  # An edited file is imported again
+
+def test_hashes_ignore_key_order():
+    assert hash_json({"a": 1, "b": [1, 2]}) == hash_json({"b": [1, 2], "a": 1})
+    assert hash_json({"a": 1}) != hash_json({"a": 2})
+
+
+def _record(cache, output, key):
+    output.write_bytes(b"font")
+    cache.record_output(output, key, {"a": hash_bytes(b"a")})
+    cache.save()
+
+def test_output_is_fresh_for_the_same_inputs(tmp_path):
+    output = tmp_path / "test.otf"
+    _record(BuildCache(tmp_path / "cache"), output, "key")
+    cache = BuildCache(tmp_path / "cache")
+    assert cache.output_is_fresh(output, "key")
+    assert not cache.output_is_fresh(output, "other key")  # An input changed
+    assert not cache.output_is_fresh(tmp_path / "other.otf", "key")
+
+def test_touched_or_deleted_output_is_stale(tmp_path):
+    output = tmp_path / "test.otf"
+    cache = BuildCache(tmp_path / "cache")
+    _record(cache, output, "key")
+    output.write_bytes(b"edited font")
+    assert not cache.output_is_fresh(output, "key")
+    output.unlink()
+    assert not cache.output_is_fresh(output, "key")
+
+def test_unreadable_manifest_means_a_full_build(tmp_path):
+    output = tmp_path / "test.otf"
+    cache = BuildCache(tmp_path / "cache")
+    _record(cache, output, "key")
+
+    cache.manifest_path.write_text("{\"version\": ")
+    assert not BuildCache(tmp_path / "cache").output_is_fresh(output, "key")
+    cache.save()
+    manifest = json.loads(cache.manifest_path.read_text())
+    manifest["version"] = -1  # Written by another version of the cache
+    cache.manifest_path.write_text(json.dumps(manifest))
+    assert not BuildCache(tmp_path / "cache").output_is_fresh(output, "key")
@@ -0,0 +1,37 @@
+"""
+Corpus shaping : one JSONL line per record, in input order, however many workers shape them.
+"""
+
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from spetekkimyo.corpus import read_records, shape_corpus
+from spetekkimyo.shape import Shaper
+
+FONT = Path(__file__).resolve().parents[1] / "output" / "test.otf"
+CORPUS = "".join(f"{word}\n" for word in ["kasu", "tua", "", "spetekkimyo", "ka su", "tue"] * 40) + "sui ta"
+
+
+@pytest.fixture(scope="module")
+def shaper():
+    return Shaper.from_font(FONT)
+
+def _shape(shaper, workers):
+    output = io.StringIO()
+    count = shape_corpus(read_records(io.StringIO(CORPUS)), output, shaper, workers=workers, chunk_size=7)
+    return count, output.getvalue()
+
+
+def test_lines_follow_the_records(cache_dir, shaper):
+    count, output = _shape(shaper, workers=1)
+    lines = output.splitlines()
+    assert count == len(lines) == CORPUS.count("\n") + 1  # Empty records are kept
+    for record, line in zip(read_records(io.StringIO(CORPUS)), lines):
+        glyphs = shaper.shape(record)
+        assert json.loads(line) == {"text": record, "width": sum(glyph.x_advance for glyph in glyphs), "glyphs": [list(glyph) for glyph in glyphs]}
+
+def test_pool_output_is_identical(cache_dir, shaper):
+    assert _shape(shaper, workers=3) == _shape(shaper, workers=1)
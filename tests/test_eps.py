@@ -0,0 +1,54 @@
+"""
+The EPS parser : FontForge's glyph exports read into contours and bounding boxes.
+"""
+
+import re
+from pathlib import Path
+
+import pytest
+
+from spetekkimyo.eps import EPSError, bounding_box, load_glyphs, parse_eps_lines
+
+RING = b"""%!PS-Adobe-3.0 EPSF-3.0
+%%BoundingBox: 0 0 400 400
+%%BeginPreview: 2 2 4 2
+%00 moveto curveto
+%%EndPreview
+gsave newpath
+\t200 400 moveto
+\t 310.5 400 400 310.5 400 200 curveto
+\t 400 0 lineto
+\t 0 0 lineto
+\t200 400 lineto
+\tclosepath
+\t100 100 moveto
+\t 100 50 lineto
+fill grestore
+%%EOF
+"""
+GLYPH_DIR = Path(__file__).resolve().parents[1] / "spetekkimyo" / "input" / "glyphs"
+
+
+def test_contours_use_fontforge_point_layout():
+    contours = parse_eps_lines(RING.splitlines(keepends=True))
+    assert contours == [
+        [(200, 400, True), (310.5, 400, False), (400, 310.5, False), (400, 200, True), (400, 0, True), (0, 0, True)],  # Closing point implied
+        [(100, 100, True), (100, 50, True)],  # Left open, kept anyway
+    ]
+
+def test_bounding_box_includes_curve_extrema():
+    bulge = [[(0, 0, True), (100, 200, False), (200, 200, False), (300, 0, True)]]
+    assert bounding_box(bulge) == (0, 0, 300, 150)  # The control points reach 200, the curve 150
+    assert bounding_box([]) == (0, 0, 0, 0)
+
+def test_unsupported_operator():
+    with pytest.raises(EPSError, match=r"glyph.eps:2: unsupported operator 'arc'"):
+        parse_eps_lines([b"0 0 moveto\n", b"0 0 10 0 360 arc\n"], source="glyph.eps")
+
+def test_input_glyphs_match_their_eps_bounding_box():
+    glyphs = load_glyphs(GLYPH_DIR)
+    assert len(glyphs) == len(list(GLYPH_DIR.glob("*.eps")))
+    for name, contours in glyphs.items():
+        if not contours: continue  # space, its box is its width
+        header = re.search(rb"%%BoundingBox: (\S+) (\S+) (\S+) (\S+)", (GLYPH_DIR / (name + ".eps")).read_bytes())
+        assert bounding_box(contours) == pytest.approx(tuple(float(value) for value in header.groups()), abs=0.01), name
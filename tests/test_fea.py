@@ -0,0 +1,44 @@
+"""
+The feature compiler (fea.py, otl.py) and its per-lookup cache.
+"""
+
+from typing import Optional
+
+from spetekkimyo.cache import BuildCache
+from spetekkimyo.fea import parse_features
+from spetekkimyo.otl import build_layout_tables
+
+GLYPH_IDS = {name: gid for gid, name in enumerate([".notdef", "a", "b", "c", "d"])}
+FEATURES = """
+@LEFT = [%s];
+@RIGHT = [c d];
+feature liga {
+    lookup SWAP {
+        sub @LEFT by @RIGHT;
+    } SWAP;
+    lookup %s {
+        sub c by d;
+    } %s;
+} liga;
+"""
+
+
+def _compile(cache: Optional[BuildCache], left: str = "a b", other: str = "KEEP"):
+    return build_layout_tables(parse_features(FEATURES % (left, other, other), GLYPH_IDS), GLYPH_IDS, cache)
+
+def test_only_changed_lookups_are_compiled(cache_dir):
+    cache = BuildCache()
+    tables, compiled = _compile(cache)
+    assert compiled == ["SWAP", "KEEP"]
+    assert _compile(cache) == (tables, [])
+
+    _, compiled = _compile(cache, other="RENAMED")  # Same rules
+    assert compiled == []
+
+def test_redefined_class_recompiles_the_lookup(cache_dir):
+    cache = BuildCache()
+    tables, _ = _compile(cache)
+    reordered, compiled = _compile(cache, left="b a")  # The SWAP block reads the same, but maps a to d now
+    assert compiled == ["SWAP"]
+    assert reordered["GSUB"] != tables["GSUB"]
+    assert reordered == _compile(None, left="b a")[0]
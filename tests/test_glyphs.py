@@ -0,0 +1,42 @@
+"""
+Glyph import : the process pool gives the same glyphs, in the same order, as parsing in process.
+"""
+
+from pathlib import Path
+
+from spetekkimyo.glyphs import PARALLEL_THRESHOLD, clean_contours, correct_directions, import_glyph, import_glyphs
+
+GLYPH_DIR = Path(__file__).resolve().parents[1] / "spetekkimyo" / "input" / "glyphs"
+
+
+def test_pool_import_matches_in_process_import():
+    sources = {path.stem: str(path) for path in sorted(GLYPH_DIR.glob("*.eps"), reverse=True)}
+    assert len(sources) >= PARALLEL_THRESHOLD  # Or the pool is not used
+
+    pooled = import_glyphs(sources, workers=2)
+    assert [glyph.name for glyph in pooled] == sorted(sources)
+    assert [glyph[:3] for glyph in pooled] == [glyph[:3] for glyph in import_glyphs(sources, workers=1)]
+
+def test_clean_contours():
+    square = [(0, 0, True), (0, 0, True), (10, 0, True), (10, 10, True), (0, 10, True), (0, 0, True)]
+    assert clean_contours([square]) == [[(0, 0, True), (10, 0, True), (10, 10, True), (0, 10, True)]]
+    assert clean_contours([[(0, 0, True), (5, 5, True)], [(3, 3, True)]]) == []  # Nothing enclosed
+    lens = [(0, 0, True), (5, 10, False), (10, 10, False)]
+    assert clean_contours([lens]) == [lens]
+
+def test_directions_alternate_with_depth():
+    outer = [(0, 0, True), (0, 10, True), (10, 10, True), (10, 0, True)]  # Clockwise, as FontForge exports them
+    inner = [(3, 3, True), (3, 7, True), (7, 7, True), (7, 3, True)]
+    island = [(4, 4, True), (4, 6, True), (6, 6, True), (6, 4, True)]
+    assert correct_directions([outer, inner, island]) == [
+        [(0, 0, True), (10, 0, True), (10, 10, True), (0, 10, True)],  # Counter-clockwise, from the same start point
+        inner,
+        [(4, 4, True), (6, 4, True), (6, 6, True), (4, 6, True)],
+    ]
+    curve = [(0, 0, True), (0, 5, False), (5, 10, False), (10, 10, True), (10, 0, True)]
+    assert correct_directions([curve]) == [[(0, 0, True), (10, 0, True), (10, 10, True), (5, 10, False), (0, 5, False)]]
+
+def test_rings_keep_their_counter():
+    _, (outer, counter), _, *_ = import_glyph(("c", str(GLYPH_DIR / "c.eps")))
+    assert outer[:2] == [(200, 400, True), (89.6172, 400, False)]  # As FontForge imports it
+    assert counter[:2] == [(200, 320, True), (266.229, 320, False)]
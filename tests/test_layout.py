@@ -0,0 +1,36 @@
+"""
+Merging adjacent lookups : a lookup split in two merges back, and shapes like it did.
+"""
+
+from itertools import product
+
+from spetekkimyo import config
+from spetekkimyo.fea import parse_features
+from spetekkimyo.otf import character_map
+from spetekkimyo.shape import Shaper
+
+LETTERS = "abceopsy"
+SPLIT = "\n        # Implicit 2 Parts"  # Halfway through ETAPE_2_DECOMPOSITION
+
+
+def test_split_lookup_merges_back(glyphs):
+    features = config.feature_path.read_bytes().decode("latin-1")
+    assert features.count(SPLIT) == 1
+    split = features.replace("lookup ETAPE_2_DECOMPOSITION {", "lookup ETAPE_2_HALF {").replace(
+        SPLIT, "\n    } ETAPE_2_HALF;\n\n    lookup ETAPE_2_DECOMPOSITION {\n        lookupflag IgnoreMarks;\n" + SPLIT)
+    names = [glyph.name for glyph in glyphs]
+    original, layout = parse_features(features, names), parse_features(split, names)
+    assert len(layout.lookups) == len(original.lookups) + 1
+
+    merged = layout.merge_lookups()
+    assert [lookup.name for lookup in merged.lookups] == [
+        "ETAPE_2_HALF+ETAPE_2_DECOMPOSITION" if lookup.name == "ETAPE_2_DECOMPOSITION" else lookup.name for lookup in original.lookups
+    ]
+    assert merged.merge_lookups().lookups == merged.lookups  # Nothing left to merge
+    assert len(original.merge_lookups().lookups) == len(original.lookups)
+
+    advances, cmap = {glyph.name: glyph.width for glyph in glyphs}, character_map(names)
+    words = ["".join(letters) for length in (1, 2, 3) for letters in product(LETTERS, repeat=length)]
+    expected = [Shaper(original, advances, cmap).shape(word) for word in words]
+    assert [Shaper(layout, advances, cmap).shape(word) for word in words] == expected
+    assert [Shaper(merged, advances, cmap).shape(word) for word in words] == expected
@@ -0,0 +1,48 @@
+"""
+The python backend's tables, read back with fontTools : what FontForge would have written.
+"""
+
+import io
+
+from fontTools.pens.boundsPen import BoundsPen
+from fontTools.ttLib import TTFont
+
+from spetekkimyo.otf import NOTDEF, build_tables, character_map
+from spetekkimyo.sfnt import build_sfnt
+
+
+def _font(glyphs) -> TTFont:
+    return TTFont(io.BytesIO(build_sfnt(build_tables(glyphs, timestamp=0))))
+
+def _bounds(font: TTFont, name: str):
+    pen = BoundsPen(font.getGlyphSet())
+    font.getGlyphSet()[name].draw(pen)
+    return pen.bounds
+
+
+def test_glyphs_and_metrics(glyphs):
+    font = _font(glyphs)
+    assert font.getGlyphOrder() == [glyph.name for glyph in glyphs]
+    for glyph in glyphs:
+        assert font["hmtx"][glyph.name][0] == glyph.width
+        bounds = _bounds(font, glyph.name)
+        if bounds is None: continue
+        assert font["hmtx"][glyph.name][1] == round(bounds[0])  # Rounded like FontForge, not floored
+        assert all(abs(a - b) < 0.01 for a, b in zip(bounds, glyph.bbox))
+
+def test_notdef_is_fontforge_box(glyphs):
+    font = _font(glyphs)
+    assert font.getGlyphOrder()[0] == NOTDEF
+    assert _bounds(font, NOTDEF) == (50, 0, 450, 533)
+    assert font["hmtx"][NOTDEF] == (500, 50)
+
+def test_vertical_metrics_follow_the_font_bbox(glyphs):
+    font = _font(glyphs)
+    head, hhea, os2 = font["head"], font["hhea"], font["OS/2"]
+    assert (hhea.ascent, hhea.descent, hhea.lineGap) == (head.yMax, head.yMin, 90)
+    assert (os2.usWinAscent, os2.usWinDescent) == (head.yMax, -head.yMin)
+    assert hhea.xMaxExtent == max(round(_bounds(font, glyph.name)[2]) for glyph in glyphs if glyph.contours)
+
+def test_character_map(glyphs):
+    font = _font(glyphs)
+    assert font.getBestCmap() == character_map(glyph.name for glyph in glyphs)
@@ -0,0 +1,71 @@
+"""
+The overflow paths of otl.py (split subtables, Extension lookups) on the real feature file,
+reached by lowering the offset limit instead of growing the font.
+"""
+
+import struct
+from itertools import product
+
+from spetekkimyo import config
+from spetekkimyo.fea import parse_feature_file
+from spetekkimyo.layout import GPOS, GSUB, Layout
+from spetekkimyo.otf import build_tables
+from spetekkimyo.otl import EXTENSION_TYPES, build_layout_tables, read_layout
+from spetekkimyo.sfnt import build_sfnt
+from spetekkimyo.shape import Shaper
+
+PROMOTING_OFFSET = 1024  # Low enough for most GSUB lookups to become Extension lookups
+SPLITTING_OFFSET = 128   # Low enough to split the subtables of single lookups
+CHAIN_SPLITTING_OFFSET = 384  # Chained lookups share their LookupList with the lookups they call
+LETTERS = "abcefhijklnopstuy"
+
+
+def _lookup_types(table: bytes):
+    lookup_list, = struct.unpack_from(">H", table, 8)
+    count, = struct.unpack_from(">H", table, lookup_list)
+    offsets = struct.unpack_from(f">{count}H", table, lookup_list + 2)
+    return [struct.unpack_from(">HHH", table, lookup_list + offset) for offset in offsets]  # type, flag, subtable count
+
+def _build_font(path, glyphs, layout: Layout, max_offset: int):
+    glyph_ids = {glyph.name: gid for gid, glyph in enumerate(glyphs)}
+    layout_tables, _ = build_layout_tables(layout, glyph_ids, max_offset=max_offset)
+    tables = build_tables(glyphs, max_context=layout.max_context)
+    tables.update(layout_tables)
+    with open(path, 'wb') as f: f.write(build_sfnt(tables))
+    return layout_tables
+
+def _canonical(layout: Layout):
+    """Lookups of a layout read back from a font, comparable whatever subtables they came in."""
+    index = {id(lookup): position for position, lookup in enumerate(layout.lookups)}
+    return [(
+        lookup.table, lookup.type, lookup.flag,
+        sorted(lookup.mapping.items(), key=repr),
+        [(rule.backtrack, rule.input, rule.lookahead, [(position, index[id(action)]) for position, action in rule.actions]) for rule in lookup.rules],
+    ) for lookup in layout.lookups]
+
+
+def test_extension_lookups_shape_the_same(tmp_path, glyphs):
+    layout = parse_feature_file(config.feature_path, {glyph.name: gid for gid, glyph in enumerate(glyphs)})
+    _build_font(tmp_path / "plain.otf", glyphs, layout, 0xFFFF)
+    promoted = _build_font(tmp_path / "promoted.otf", glyphs, layout, PROMOTING_OFFSET)
+    assert any(lookup_type == EXTENSION_TYPES[GSUB] for lookup_type, _, _ in _lookup_types(promoted[GSUB]))
+
+    plain, extended = Shaper.from_font(tmp_path / "plain.otf"), Shaper.from_font(tmp_path / "promoted.otf")
+    words = ["".join(letters) for length in (1, 2, 3) for letters in product(LETTERS, repeat=length)]
+    assert [extended.shape(word) for word in words] == [plain.shape(word) for word in words]
+
+def test_split_subtables_read_back_the_same(tmp_path, glyphs):
+    glyph_ids = {glyph.name: gid for gid, glyph in enumerate(glyphs)}
+    names = [glyph.name for glyph in glyphs]
+    layout = parse_feature_file(config.feature_path, glyph_ids)
+    split = 0
+    for lookup in layout.lookups:
+        single = Layout()
+        single.lookups = [lookup]
+        single.features = {key: {system: [lookup]} for key, systems in layout.features.items() for system, lookups in systems.items() if lookup in lookups}
+        plain, _ = build_layout_tables(single, glyph_ids)
+        small, _ = build_layout_tables(single, glyph_ids, max_offset=CHAIN_SPLITTING_OFFSET if lookup.nested else SPLITTING_OFFSET)
+        assert _canonical(read_layout(small, names)) == _canonical(read_layout(plain, names)), lookup.name
+        table = GSUB if GSUB in plain else GPOS
+        split += _lookup_types(small[table])[0][2] > _lookup_types(plain[table])[0][2]
+    assert split  # Some lookups did have to be split
@@ -0,0 +1,75 @@
+"""
+Patching a built font : the tables a patch writes are the ones a clean build of the same
+inputs writes, and fonts a patch cannot vouch for are built again.
+"""
+
+import json
+import shutil
+
+import pytest
+
+from spetekkimyo import config
+from spetekkimyo.backend import get_backend
+from spetekkimyo.sfnt import read_font
+
+
+@pytest.fixture
+def inputs(tmp_path, monkeypatch):
+    """Copies of padding.json and features.fea, the builds read them instead."""
+    for name in ("padding_path", "feature_path"):
+        path = tmp_path / "input" / getattr(config, name).name
+        path.parent.mkdir(exist_ok=True)
+        shutil.copyfile(getattr(config, name), path)
+        monkeypatch.setattr(config, name, path)
+    return tmp_path / "input"
+
+def _edit_padding(change: float):
+    with open(config.padding_path, 'r') as f: padding = json.load(f)
+    padding[sorted(padding)[0]] += change
+    with open(config.padding_path, 'w') as f: json.dump(padding, f)
+
+def _build(path, capsys, use_cache=True):
+    get_backend("python").build(path, use_cache=use_cache)
+    return read_font(path)[1], capsys.readouterr().out
+
+def _without_head(tables):
+    return {tag: table for tag, table in tables.items() if tag != "head"}  # Its timestamps are the ones of the first build
+
+
+def test_padding_patch_matches_a_clean_build(tmp_path, cache_dir, inputs, capsys):
+    _build(tmp_path / "patched" / "test.otf", capsys)
+    _edit_padding(37)
+    patched, output = _build(tmp_path / "patched" / "test.otf", capsys)
+    assert "Patched" in output
+    clean, _ = _build(tmp_path / "clean" / "test.otf", capsys, use_cache=False)
+    assert _without_head(patched) == _without_head(clean)
+
+def test_feature_patch_matches_a_clean_build(tmp_path, cache_dir, inputs, capsys):
+    _build(tmp_path / "patched" / "test.otf", capsys)
+    features = config.feature_path.read_bytes()
+    config.feature_path.write_bytes(features.replace(b"pos [_a _o] [a_ o_] -80;", b"pos [_a _o] [a_ o_] -60;"))
+    _edit_padding(37)  # Both at once
+    patched, output = _build(tmp_path / "patched" / "test.otf", capsys)
+    assert "Patched" in output and "GPOS" in output
+    assert "Compiled 1 lookups" in output  # The kerning one, the others come from the cache
+    clean, _ = _build(tmp_path / "clean" / "test.otf", capsys, use_cache=False)
+    assert _without_head(patched) == _without_head(clean)
+
+def test_modified_font_is_built_again(tmp_path, cache_dir, inputs, capsys):
+    font_path = tmp_path / "test.otf"
+    _build(font_path, capsys)
+    with open(font_path, 'ab') as f: f.write(b"\0")
+    _edit_padding(37)
+    _, output = _build(font_path, capsys)
+    assert "Patched" not in output and "Font generated" in output
+
+def test_glyph_changes_are_built_again(tmp_path, cache_dir, inputs, capsys, monkeypatch):
+    glyph_dir = tmp_path / "glyphs"
+    shutil.copytree(config.glyph_dir, glyph_dir)
+    monkeypatch.setattr(config, "glyph_dir", glyph_dir)
+    font_path = tmp_path / "test.otf"
+    _build(font_path, capsys)
+    _edit_padding(37)
+    (glyph_dir / "c.eps").write_bytes((glyph_dir / "c.eps").read_bytes().replace(b"200 400 moveto", b"200 401 moveto", 1))
+    _, output = _build(font_path, capsys)
+    assert "Patched" not in output and "Font generated" in output
@@ -0,0 +1,44 @@
+"""
+Build profiles : the phases and per glyph steps of a build, as a Chrome trace and as a summary.
+"""
+
+import json
+
+from spetekkimyo import config
+from spetekkimyo.backend import get_backend
+from spetekkimyo.profiling import GLYPH, PHASE, BuildProfile
+
+
+def test_build_profile(tmp_path, cache_dir):
+    profile = get_backend("python").build(tmp_path / "test.otf", use_cache=False)
+    phases = [event["name"] for event in profile.events if event["category"] == PHASE]
+    assert {"collect inputs", "load glyphs", "compile features", "build tables", "write"} <= set(phases)
+    assert phases.index("load glyphs") < phases.index("compile features") < phases.index("write")
+
+    glyph_count = len(list(config.glyph_dir.glob("*.eps")))
+    parsed = [event for event in profile.events if event["category"] == GLYPH and event["name"] == "eps parse"]
+    assert sorted(event["args"]["glyph"] for event in parsed) == sorted(path.stem for path in config.glyph_dir.glob("*.eps"))
+    assert [row.count for row in profile.summary(GLYPH)] == [glyph_count, glyph_count]
+
+    # Up to date, only the freshness check is left
+    assert [event["name"] for event in get_backend("python").build(tmp_path / "test.otf").events] == ["collect inputs"]
+
+def test_trace_and_summary():
+    profile = BuildProfile()
+    profile.add("write", 100.5, 0.25)
+    profile.add("load glyphs", 100.0, 0.5)
+    profile.add("eps parse", 100.1, 0.01, GLYPH, pid=7, tid=7, glyph="a")
+    profile.add("eps parse", 100.2, 0.03, GLYPH, pid=8, tid=8, glyph="b")
+    profile = BuildProfile.from_dict(json.loads(json.dumps(profile.to_dict())))  # As sent by the worker
+
+    trace = json.loads(json.dumps(profile.chrome_trace()))
+    events = trace["traceEvents"]
+    assert [event["name"] for event in events] == ["load glyphs", "eps parse", "eps parse", "write"]
+    assert events[0] | {"pid": 0, "tid": 0} == {"name": "load glyphs", "cat": PHASE, "ph": "X", "ts": 100000000.0, "dur": 500000.0, "pid": 0, "tid": 0, "args": {}}
+    assert [event["pid"] for event in events[1:3]] == [7, 8]
+
+    assert [(row.name, row.count) for row in profile.summary()] == [("load glyphs", 1), ("write", 1)]
+    row, = profile.summary(GLYPH)
+    assert (row.count, round(row.total, 6), round(row.mean, 6), row.max) == (2, 0.04, 0.02, 0.03)
+    assert profile.slowest_glyphs(1)[0]["args"] == {"glyph": "b"}
+    assert "Slowest glyphs : b (eps parse, 30.0 ms)" in profile.format_summary()
@@ -0,0 +1,48 @@
+"""
+Published fonts : copies named after their content, a manifest pointing at the current ones,
+and only the last KEPT_VERSIONS copies kept.
+"""
+
+import json
+
+from spetekkimyo.cache import hash_bytes
+from spetekkimyo.publish import HASH_LENGTH, KEPT_VERSIONS, hashed_name, is_hashed, publish_font, read_manifest
+
+
+def _publish(font_path, data: bytes):
+    font_path.write_bytes(data)
+    font_path.with_suffix(".woff").write_bytes(b"wOFF" + data)
+    return publish_font(font_path)
+
+def test_copies_and_manifest(tmp_path):
+    font_path = tmp_path / "test.otf"
+    files = _publish(font_path, b"first")
+    digest = hash_bytes(b"first")[:HASH_LENGTH]
+    assert files == {"otf": f"test.{digest}.otf", "woff": f"test.{digest}.woff"}
+    assert (tmp_path / files["otf"]).read_bytes() == b"first"
+    assert (tmp_path / files["woff"]).read_bytes() == b"wOFFfirst"
+    assert all(is_hashed(name) for name in files.values()) and not is_hashed("test.otf")
+    assert read_manifest(tmp_path)["fonts"] == {"test": {"hash": digest, "files": files, "history": [digest]}}
+
+    manifest = (tmp_path / "fonts.json").stat().st_mtime_ns
+    assert publish_font(font_path) == files
+    assert (tmp_path / "fonts.json").stat().st_mtime_ns == manifest  # Current already, nothing written
+
+def test_old_copies_are_removed(tmp_path):
+    font_path = tmp_path / "test.otf"
+    versions = [f"version {i}".encode() for i in range(KEPT_VERSIONS + 2)]
+    for data in versions: _publish(font_path, data)
+    kept = [hash_bytes(data)[:HASH_LENGTH] for data in reversed(versions[-KEPT_VERSIONS:])]
+    assert read_manifest(tmp_path)["fonts"]["test"]["history"] == kept
+    assert sorted(path.name for path in tmp_path.iterdir() if is_hashed(path.name)) == sorted(
+        hashed_name(tmp_path / name, digest) for digest in kept for name in ("test.otf", "test.woff")
+    )
+
+    _publish(font_path, versions[-2])  # Back to a kept version, it comes first again
+    assert read_manifest(tmp_path)["fonts"]["test"]["history"] == [kept[1], kept[0], kept[2]]
+
+def test_outdated_manifest(tmp_path):
+    (tmp_path / "fonts.json").write_text(json.dumps({"version": 0, "fonts": {"old": {}}}))
+    assert read_manifest(tmp_path) == {"version": 1, "fonts": {}}
+    (tmp_path / "fonts.json").write_text("{")
+    assert read_manifest(tmp_path)["fonts"] == {}
@@ -0,0 +1,68 @@
+"""
+The rasterizer : coverage of simple shapes, exact horizontally, and the bitmaps of shaped runs.
+"""
+
+import math
+import struct
+import zlib
+
+import numpy as np
+
+from spetekkimyo.raster import Rasterizer, encode_png, flatten, rasterize
+from spetekkimyo.shape import ShapedGlyph
+
+
+def square(x0, y0, x1, y1, clockwise=False):
+    """Contour of a box in font units, counter-clockwise (ink) by default."""
+    points = [(x0, y0, True), (x1, y0, True), (x1, y1, True), (x0, y1, True)]
+    return points[::-1] if clockwise else points
+
+def draw(contours, width=10, height=10):
+    """Bitmap of contours at one pixel per unit, the baseline at the bottom of the bitmap."""
+    return rasterize(flatten(contours, 1.0) + [0, height, 0, height], width, height)
+
+
+def test_aligned_square_is_exact():
+    bitmap = draw([square(2, 3, 6, 8)])
+    expected = np.zeros((10, 10), np.uint8)
+    expected[2:7, 2:6] = 255
+    assert np.array_equal(bitmap, expected)
+
+def test_partial_pixels_are_exact_horizontally():
+    bitmap = draw([square(2.25, 0, 4.5, 10)])
+    assert list(bitmap[5, 1:6]) == [0, 191, 255, 128, 0]  # Pixels 1 to 5, the box spans 2.25 to 4.5
+    assert np.all(bitmap == bitmap[5])
+
+def test_nonzero_winding():
+    overlapping = draw([square(1, 1, 6, 6), square(4, 4, 9, 9)])
+    assert overlapping.max() == 255 and overlapping[5, 4] == 255  # Where both boxes are, not twice the ink
+    hollow = draw([square(1, 1, 9, 9), square(3, 3, 7, 7, clockwise=True)])
+    assert hollow[5, 5] == 0 and hollow[8, 1] == 255
+
+def test_curves_cover_their_area():
+    k = 4 * (math.sqrt(2) - 1) / 3  # Control point distance of a quarter circle
+    r, c = 40, 50
+    circle = [(c + r, c, True)]
+    for (x0, y0), (x1, y1) in [((1, 0), (0, 1)), ((0, 1), (-1, 0)), ((-1, 0), (0, -1)), ((0, -1), (1, 0))]:
+        circle += [(c + r * (x0 - k * y0), c + r * (y0 + k * x0), False), (c + r * (x1 + k * y1), c + r * (y1 - k * x1), False), (c + r * x1, c + r * y1, True)]
+    circle.pop()
+    area = draw([circle], 100, 100).sum() / 255
+    assert abs(area - math.pi * r * r) < 0.005 * math.pi * r * r
+
+
+def test_runs_span_their_advances():
+    rasterizer = Rasterizer({"box": [square(100, 0, 400, 500)]}, size=10, units_per_em=1000, ascent=800, descent=200)
+    run = [ShapedGlyph("box", 0, 500, 0, 0, 0), ShapedGlyph("space", 1, 500, 0, 0, 0), ShapedGlyph("box", 2, 500, 0, -100, 0)]
+    bitmap = rasterizer.render_run(run)
+    assert bitmap.shape == (10, 15)  # Ascent to descent, the three advances
+    assert bitmap[:, :5].sum() == 15 * 255 and bitmap[:, 5:10].sum() == 0
+    assert np.array_equal(bitmap[:, 10:], np.roll(bitmap[:, :5], -1, axis=1))  # Moved by its offset only
+
+def test_png():
+    bitmap = draw([square(2, 3, 6, 8)])
+    png = encode_png(bitmap)
+    assert png[:8] == b"\x89PNG\r\n\x1a\n"
+    assert struct.unpack(">II", png[16:24]) == (10, 10)
+    length, = struct.unpack(">I", png[33:37])
+    rows = np.frombuffer(zlib.decompress(png[41:41 + length]), np.uint8).reshape(10, 11)
+    assert np.array_equal(255 - rows[:, 1:], bitmap)  # Ink in black
@@ -0,0 +1,43 @@
+"""
+The regression suite : the references match the font they were made from, and words whose
+bitmap moved are reported.
+"""
+
+from pathlib import Path
+
+from spetekkimyo.backend import get_backend
+from spetekkimyo.regression import CHANGED, NEW, UNCHANGED, RegressionSuite, load_references, sample_words
+
+FONT = Path(__file__).resolve().parents[1] / "output" / "test.otf"  # The references were rendered from it
+
+
+def test_reference_font_is_unchanged(cache_dir):
+    suite = RegressionSuite(FONT)
+    results = suite.run(sample_words(), load_references())
+    assert results and all(result.status == UNCHANGED for result in results)
+    assert suite.rendered == 0  # Same run hashes, nothing to render
+
+def test_python_build_matches_the_references(tmp_path, cache_dir):
+    get_backend("python").build(tmp_path / "test.otf")
+    results = RegressionSuite(tmp_path / "test.otf").run(sample_words(), load_references())
+    assert [result.word for result in results if result.status != UNCHANGED] == []
+
+def test_new_words_become_references(tmp_path, cache_dir):
+    directory = tmp_path / "references"
+    suite = RegressionSuite(FONT)
+    results = suite.run(["tua", "kasu"], {}, directory)
+    assert [result.status for result in results] == [NEW, NEW]
+
+    suite.update(results, directory)
+    assert load_references(directory) == {result.word: result.run_key for result in results}
+    assert sorted(path.stem for path in directory.glob("*.png")) == sorted(result.run_key for result in results)
+    assert [result.status for result in suite.run(["tua", "kasu"], load_references(directory), directory)] == [UNCHANGED, UNCHANGED]
+
+def test_changed_words_are_scored(cache_dir):
+    references = load_references()
+    word, other = sorted(references)[:2]
+    swapped = {word: references[other]}  # As if the font drew word the way it draws other
+    result, = RegressionSuite(FONT).run([word], swapped)
+    assert result.status == CHANGED and result.score > 0 and result.pixels > 0
+    result, = RegressionSuite(FONT, threshold=1.0).run([word], swapped)
+    assert result.status == UNCHANGED
@@ -0,0 +1,79 @@
+"""
+The preview server : what it serves, what it refuses and /shape requests, over a real socket.
+"""
+
+import http.client
+import asyncio
+import json
+import shutil
+import socket
+from pathlib import Path
+
+import pytest
+
+from spetekkimyo.server import PreviewServer
+from spetekkimyo.shape import Shaper
+
+FONT = Path(__file__).resolve().parents[1] / "output" / "test.otf"
+
+
+@pytest.fixture
+def server(tmp_path, cache_dir):
+    (tmp_path / "index.html").write_text("<html></html>")
+    (tmp_path / "secret.txt").write_text("secret")
+    (tmp_path / "output").mkdir()
+    (tmp_path / "output" / ".hidden").write_text("hidden")
+    shutil.copy(FONT, tmp_path / "output" / "test.otf")
+    server = PreviewServer(tmp_path, tmp_path / "output" / "test.otf")
+    loop = server.start_in_thread(port=0)
+    yield server
+    asyncio.run_coroutine_threadsafe(shutdown(server), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+async def shutdown(server):
+    """Stop listening and end the connections still open, before the loop stops."""
+    server._server.close()
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks: task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def request(server, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+    connection.request(method, path, body)
+    response = connection.getresponse()
+    result = response.status, response.read()
+    connection.close()
+    return result
+
+def raw_request(server, head: bytes) -> bytes:
+    with socket.create_connection(("127.0.0.1", server.port), timeout=10) as connection:
+        connection.sendall(head)
+        return connection.makefile('rb').read()  # The server closes the connection
+
+
+def test_page_and_output_are_served(server):
+    assert request(server, "GET", "/") == (200, b"<html></html>")
+    status, body = request(server, "GET", "/output/test.otf")
+    assert status == 200 and body == FONT.read_bytes()
+
+@pytest.mark.parametrize("path", ["/secret.txt", "/../secret.txt", "/output/../secret.txt", "/output/%2e%2e/secret.txt",
+                                  "/output/..%5csecret.txt", "/output/.hidden", "/%2e%2e/%2e%2e/etc/passwd"])
+def test_other_paths_are_refused(server, path):
+    assert request(server, "GET", path)[0] == 404
+
+@pytest.mark.parametrize("length", [b"abc", b"-5", b"1e3"])
+def test_malformed_content_length_is_refused(server, length):
+    response = raw_request(server, b"POST /shape HTTP/1.1\r\nHost: localhost\r\nContent-Length: " + length + b"\r\n\r\n{}")
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"Invalid Content-Length" in response
+
+def test_shape_requests(server):
+    status, body = request(server, "POST", "/shape", json.dumps({"texts": ["kasu", "tua"]}))
+    assert status == 200
+    shaper = Shaper.from_font(FONT)
+    results = json.loads(body)["results"]
+    assert [result["text"] for result in results] == ["kasu", "tua"]
+    assert [result["glyphs"] for result in results] == [[list(glyph) for glyph in shaper.shape(text)] for text in ["kasu", "tua"]]
+    assert request(server, "POST", "/shape", "not json")[0] == 400
+    assert request(server, "POST", "/shape", json.dumps({"texts": "kasu"}))[0] == 400
+    assert request(server, "GET", "/shape")[0] == 405
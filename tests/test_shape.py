@@ -0,0 +1,45 @@
+"""
+The shaper : the font FontForge built and the feature file it was built from shape text the same way.
+"""
+
+import random
+from pathlib import Path
+
+import pytest
+
+from spetekkimyo.shape import Shaper
+
+FONT = Path(__file__).resolve().parents[1] / "output" / "test.otf"  # Built by FontForge
+
+
+def sample_words(letters: str, count: int = 2000):
+    rng = random.Random(0)
+    syllables = [consonant + vowel for consonant in "tkslmnphbdfj" for vowel in "aeiou"] + list("aeiou")
+    words = ["".join(rng.choice(letters) for _ in range(rng.randint(1, 8))) for _ in range(count)]
+    words += ["".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))) for _ in range(count)]
+    return words + [" ".join(words[i:i + 3]) for i in range(0, 300, 3)]
+
+@pytest.fixture(scope="module")
+def font_shaper():
+    return Shaper.from_font(FONT)
+
+
+def test_font_and_features_shape_alike(cache_dir, font_shaper):
+    shaper = Shaper.from_features()
+    letters = "".join(sorted(chr(codepoint) for codepoint in font_shaper.cmap))
+    for word in sample_words(letters):
+        assert shaper.shape(word) == font_shaper.shape(word), word
+
+def test_substitutions_keep_their_clusters(font_shaper):
+    glyphs = font_shaper.shape("taa")
+    assert [glyph.name for glyph in glyphs] == ["ta_", "_a", "a_", "_a"]
+    assert [glyph.cluster for glyph in glyphs] == [0, 0, 2, 2]  # "ta" and the last "a" became two glyphs each
+    assert [glyph.x_advance for glyph in glyphs] == [300, 275 - 80, 275, 275]  # pos [_a _o] [a_ o_] -80
+
+def test_unmapped_characters(font_shaper):
+    glyphs = font_shaper.shape("t一")
+    assert glyphs[-1].name == ".notdef" and glyphs[-1].cluster == 1
+
+def test_no_features(font_shaper):
+    plain = Shaper(font_shaper.layout, font_shaper.advances, font_shaper.cmap, features=())
+    assert [glyph.name for glyph in plain.shape("taa")] == ["t", "a", "a"]
@@ -0,0 +1,72 @@
+"""
+The shaping cache : runs read back as shaped, from memory or from disk, across growths of
+the index, other processes and crashed writers.
+"""
+
+import json
+
+import pytest
+
+from spetekkimyo import shapecache
+from spetekkimyo.shape import ShapedGlyph, Shaper
+from spetekkimyo.shapecache import RECORD, RunLog, ShapeCache, decode_run, encode_run
+
+WORDS = ["kasu", "tua", "spetekkimyo", "ka su", "", "kasu"]
+
+
+@pytest.fixture(scope="module")
+def shaper():
+    return Shaper.from_features()
+
+
+def test_encoded_runs_are_compact_json():
+    run = (ShapedGlyph("k", 0, 480, 0, 0, 0), ShapedGlyph("_aé", 1, -12, 3, -4, 5))
+    assert encode_run(run) == json.dumps([list(glyph) for glyph in run], ensure_ascii=False, separators=(",", ":")).encode()
+    assert decode_run(encode_run(run)) == run
+
+def test_runs_come_back_from_memory_then_disk(cache_dir, shaper):
+    cache = ShapeCache.for_shaper(shaper)
+    expected = [tuple(shaper.shape(word)) for word in WORDS]
+    assert cache.shape_many(shaper, WORDS) == expected
+    assert cache.misses == len(set(WORDS))
+    assert cache.shape_many(shaper, WORDS) == expected
+    assert cache.memory_hits == len(set(WORDS))  # Counted once per text asked
+    cache.close()
+
+    assert (cache_dir / shapecache.SHAPING_FOLDER / shaper.font_hash).is_dir()  # Under the cache folder of the moment
+    cache = ShapeCache.for_shaper(shaper)  # As another process would
+    assert cache.shape_many(shaper, WORDS) == expected
+    assert (cache.disk_hits, cache.misses) == (len(set(WORDS)), 0)
+    cache.close()
+
+def test_other_features_are_other_runs(cache_dir, shaper):
+    cache = ShapeCache.for_shaper(shaper)
+    cache.put_many({"kasu": ()})
+    other = ShapeCache(shaper.font_hash, features=["kern"])
+    assert other.get("kasu") is None
+    cache.close()
+    other.close()
+
+
+def test_index_grows_under_readers(tmp_path, monkeypatch):
+    monkeypatch.setattr(shapecache, "INITIAL_CAPACITY", 8)
+    writer, reader = RunLog(tmp_path), RunLog(tmp_path)
+    items = {f"key {i}".encode(): f"value {i}".encode() for i in range(500)}
+    for start in range(0, len(items), 50):
+        writer.put_many(dict(list(items.items())[start:start + 50]))
+        assert reader.get_many(items) == dict(list(items.items())[:start + 50])  # Switches to the larger index
+    assert len(writer) == len(reader) == len(items)
+    assert len(list(tmp_path.glob('runs.*.idx'))) == 1
+    writer.close()
+    reader.close()
+
+def test_records_left_by_a_crash_are_recovered(tmp_path):
+    log = RunLog(tmp_path)
+    log.put_many({b"indexed": b"1"})
+    with open(tmp_path / 'runs.log', 'ab') as f:
+        f.write(RECORD.pack(len(b"unindexed"), 1) + b"unindexed" + b"2")  # Written, then the writer died
+        f.write(RECORD.pack(100, 100) + b"half")
+    log.put_many({b"next": b"3"})
+    assert log.get_many([b"indexed", b"unindexed", b"next"]) == {b"indexed": b"1", b"unindexed": b"2", b"next": b"3"}
+    assert len(log) == 3
+    log.close()
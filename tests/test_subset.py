@@ -0,0 +1,33 @@
+"""
+Subsets : the words of the text shape in the subset like they do in the full font.
+"""
+
+from itertools import product
+from pathlib import Path
+
+from fontTools.ttLib import TTFont
+
+from spetekkimyo.shape import Shaper
+from spetekkimyo.subset import page_text, subset_font
+
+FONT = Path(__file__).resolve().parents[1] / "output" / "test.otf"
+LETTERS = "aostu"
+
+
+def test_subset_shapes_the_same(tmp_path):
+    words = ["".join(letters) for length in (1, 2, 3) for letters in product(LETTERS, repeat=length)] + ["kasu", "taa"]
+    path = tmp_path / "subset.otf"
+    path.write_bytes(subset_font(FONT, " ".join(words)))
+
+    full, subset = Shaper.from_font(FONT), Shaper.from_font(path)
+    assert [subset.shape(word) for word in words] == [full.shape(word) for word in words]
+    assert len(subset.advances) < len(full.advances)
+    assert [glyph.name for glyph in subset.shape("b")] == [".notdef"]  # Not in the text
+
+    font = TTFont(path)
+    assert font.getGlyphOrder()[0] == ".notdef" and set(font.getGlyphOrder()) == set(subset.advances)
+
+def test_page_text(tmp_path):
+    page = tmp_path / "index.html"
+    page.write_text("<html><style>p { color: red; }</style><p>kasu &amp; <b>taa</b></p><script>var x = 'b';</script></html>", encoding="utf-8")
+    assert page_text(page) == "kasu & taa"
@@ -0,0 +1,45 @@
+"""
+Synthetic inputs : reproducible from their seed, built and shaped in a process of their own.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from spetekkimyo.cache import CACHE_VARIABLE
+from spetekkimyo.config import INPUT_VARIABLE
+from spetekkimyo.shape import Shaper
+from spetekkimyo.synthetic import FIRST_CODEPOINT, format_results, write_inputs
+
+PROJECT_DIR = Path(__file__).resolve().parents[1]
+
+
+def _files(directory: Path):
+    return {path.relative_to(directory).as_posix(): path.read_bytes() for path in sorted(directory.rglob("*")) if path.is_file()}
+
+def test_inputs_follow_their_seed(tmp_path):
+    counts = write_inputs(tmp_path / "first", 400)
+    write_inputs(tmp_path / "second", 400)
+    assert _files(tmp_path / "first") == _files(tmp_path / "second")
+    write_inputs(tmp_path / "other", 400, seed=1)
+    assert _files(tmp_path / "other") != _files(tmp_path / "first")
+
+    assert counts["glyphs"] == len(list((tmp_path / "first" / "input" / "glyphs").glob("*.eps")))
+    assert abs(counts["glyphs"] - 400) <= counts["letters"]
+
+def test_scale_is_built_and_shaped_apart(tmp_path):
+    counts = write_inputs(tmp_path, 400)
+    environment = {INPUT_VARIABLE: str(tmp_path / "input"), CACHE_VARIABLE: str(tmp_path / "cache")}
+    completed = subprocess.run([sys.executable, "-m", "spetekkimyo.synthetic", str(tmp_path), "python"], cwd=PROJECT_DIR,
+                               env={**os.environ, **environment}, stdout=subprocess.PIPE, text=True, check=True)
+    result = json.loads(completed.stdout.splitlines()[-1])
+    assert "error" not in result
+    assert {key: result[key] for key in counts} == counts
+    assert result["shaping_words_per_second"] > 0 and result["font_size"] == (tmp_path / "font.otf").stat().st_size
+    assert (tmp_path / "cache").is_dir()  # Not the real build cache
+
+    shaper = Shaper.from_font(tmp_path / "font.otf")
+    assert [glyph.name for glyph in shaper.shape(chr(FIRST_CODEPOINT))] == ["l0_", "_l0"]  # ETAPE_2_DECOMPOSITION
+    assert format_results([result]).splitlines()[1].split()[:2] == [str(counts["glyphs"]), str(counts["rules"])]
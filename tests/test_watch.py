@@ -0,0 +1,113 @@
+"""
+Watch mode : edits are built once they settle, edits during a build cancel it.
+"""
+
+import threading
+import time
+
+import pytest
+
+from spetekkimyo import backend, watch
+from spetekkimyo.backend import Backend, get_backend
+from spetekkimyo.worker import BuildCancelled
+
+DEBOUNCE = 0.3
+INTERVAL = 0.02
+
+
+class RecordingBackend(Backend):
+    """Builds that take duration seconds unless cancelled, counted."""
+
+    name = "recording"
+
+    def __init__(self, duration: float = 0):
+        self.duration = duration
+        self.builds = []  # "done" or "cancelled", one per build
+        self._cancelled = threading.Event()
+
+    def build(self, output_path, use_cache=True):
+        self._cancelled.clear()
+        self.builds.append("running")
+        if self._cancelled.wait(self.duration):
+            self.builds[-1] = "cancelled"
+            raise BuildCancelled(str(output_path))
+        self.builds[-1] = "done"
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def watching(tmp_path, monkeypatch):
+    """Start watch() on a single input file with the given backend, stop it afterwards."""
+    input_path = tmp_path / "features.fea"
+    input_path.write_text("")
+    monkeypatch.setattr(watch, "watched_paths", [input_path])
+    stop = threading.Event()
+    threads = []
+
+    def start(builder: Backend):
+        monkeypatch.setattr(watch, "get_backend", lambda name: builder)
+        thread = threading.Thread(target=watch.watch, args=(tmp_path / "test.otf",),
+                                  kwargs={"port": 0, "debounce": DEBOUNCE, "interval": INTERVAL, "stop": stop})
+        thread.start()
+        threads.append((thread, builder))
+        return input_path
+
+    yield start
+    stop.set()
+    for thread, builder in threads:
+        thread.join()
+        builder.cancel()
+
+def _edit(path, count: int, delay: float) -> None:
+    for _ in range(count):
+        path.write_text("#" * (len(path.read_text()) + 1))  # A new size, whatever the mtime resolution
+        time.sleep(delay)
+
+
+def test_edits_are_built_once_settled(watching):
+    builder = RecordingBackend()
+    input_path = watching(builder)
+    _wait_for(lambda: builder.builds == ["done"])  # Built on start
+    time.sleep(DEBOUNCE)  # The build starts before watch() takes its first snapshot
+
+    _edit(input_path, 5, DEBOUNCE / 5)  # A burst shorter than the debounce delay between edits
+    assert builder.builds == ["done"]
+    _wait_for(lambda: len(builder.builds) == 2)
+    time.sleep(DEBOUNCE * 2)
+    assert builder.builds == ["done", "done"]
+
+def test_edits_cancel_the_running_build(watching):
+    builder = RecordingBackend(duration=10)
+    input_path = watching(builder)
+    _wait_for(lambda: builder.builds == ["running"])
+
+    # Until one is seen, the build starts before watch() takes its first snapshot
+    _wait_for(lambda: _edit(input_path, 1, INTERVAL * 2) or builder.builds[0] == "cancelled")
+    _wait_for(lambda: builder.builds == ["cancelled", "running"])  # Rebuilt once the edit settled
+
+
+def test_python_build_is_cancelled_between_phases(tmp_path, cache_dir, monkeypatch):
+    builder = get_backend("python")
+    load_glyphs = backend.load_glyphs
+
+    def cancelled_while_loading(*args):
+        builder.cancel()  # As watch.py would, from its own thread
+        return load_glyphs(*args)
+
+    monkeypatch.setattr(backend, "load_glyphs", cancelled_while_loading)
+    with pytest.raises(BuildCancelled):
+        builder.build(tmp_path / "test.otf")
+    assert not (tmp_path / "test.otf").exists()
+
+    monkeypatch.setattr(backend, "load_glyphs", load_glyphs)
+    builder.cancel()  # Nothing running, the next build is not affected
+    builder.build(tmp_path / "test.otf")
+    assert (tmp_path / "test.otf").is_file()
@@ -0,0 +1,43 @@
+"""
+WOFF files : smaller than the font, read by fontTools, and the font comes back out of them
+byte for byte.
+"""
+
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from fontTools.ttLib import TTFont
+
+from spetekkimyo.backend import get_backend
+from spetekkimyo.sfnt import SFNTError, build_woff, read_tables, woff_path
+
+FONT = Path(__file__).resolve().parents[1] / "output" / "test.otf"
+
+
+def test_font_comes_back_out():
+    data = FONT.read_bytes()
+    woff = build_woff(data)
+    assert len(woff) < len(data)
+    assert read_tables(woff) == read_tables(data)
+
+    font = TTFont(BytesIO(woff), recalcTimestamp=False, recalcBBoxes=False)
+    assert font.flavor == "woff"
+    font.flavor = None
+    unwrapped = BytesIO()
+    font.save(unwrapped, reorderTables=False)  # Table checksums and order from the WOFF directory
+    assert unwrapped.getvalue() == data
+
+@pytest.mark.parametrize("cut", [1, 100])
+def test_truncated_woff(cut):
+    with pytest.raises(SFNTError): read_tables(build_woff(FONT.read_bytes())[:-cut])
+
+def test_builds_write_the_woff(tmp_path, cache_dir):
+    font_path = tmp_path / "test.otf"
+    get_backend("python").build(font_path)
+    assert woff_path(font_path) == tmp_path / "test.woff"
+    assert woff_path(font_path).read_bytes() == build_woff(font_path.read_bytes())
+
+    woff_path(font_path).unlink()
+    get_backend("python").build(font_path)  # Up to date, only the WOFF is missing
+    assert woff_path(font_path).read_bytes() == build_woff(font_path.read_bytes())
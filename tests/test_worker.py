@@ -0,0 +1,70 @@
+"""
+The build worker protocol, with a worker side serving a stand-in for generate.build (which
+needs FontForge) : jobs, cancelling, restarts.
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from spetekkimyo.worker import BuildCancelled, BuildWorker, WorkerCrashed
+
+WORKER_SCRIPT = '''
+import os, sys, time
+sys.path.insert(0, {root!r})
+from spetekkimyo import worker
+
+def build(output_path, use_cache, profile, cancelled):
+    if output_path.name == "crash.otf": os._exit(1)
+    with profile.phase("build"):
+        for _ in range(200):  # 10 s, unless cancelled
+            time.sleep(0.05)
+            if cancelled.is_set(): raise worker.BuildCancelled("Build cancelled")
+            if output_path.name == "quick.otf": break
+    output_path.write_bytes(b"font")
+    print("Font generated at", output_path)
+
+worker.serve(build)
+'''
+
+
+@pytest.fixture
+def worker(tmp_path):
+    script = tmp_path / "worker.py"
+    script.write_text(WORKER_SCRIPT.format(root=str(Path(__file__).resolve().parents[1])))
+    worker = BuildWorker(command=[sys.executable, str(script)])
+    yield worker
+    worker.close()
+
+
+def test_jobs_run_on_the_same_worker(tmp_path, worker):
+    result = worker.build(tmp_path / "quick.otf")
+    assert result["ok"] and "Font generated" in result["stdout"] and "build" in str(result["profile"])
+    process = worker.process
+    assert worker.build(tmp_path / "quick.otf")["ok"]
+    assert worker.process is process
+
+def test_cancel_raises_and_keeps_the_worker(tmp_path, worker):
+    worker.build(tmp_path / "quick.otf")  # The worker is started
+    process = worker.process
+    threading.Timer(0.3, worker.cancel).start()
+    start = time.perf_counter()
+    with pytest.raises(BuildCancelled):
+        worker.build(tmp_path / "slow.otf")
+    assert time.perf_counter() - start < 5
+    assert not (tmp_path / "slow.otf").exists()
+
+    worker.cancel()  # Nothing running, nothing to cancel
+    assert worker.build(tmp_path / "quick.otf")["ok"]  # Not cancelled by the cancel sent while idle
+    assert worker.process is process
+
+def test_crashed_worker_is_restarted(tmp_path, worker):
+    worker.build(tmp_path / "quick.otf")
+    process = worker.process
+    with pytest.raises(WorkerCrashed):
+        worker.build(tmp_path / "crash.otf")
+    assert worker.build(tmp_path / "quick.otf")["ok"]
+    assert worker.process is not process